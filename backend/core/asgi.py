@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+# Leituras da API por views assíncronas (veiculos.api_assincrona)
+os.environ.setdefault('API_LEITURAS_ASSINCRONAS', 'True')
 
 application = get_asgi_application()
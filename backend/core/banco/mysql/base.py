@@ -0,0 +1,13 @@
+from django.db.backends.mysql import base
+
+from ..pool import PoolMixin
+
+
+class DatabaseWrapper(PoolMixin, base.DatabaseWrapper):
+    """
+    Backend MySQL com pool de conexões em processo (ver core.banco.pool).
+    """
+
+    def verificar_conexao(self, conexao):
+        # Uma ida e volta ao servidor, sem executar consulta
+        conexao.ping()
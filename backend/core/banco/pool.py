@@ -0,0 +1,135 @@
+import functools
+import queue
+import threading
+
+from django.db import OperationalError
+
+"""
+Módulo: pool
+------------
+Pool de conexões em processo para os backends de banco de core.banco.
+Usado principalmente no deploy via core.asgi, em que cada requisição pode rodar
+em uma thread diferente e as conexões persistentes do Django (CONN_MAX_AGE) não
+são reaproveitadas: com o pool, a conexão é fechada ao fim da requisição (o
+Django usa CONN_MAX_AGE=0) e, em vez de encerrada, volta para o pool.
+
+Configuração em DATABASES[...]["POOL"]:
+- TAMANHO: máximo de conexões abertas por processo;
+- ESPERA: segundos de espera por uma conexão livre antes de falhar.
+"""
+
+_pools = {}
+_trava_pools = threading.Lock()
+
+
+class PoolConexoes:
+    """
+    Pool de tamanho fixo. As conexões livres são reutilizadas da mais recente
+    para a mais antiga (LIFO), mantendo poucas conexões ativas quando a carga é
+    baixa. Com `verificar`, cada conexão é testada antes de sair do pool e
+    descartada se o servidor a tiver encerrado.
+    """
+
+    def __init__(self, conectar, tamanho, espera=10, verificar=None):
+        self.conectar = conectar
+        self.espera = espera
+        self.verificar = verificar
+        self.criadas = 0
+        self._livres = queue.LifoQueue()
+        self._vagas = threading.BoundedSemaphore(tamanho)
+
+    def obter(self):
+        if not self._vagas.acquire(timeout=self.espera):
+            raise OperationalError(
+                f"Nenhuma conexão livre no pool após {self.espera} segundos."
+            )
+        try:
+            while True:
+                try:
+                    conexao = self._livres.get_nowait()
+                except queue.Empty:
+                    conexao = self.conectar()
+                    self.criadas += 1
+                    return conexao
+                if self.verificar is None or self._saudavel(conexao):
+                    return conexao
+                self._fechar(conexao)
+        except BaseException:
+            self._vagas.release()
+            raise
+
+    def devolver(self, conexao, descartar=False):
+        """
+        Devolve a conexão ao pool, desfazendo qualquer transação pendente. Com
+        `descartar`, ou se o rollback falhar, a conexão é fechada.
+        """
+        try:
+            if not descartar:
+                try:
+                    conexao.rollback()
+                except Exception:
+                    descartar = True
+            if descartar:
+                self._fechar(conexao)
+            else:
+                self._livres.put(conexao)
+        finally:
+            self._vagas.release()
+
+    def fechar_todas(self):
+        while True:
+            try:
+                self._fechar(self._livres.get_nowait())
+            except queue.Empty:
+                return
+
+    def _saudavel(self, conexao):
+        try:
+            self.verificar(conexao)
+            return True
+        except Exception:
+            return False
+
+    def _fechar(self, conexao):
+        try:
+            conexao.close()
+        except Exception:
+            pass
+
+
+class PoolMixin:
+    """
+    Mixin para o DatabaseWrapper de um backend do Django: obtém as conexões do
+    pool do processo em vez de abri-las, e as devolve ao pool em vez de fechá-las.
+    """
+
+    def get_new_connection(self, conn_params):
+        return self.pool(conn_params).obter()
+
+    def _close(self):
+        if self.connection is not None:
+            # Fechada no meio de um bloco atômico (ex.: erro): não é reaproveitada
+            self.pool_atual.devolver(self.connection, descartar=self.in_atomic_block)
+
+    def pool(self, conn_params):
+        # Um pool por conjunto de parâmetros: a criação do banco de testes, por
+        # exemplo, conecta com outro NAME usando o mesmo alias
+        chave = (self.alias, repr(sorted(conn_params.items())))
+        with _trava_pools:
+            if chave not in _pools:
+                configuracao = self.settings_dict.get("POOL", {})
+                _pools[chave] = PoolConexoes(
+                    functools.partial(super().get_new_connection, conn_params),
+                    tamanho=configuracao.get("TAMANHO", 10),
+                    espera=configuracao.get("ESPERA", 10),
+                    verificar=(
+                        self.verificar_conexao
+                        if self.settings_dict["CONN_HEALTH_CHECKS"]
+                        else None
+                    ),
+                )
+            self.pool_atual = _pools[chave]
+        return self.pool_atual
+
+    def verificar_conexao(self, conexao):
+        conexao.cursor().execute("SELECT 1")
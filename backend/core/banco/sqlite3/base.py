@@ -0,0 +1,10 @@
+from django.db.backends.sqlite3 import base
+
+from ..pool import PoolMixin
+
+
+class DatabaseWrapper(PoolMixin, base.DatabaseWrapper):
+    """
+    Backend SQLite com pool de conexões em processo (ver core.banco.pool), usado
+    como substituto local do MySQL em desenvolvimento e nos benchmarks.
+    """
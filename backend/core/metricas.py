@@ -0,0 +1,293 @@
+import hmac
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import JsonResponse
+
+"""
+Módulo: metricas
+----------------
+Instrumentação das requisições da API, leve o bastante para ficar ligada em
+produção com amostragem (METRICAS_AMOSTRAGEM, fração de 0 a 1 das requisições):
+1. MetricasMiddleware: mede, nas requisições amostradas, o número e o tempo das
+   consultas SQL, o tempo de serialização e o tempo total; identifica o endpoint
+   pelo viewset e ação do DRF (ex.: "CarroViewSet.reordenar_imagens") e devolve
+   os tempos no cabeçalho Server-Timing.
+2. SerializacaoMedidaMixin: mixin para serializers que mede o tempo gasto em
+   to_representation e as consultas feitas durante ele (sinal de N+1); o
+   context manager medir_serializacao faz o mesmo para outros blocos de código.
+3. relatorio_metricas: endpoint com os percentis por endpoint e os contadores
+   (ex.: acertos do cache de respostas), agregados no próprio processo,
+   protegido por usuário staff ou pelo token METRICAS_TOKEN.
+"""
+
+_medicao_atual = ContextVar("medicao_atual", default=None)
+
+METRICAS = (
+    "consultas",
+    "consultas_serializacao",
+    "tempo_sql_ms",
+    "tempo_serializacao_ms",
+    "tempo_total_ms",
+)
+
+
+def percentil(valores, p):
+    """
+    Percentil `p` (0 a 100) pelo método do posto mais próximo.
+    """
+    ordenados = sorted(valores)
+    if not ordenados:
+        return None
+    posicao = max(0, -(-len(ordenados) * p // 100) - 1)
+    return ordenados[int(posicao)]
+
+
+class Medicao:
+    """
+    Métricas de uma requisição amostrada.
+    """
+
+    def __init__(self):
+        self.endpoint = None
+        self.consultas = 0
+        self.consultas_serializacao = 0
+        self.tempo_sql = 0.0
+        self.tempo_serializacao = 0.0
+        self.tempo_total = 0.0
+        self.serializando = False
+
+    def registrar_consulta(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tempo_sql += time.perf_counter() - inicio
+            self.consultas += 1
+            if self.serializando:
+                self.consultas_serializacao += 1
+
+    def valores(self):
+        return {
+            "consultas": self.consultas,
+            "consultas_serializacao": self.consultas_serializacao,
+            "tempo_sql_ms": self.tempo_sql * 1000,
+            "tempo_serializacao_ms": self.tempo_serializacao * 1000,
+            "tempo_total_ms": self.tempo_total * 1000,
+        }
+
+    def server_timing(self):
+        return ", ".join(
+            [
+                f'sql;dur={self.tempo_sql * 1000:.1f};desc="{self.consultas} consultas"',
+                f"serializacao;dur={self.tempo_serializacao * 1000:.1f}",
+                f"total;dur={self.tempo_total * 1000:.1f}",
+            ]
+        )
+
+
+class RegistroMetricas:
+    """
+    Guarda as últimas `tamanho` medições de cada endpoint, no próprio processo.
+    Os percentis são calculados apenas quando o relatório é pedido. Guarda também
+    contadores simples (contar), registrados em todas as requisições, e não só
+    nas amostradas.
+    """
+
+    def __init__(self, tamanho=1000):
+        self.tamanho = tamanho
+        self._trava = threading.Lock()
+        self._amostras = defaultdict(lambda: deque(maxlen=self.tamanho))
+        self._requisicoes = defaultdict(int)
+        self._contadores = defaultdict(int)
+
+    def contar(self, nome):
+        with self._trava:
+            self._contadores[nome] += 1
+
+    def contadores(self):
+        with self._trava:
+            return dict(sorted(self._contadores.items()))
+
+    def adicionar(self, medicao):
+        with self._trava:
+            self._amostras[medicao.endpoint].append(medicao.valores())
+            self._requisicoes[medicao.endpoint] += 1
+
+    def relatorio(self):
+        with self._trava:
+            amostras = {
+                endpoint: list(valores) for endpoint, valores in self._amostras.items()
+            }
+            requisicoes = dict(self._requisicoes)
+
+        relatorio = {}
+        for endpoint, valores in sorted(amostras.items()):
+            relatorio[endpoint] = {"requisicoes": requisicoes[endpoint]}
+            for metrica in METRICAS:
+                serie = [valor[metrica] for valor in valores]
+                relatorio[endpoint][metrica] = {
+                    "p50": percentil(serie, 50),
+                    "p95": percentil(serie, 95),
+                    "p99": percentil(serie, 99),
+                    "max": max(serie),
+                }
+        return relatorio
+
+    def zerar(self):
+        with self._trava:
+            self._amostras.clear()
+            self._requisicoes.clear()
+            self._contadores.clear()
+
+
+registro = RegistroMetricas(getattr(settings, "METRICAS_AMOSTRAS", 1000))
+
+
+class MetricasMiddleware:
+    """
+    Deve ser o primeiro middleware, para que o tempo total inclua os demais.
+    As requisições fora da amostragem passam direto, sem custo de medição.
+    Funciona nos dois modos (WSGI e ASGI), sem converter a cadeia de middlewares.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.assincrono = iscoroutinefunction(get_response)
+        if self.assincrono:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.assincrono:
+            return self.__acall__(request)
+
+        medicao = self.amostrar()
+        if medicao is None:
+            return self.get_response(request)
+        with self.medir(medicao), self.registrar_consultas(medicao):
+            response = self.get_response(request)
+        return self.finalizar(medicao, response)
+
+    async def __acall__(self, request):
+        medicao = self.amostrar()
+        if medicao is None:
+            return await self.get_response(request)
+        with self.medir(medicao):
+            # As conexões do banco são por thread: os wrappers são instalados na
+            # thread em que o ORM assíncrono executa as consultas da requisição
+            pilha = await sync_to_async(self.registrar_consultas)(medicao)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(pilha.close)()
+        return self.finalizar(medicao, response)
+
+    def amostrar(self):
+        amostragem = settings.METRICAS_AMOSTRAGEM
+        if amostragem <= 0 or random.random() >= amostragem:
+            return None
+        return Medicao()
+
+    @contextmanager
+    def medir(self, medicao):
+        token = _medicao_atual.set(medicao)
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            _medicao_atual.reset(token)
+            medicao.tempo_total = time.perf_counter() - inicio
+
+    def registrar_consultas(self, medicao):
+        pilha = ExitStack()
+        for conexao in connections.all():
+            pilha.enter_context(conexao.execute_wrapper(medicao.registrar_consulta))
+        return pilha
+
+    def finalizar(self, medicao, response):
+        if medicao.endpoint:
+            registro.adicionar(medicao)
+        response["Server-Timing"] = medicao.server_timing()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        medicao = _medicao_atual.get()
+        if medicao is not None:
+            medicao.endpoint = nome_endpoint(request, view_func)
+
+
+def nome_endpoint(request, view_func):
+    """
+    "Viewset.ação" para as views do DRF (ex.: "CarroViewSet.list") e o caminho
+    da função nas demais.
+    """
+    classe = getattr(view_func, "cls", None)
+    if classe is None:
+        return f"{view_func.__module__}.{view_func.__name__}"
+    acoes = getattr(view_func, "actions", None) or {}
+    metodo = request.method.lower()
+    return f"{classe.__name__}.{acoes.get(metodo, metodo)}"
+
+
+@contextmanager
+def medir_serializacao():
+    """
+    Mede como serialização o bloco executado (tempo e consultas), na requisição
+    amostrada atual. Blocos aninhados não contam o tempo duas vezes.
+    """
+    medicao = _medicao_atual.get()
+    if medicao is None or medicao.serializando:
+        yield
+        return
+
+    medicao.serializando = True
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        medicao.tempo_serializacao += time.perf_counter() - inicio
+        medicao.serializando = False
+
+
+class SerializacaoMedidaMixin:
+    """
+    Mixin para serializers do DRF. Só o serializer mais externo é medido, então
+    serializers aninhados podem usar o mixin sem contar o tempo duas vezes.
+    """
+
+    def to_representation(self, instance):
+        with medir_serializacao():
+            return super().to_representation(instance)
+
+
+def relatorio_metricas(request):
+    """
+    Percentis por endpoint das requisições amostradas neste processo e os
+    contadores do processo. Acesso por
+    usuário staff ou com o cabeçalho "Authorization: Bearer <METRICAS_TOKEN>".
+    """
+    token = settings.METRICAS_TOKEN
+    autorizacao = request.headers.get("Authorization", "")
+    autorizado = request.user.is_staff or bool(
+        token and hmac.compare_digest(autorizacao, f"Bearer {token}")
+    )
+    if not autorizado:
+        return JsonResponse({"detail": "Acesso não autorizado."}, status=403)
+
+    return JsonResponse(
+        {
+            "amostragem": settings.METRICAS_AMOSTRAGEM,
+            "endpoints": registro.relatorio(),
+            "contadores": registro.contadores(),
+        }
+    )
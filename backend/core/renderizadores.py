@@ -0,0 +1,48 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - sem o orjson, usa o JSONRenderer do DRF
+    orjson = None
+
+"""
+Módulo: renderizadores
+----------------------
+RenderizadorJSONRapido: JSONRenderer do DRF que serializa com o orjson (em C),
+produzindo os mesmos bytes do JSONRenderer padrão (UTF-8, compacto, com U+2028 e
+U+2029 escapados). Tipos que o orjson não trata, ou trata de outra forma (datas,
+Decimal, textos traduzíveis), passam pelo JSONEncoder do próprio DRF. Com
+indentação pedida pelo cliente, ou sem o orjson instalado, usa o renderer padrão.
+"""
+
+
+class RenderizadorJSONRapido(JSONRenderer):
+    opcoes_orjson = (
+        orjson.OPT_NON_STR_KEYS
+        | orjson.OPT_PASSTHROUGH_DATETIME
+        | orjson.OPT_PASSTHROUGH_DATACLASS
+        if orjson
+        else 0
+    )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        renderer_context = renderer_context or {}
+        if (
+            orjson is None
+            or self.ensure_ascii
+            or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context)
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if data is None:
+            return b""
+
+        conteudo = orjson.dumps(
+            data, default=self.encoder_class().default, option=self.opcoes_orjson
+        )
+        # Mesmo escape do JSONRenderer: U+2028 e U+2029 são válidos em JSON, mas
+        # encerram a linha em JavaScript
+        return conteudo.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+            b"\xe2\x80\xa9", b"\\u2029"
+        )
@@ -18,7 +18,10 @@ SECRET_KEY = os.getenv(
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = os.getenv("DEBUG", "False").lower() == "true"  # Converte string para booleano
 
-ALLOWED_HOSTS = []
+# Hosts atendidos, separados por vírgula (ex.: "api.primecar.com.br,localhost")
+ALLOWED_HOSTS = [
+    host.strip() for host in os.getenv("ALLOWED_HOSTS", "").split(",") if host.strip()
+]
 
 # Application definition
 
@@ -31,6 +34,7 @@ INSTALLED_APPS = [
     "django.contrib.staticfiles",
     # Adicionados apps e bibliotecas necessárias
     "rest_framework",
+    "django_filters",  # Filtros por campo nos endpoints da API
     "veiculos.apps.VeiculosConfig",
     "corsheaders",  # Lida com CORS
 ]
@@ -39,10 +43,16 @@ INSTALLED_APPS = [
 REST_FRAMEWORK = {
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 10,  # Quantidade de itens por página
+    # JSON gerado pelo orjson, com a mesma saída do JSONRenderer padrão
+    "DEFAULT_RENDERER_CLASSES": [
+        "core.renderizadores.RenderizadorJSONRapido",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
     # Faltará codificar a parte de autenticação
 }
 
 MIDDLEWARE = [
+    "core.metricas.MetricasMiddleware",  # Primeiro, para medir toda a requisição
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -77,18 +87,91 @@ WSGI_APPLICATION = "core.wsgi.application"
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
 # Configuração do banco de dados usando variáveis de ambiente
+# DB_ENGINE: "mysql" (padrão) ou "sqlite3", substituto local para desenvolvimento e
+# benchmarks (DB_NAME é então o caminho do arquivo).
+# Conexões: DB_CONN_MAX_AGE é o tempo, em segundos, que uma conexão é reaproveitada
+# entre requisições (0 fecha ao fim de cada uma) e DB_CONN_HEALTH_CHECKS verifica a
+# conexão reaproveitada antes do uso. Com DB_POOL_SIZE > 0, as conexões vêm de um
+# pool em processo (core.banco), indicado para o core.asgi; DB_POOL_TIMEOUT é a
+# espera, em segundos, por uma conexão livre.
+DB_ENGINE = os.getenv("DB_ENGINE", "mysql")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "0"))
+
 DATABASES = {
     "default": {
-        "ENGINE": "django.db.backends.mysql",
+        "ENGINE": (
+            f"core.banco.{DB_ENGINE}"
+            if DB_POOL_SIZE
+            else f"django.db.backends.{DB_ENGINE}"
+        ),
         "NAME": os.getenv("DB_NAME"),
         "USER": os.getenv("DB_USER"),
         "PASSWORD": os.getenv("DB_PASSWORD"),
         "HOST": os.getenv("DB_HOST"),
         "PORT": os.getenv("DB_PORT"),
+        # Com o pool, a conexão volta para ele ao fim de cada requisição
+        "CONN_MAX_AGE": 0 if DB_POOL_SIZE else int(os.getenv("DB_CONN_MAX_AGE", "60")),
+        "CONN_HEALTH_CHECKS": os.getenv("DB_CONN_HEALTH_CHECKS", "True").lower()
+        == "true",
+        "POOL": {
+            "TAMANHO": DB_POOL_SIZE,
+            "ESPERA": float(os.getenv("DB_POOL_TIMEOUT", "10")),
+        },
     }
 }
 
 
+# Cache
+# O alias "respostas" guarda as respostas de leitura da API (veiculos.cache_respostas).
+# O padrão é local em memória, por processo: com vários processos, use um backend
+# compartilhado (ex.: django.core.cache.backends.filebased.FileBasedCache com um
+# diretório em CACHE_RESPOSTAS_LOCATION) para que as escritas invalidem todos eles.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "respostas": {
+        "BACKEND": os.getenv(
+            "CACHE_RESPOSTAS_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("CACHE_RESPOSTAS_LOCATION", "respostas"),
+        "TIMEOUT": int(os.getenv("CACHE_RESPOSTAS_TIMEOUT", "300")),
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    },
+}
+
+
+# Métricas das requisições (core.metricas)
+# METRICAS_AMOSTRAGEM: fração das requisições medidas, de 0 (desligado) a 1.
+# METRICAS_TOKEN: token para consultar /metricas/ sem sessão de staff
+# (cabeçalho "Authorization: Bearer <token>").
+METRICAS_AMOSTRAGEM = float(os.getenv("METRICAS_AMOSTRAGEM", "0.1"))
+METRICAS_TOKEN = os.getenv("METRICAS_TOKEN", "")
+METRICAS_AMOSTRAS = 1000  # Medições guardadas por endpoint para os percentis
+
+
+# Leituras da API (list e retrieve de /carros/ e /modelos/) por views assíncronas
+# (veiculos.api_assincrona). Ligado por core.asgi: sob WSGI as views síncronas
+# do DRF atendem todas as requisições.
+API_LEITURAS_ASSINCRONAS = (
+    os.getenv("API_LEITURAS_ASSINCRONAS", "False").lower() == "true"
+)
+
+
+# Envio de imagens dos veículos (veiculos.uploads): cada arquivo é gravado em disco
+# à medida que é recebido. Requisições maiores que UPLOAD_IMAGENS_MAX_BYTES_REQUISICAO
+# (pelo Content-Length ou pelo total lido) e arquivos maiores que
+# UPLOAD_IMAGENS_MAX_BYTES_ARQUIVO são recusados com 413; imagens com mais de
+# UPLOAD_IMAGENS_MAX_PIXELS pixels, com 400.
+UPLOAD_IMAGENS_MAX_BYTES_ARQUIVO = int(
+    os.getenv("UPLOAD_IMAGENS_MAX_BYTES_ARQUIVO", str(15 * 1024 * 1024))
+)
+UPLOAD_IMAGENS_MAX_BYTES_REQUISICAO = int(
+    os.getenv("UPLOAD_IMAGENS_MAX_BYTES_REQUISICAO", str(200 * 1024 * 1024))
+)
+UPLOAD_IMAGENS_MAX_PIXELS = int(os.getenv("UPLOAD_IMAGENS_MAX_PIXELS", "50000000"))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -2,10 +2,12 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from core.metricas import relatorio_metricas
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("api/v1/", include("veiculos.api_urls")),
+    path("metricas/", relatorio_metricas),
 ]
 
 if settings.DEBUG:
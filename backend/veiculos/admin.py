@@ -38,7 +38,7 @@ class ImagemCarroInline(admin.TabularInline):
         """
         if obj.imagem and hasattr(obj.imagem, "url"):
             return mark_safe(
-                f'<img src="{obj.imagem.url}" width="100" alt="Preview" />'
+                f'<img src="{obj.url_derivada("miniatura")}" width="100" alt="Preview" />'
             )
         return "(Sem imagem)"
 
@@ -56,6 +56,7 @@ class CarroAdmin(admin.ModelAdmin):
         "image_preview_list",
     )
     list_filter = ("modelo__nome_marca", "modelo__nome_modelo", "ano_fabricacao", "cor")
+    list_select_related = ("modelo", "imagem_capa")
     search_fields = (
         "modelo__nome_marca",
         "modelo__nome_modelo",
@@ -80,8 +81,8 @@ class CarroAdmin(admin.ModelAdmin):
         """
         Exibe uma miniatura da imagem principal na lista de carros do admin.
         """
-        # Primeiro tenta buscar a imagem marcada como principal no novo modelo
-        imagem_principal = carro.imagens.filter(e_principal=True).first()
+        # Primeiro tenta usar a imagem principal da galeria (ponteiro imagem_capa)
+        imagem_principal = carro.imagem_capa
 
         if (
             imagem_principal
@@ -89,7 +90,7 @@ class CarroAdmin(admin.ModelAdmin):
             and hasattr(imagem_principal.imagem, "url")
         ):
             return mark_safe(
-                f'<img src="{imagem_principal.imagem.url}" width="100" alt="Preview de {carro}" />'
+                f'<img src="{imagem_principal.url_derivada("miniatura")}" width="100" alt="Preview de {carro}" />'
             )
 
         # Fallback para o campo antigo
@@ -106,8 +107,8 @@ class CarroAdmin(admin.ModelAdmin):
         """
         Exibe um preview da imagem principal do carro no formulário de edição.
         """
-        # Primeiro tenta buscar a imagem marcada como principal no novo modelo
-        imagem_principal = carro.imagens.filter(e_principal=True).first()
+        # Primeiro tenta usar a imagem principal da galeria (ponteiro imagem_capa)
+        imagem_principal = carro.imagem_capa
 
         if (
             imagem_principal
@@ -115,7 +116,7 @@ class CarroAdmin(admin.ModelAdmin):
             and hasattr(imagem_principal.imagem, "url")
         ):
             return mark_safe(
-                f'<img src="{imagem_principal.imagem.url}" width="200" '
+                f'<img src="{imagem_principal.url_derivada("card")}" width="200" '
                 f'style="margin-top: 10px; display: block;" alt="Preview de {carro}" />'
             )
 
@@ -140,7 +141,7 @@ class CarroAdmin(admin.ModelAdmin):
         # Se o campo imagem_principal foi preenchido/alterado
         if "imagem_principal" in form.changed_data and obj.imagem_principal:
             # Verifica se já existe uma imagem principal
-            imagem_principal_existente = obj.imagens.filter(e_principal=True).first()
+            imagem_principal_existente = obj.imagem_capa
 
             if imagem_principal_existente:
                 # Atualiza a imagem principal existente
@@ -178,26 +179,8 @@ class ImagemCarroAdmin(admin.ModelAdmin):
     def image_preview_list(self, obj):
         if obj.imagem and hasattr(obj.imagem, "url"):
             return mark_safe(
-                f'<img src="{obj.imagem.url}" width="100" alt="Preview" />'
+                f'<img src="{obj.url_derivada("miniatura")}" width="100" alt="Preview" />'
             )
         return "(Sem imagem)"
 
     image_preview_list.short_description = "Preview"
-
-    def save_model(self, request, obj, form, change):
-        """
-        Sobrescreve o método save_model para garantir que apenas
-        uma imagem seja marcada como principal para cada carro.
-        """
-        # Se esta imagem está sendo marcada como principal
-        if "e_principal" in form.changed_data and obj.e_principal:
-            # Desmarca todas as outras imagens do mesmo carro
-            ImagemCarro.objects.filter(carro=obj.carro, e_principal=True).exclude(
-                pk=obj.pk
-            ).update(e_principal=False)
-
-            # Atualiza também o campo imagem_principal do carro para manter compatibilidade
-            obj.carro.imagem_principal = obj.imagem
-            obj.carro.save(update_fields=["imagem_principal"])
-
-        super().save_model(request, obj, form, change)
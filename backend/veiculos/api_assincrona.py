@@ -0,0 +1,201 @@
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse
+from django.shortcuts import aget_object_or_404
+from django.urls import re_path
+from rest_framework import permissions
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+"""
+Módulo: api_assincrona
+----------------------
+Leituras assíncronas (list e retrieve) dos viewsets da API, para execução sob
+ASGI (ex.: uvicorn core.asgi:application):
+1. LeiturasAssincronasMixin: alist/aretrieve com o ORM assíncrono e adispatch,
+   equivalente ao dispatch do DRF para essas ações. Os mixins de cache, GET
+   condicional e listagem rápida têm as versões assíncronas correspondentes, na
+   mesma ordem de herança das síncronas.
+2. rotas_assincronas: substitui as rotas de listagem e detalhe do roteador por
+   views assíncronas que servem GET/HEAD sem ocupar uma thread durante as
+   consultas e delegam os demais métodos (e a API navegável) à view do DRF.
+
+As consultas são feitas pelo ORM assíncrono; os filtros e a representação
+(serializers, URLs das imagens) são aplicados em sync_to_async, na mesma thread
+das consultas da requisição, para não bloquear o loop de eventos.
+"""
+
+# Ações servidas pelas views assíncronas, por nome de rota do roteador
+ACOES_ASSINCRONAS = ("list", "retrieve")
+
+
+class LeiturasAssincronasMixin:
+    """
+    Mixin para ModelViewSet com as versões assíncronas de list e retrieve. Deve
+    ficar imediatamente antes de ModelViewSet na herança.
+    """
+
+    # Formatos de resposta servidos pela leitura assíncrona; os demais (como a
+    # API navegável, que usa a sessão e templates) seguem pela view síncrona
+    formatos_assincronos = ("json",)
+
+    def leitura_assincrona_disponivel(self, request):
+        """
+        Indica se a requisição pode ser atendida por adispatch: permissões que
+        não dependem do usuário (a autenticação não é feita), sem throttling,
+        paginação com apaginate_queryset e formato JSON.
+        """
+        if not all(
+            issubclass(permissao, permissions.AllowAny)
+            for permissao in self.permission_classes
+        ):
+            return False
+        if self.throttle_classes:
+            return False
+        if self.paginator is not None and not hasattr(
+            self.paginator, "apaginate_queryset"
+        ):
+            return False
+        try:
+            renderer, _ = self.perform_content_negotiation(request)
+        except APIException:
+            return False
+        return renderer.format in self.formatos_assincronos
+
+    async def adispatch(self, request, *args, **kwargs):
+        """
+        Equivalente a APIView.dispatch para as ações assíncronas. A resposta é
+        renderizada aqui e entregue como HttpResponse, para que o handler ASGI
+        não precise renderizá-la em uma thread.
+        """
+        self.args = args
+        self.kwargs = kwargs
+        self.headers = self.default_response_headers
+
+        try:
+            self.format_kwarg = self.get_format_suffix(**kwargs)
+            neg = self.perform_content_negotiation(request)
+            request.accepted_renderer, request.accepted_media_type = neg
+            version, scheme = self.determine_version(request, *args, **kwargs)
+            request.version, request.versioning_scheme = version, scheme
+            self.check_permissions(request)
+
+            handler = getattr(self, f"a{self.action}")
+            response = await handler(request, *args, **kwargs)
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        response = self.finalize_response(request, response, *args, **kwargs)
+        if not isinstance(response, Response):
+            return response  # Ex.: acerto do cache de respostas
+        response.render()
+        return HttpResponse(
+            response.content, status=response.status_code, headers=response.headers
+        )
+
+    async def alist(self, request, *args, **kwargs):
+        queryset = await self.afilter_queryset(self.get_queryset())
+
+        page = None
+        if self.paginator is not None:
+            page = await self.paginator.apaginate_queryset(queryset, request, view=self)
+        if page is not None:
+            return self.get_paginated_response(await self.aserializar(page, many=True))
+        objetos = [objeto async for objeto in queryset]
+        return Response(await self.aserializar(objetos, many=True))
+
+    async def aretrieve(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        return Response(await self.aserializar(instance))
+
+    async def aget_object(self):
+        """
+        Equivalente assíncrono de get_object.
+        """
+        queryset = await self.afilter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        filtro = {self.lookup_field: self.kwargs[lookup_url_kwarg]}
+        try:
+            obj = await aget_object_or_404(queryset, **filtro)
+        except (TypeError, ValueError, ValidationError):
+            # Mesmo tratamento de rest_framework.generics.get_object_or_404
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+    async def afilter_queryset(self, queryset):
+        """
+        Aplica filter_queryset em sync_to_async: um filtro pode consultar o banco
+        ao montar o queryset (ex.: a frequência dos termos da busca textual).
+        """
+        return await sync_to_async(self.filter_queryset)(queryset)
+
+    async def aserializar(self, dados, many=False):
+        """
+        Serializa `dados` em sync_to_async: a representação pode acessar
+        relacionamentos e storages de forma síncrona.
+        """
+        return await sync_to_async(lambda: self.get_serializer(dados, many=many).data)()
+
+
+def leitura_assincrona(view_sincrona):
+    """
+    Cria a view assíncrona de uma rota de list ou retrieve do roteador, a partir
+    da view síncrona (`view_sincrona`, criada por ViewSetMixin.as_view).
+    """
+    viewset = view_sincrona.cls
+    acoes = dict(view_sincrona.actions)
+    acoes.setdefault("head", acoes["get"])
+    delegar = sync_to_async(view_sincrona)
+
+    async def view(request, *args, **kwargs):
+        if request.method in ("GET", "HEAD"):
+            # Mesma inicialização de ViewSetMixin.as_view e APIView.dispatch
+            self = viewset(**view_sincrona.initkwargs)
+            self.action_map = acoes
+            for metodo, acao in acoes.items():
+                setattr(self, metodo, getattr(self, acao))
+            self.args = args
+            self.kwargs = kwargs
+            self.request = self.initialize_request(request, *args, **kwargs)
+            self.format_kwarg = self.get_format_suffix(**kwargs)
+            if self.leitura_assincrona_disponivel(self.request):
+                return await self.adispatch(self.request, *args, **kwargs)
+        return await delegar(request, *args, **kwargs)
+
+    # Identificação do endpoint (ex.: nas métricas) igual à da view síncrona
+    view.__name__ = view_sincrona.__name__
+    view.__doc__ = view_sincrona.__doc__
+    view.cls = viewset
+    view.initkwargs = view_sincrona.initkwargs
+    view.actions = view_sincrona.actions
+    view.csrf_exempt = True
+    view.login_required = False
+    return view
+
+
+def rotas_assincronas(router):
+    """
+    Rotas de list e retrieve dos viewsets do `router` com LeiturasAssincronasMixin
+    (incluindo as variantes com sufixo de formato), servidas pelas views
+    assíncronas. Devem preceder router.urls no urlpatterns.
+    """
+    rotas = []
+    for rota in router.urls:
+        view_sincrona = rota.callback
+        viewset = getattr(view_sincrona, "cls", None)
+        acoes = getattr(view_sincrona, "actions", None) or {}
+        if (
+            viewset is not None
+            and issubclass(viewset, LeiturasAssincronasMixin)
+            and acoes.get("get") in ACOES_ASSINCRONAS
+        ):
+            rotas.append(
+                re_path(
+                    rota.pattern.regex.pattern,
+                    leitura_assincrona(view_sincrona),
+                    rota.default_args,
+                    name=rota.name,
+                )
+            )
+    return rotas
@@ -1,5 +1,7 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from .api_assincrona import rotas_assincronas
 from .api_views import ModeloViewSet, CarroViewSet
 
 """
@@ -11,6 +13,8 @@ usando o DefaultRouter do Django REST Framework. Ele registra dois viewsets com
 2. CarroViewSet, acessível no endpoint 'carros'.
 O DefaultRouter gera automaticamente o conjunto padrão de rotas CRUD para ambos
 os endpoints, que são então incluídos na configuração geral de URL da aplicação.
+Com API_LEITURAS_ASSINCRONAS (ligado por core.asgi), as rotas de listagem e
+detalhe são servidas pelas views assíncronas de veiculos.api_assincrona.
 Uso:
 Inclua os urlpatterns deste módulo na configuração de URL do seu projeto para habilitar
 os endpoints da API RESTful para os modelos de veículos e carros.
@@ -22,3 +26,6 @@ router.register(r"carros", CarroViewSet, basename="carro")
 urlpatterns = [
     path("", include(router.urls)),
 ]
+
+if settings.API_LEITURAS_ASSINCRONAS:
+    urlpatterns = rotas_assincronas(router) + urlpatterns
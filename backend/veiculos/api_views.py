@@ -1,27 +1,166 @@
-from rest_framework import viewsets, permissions, filters, status
+from rest_framework import viewsets, filters, status
 from rest_framework.decorators import action
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
+from django.db import transaction
+from django.db.models import Prefetch
 from django.shortcuts import get_object_or_404
-
-# from django_filters.rest_framework import DjangoFilterBackend
+from django_filters.rest_framework import DjangoFilterBackend
+from .api_assincrona import LeiturasAssincronasMixin
+from .autocompletar import (
+    MAXIMO_PALAVRAS,
+    TAMANHO_MAXIMO_TEXTO,
+    sugerir_modelos,
+    texto_valido,
+)
+from .busca import BuscaTextualFilter
+from .cache_respostas import CacheRespostasMixin
+from .condicional import RespostaCondicionalMixin, validadores_listagem
+from .exportacao import FORMATOS_EXPORTACAO, ExportacaoCarros, SemNegociacaoConteudo
+from .facetas import contar_facetas
+from .gravacao_lote import LIMITE_LOTE, GravacaoLoteCarros
+from .listagem_rapida import (
+    ListagemRapidaMixin,
+    RepresentacaoCarroLista,
+    RepresentacaoModelo,
+)
 from .models import Modelo, Carro, ImagemCarro
-from .serializers import ModeloSerializer, CarroSerializer, ImagemCarroSerializer
+from .pagination import PaginacaoVeiculos
+from .serializers import (
+    CamposDinamicosMixin,
+    ModeloSerializer,
+    CarroSerializer,
+    CarroListaSerializer,
+    ImagemCarroSerializer,
+    ReordenarImagensSerializer,
+    UploadImagensSerializer,
+)
+from .uploads import UploadStreamingMixin
+
+
+class CamposEsparsosMixin:
+    """
+    Mixin para os viewsets: nas leituras, o parâmetro `fields` (ex.: ?fields=id,cor)
+    restringe os campos da representação completa do serializer.
+    """
+
+    campos_query_param = "fields"
+
+    def campos_solicitados(self):
+        """
+        Retorna a lista de campos pedidos em `fields`, ou None se não houver.
+        """
+        request = getattr(self, "request", None)
+        if request is None or request.method not in ("GET", "HEAD"):
+            return None
+        valor = request.query_params.get(self.campos_query_param, "")
+        campos = [campo.strip() for campo in valor.split(",") if campo.strip()]
+        return campos or None
+
+    def get_serializer(self, *args, **kwargs):
+        campos = self.campos_solicitados()
+        if campos and issubclass(self.get_serializer_class(), CamposDinamicosMixin):
+            kwargs["campos"] = campos
+        return super().get_serializer(*args, **kwargs)
 
 
 class ModeloViewSet(
-    viewsets.ModelViewSet
+    CamposEsparsosMixin,
+    CacheRespostasMixin,
+    RespostaCondicionalMixin,
+    ListagemRapidaMixin,
+    LeiturasAssincronasMixin,
+    viewsets.ModelViewSet,
 ):  # ModelViewSet fornece os metodos list, create, retrieve, update, partial_update, destroy.
     queryset = Modelo.objects.all().order_by("nome_marca", "nome_modelo")
     serializer_class = ModeloSerializer
+    # Listagem lida com .values(), com a mesma saída do ModeloSerializer
+    representacao_valores = RepresentacaoModelo
+    pagination_class = PaginacaoVeiculos
+    # Ordem da paginação por cursor (?paginacao=cursor)
+    ordenacao_keyset = ("nome_marca", "nome_modelo", "id")
+    # Tabelas cuja versão compõe o ETag/Last-Modified e a chave do cache de respostas
+    tabelas_versao = (Modelo,)
     # Futuramente aqui codificamos as permissions
 
+    @action(detail=False, methods=["get"])
+    def autocompletar(self, request):
+        """
+        Sugere modelos para um campo de seleção: os primeiros cuja marca ou nome
+        começam com o texto digitado. A resposta passa pelo cache de respostas e
+        pelo GET condicional, como a listagem.
+
+        Args:
+            request: Requisição com o texto digitado em "q" (até 100 caracteres e
+                6 palavras) e, em "limite", a quantidade máxima de sugestões
+                (padrão 10, até 50)
 
-class CarroViewSet(viewsets.ModelViewSet):
-    queryset = Carro.objects.all().select_related("modelo").order_by("-data_cadastro")
+        Returns:
+            Response com a lista de modelos (id, marca, nome e ano)
+        """
+        texto = " ".join(request.query_params.get("q", "").split())
+        try:
+            limite = int(request.query_params.get("limite", 10))
+        except ValueError:
+            limite = 0
+        if not texto or not 1 <= limite <= 50:
+            return Response(
+                {"detail": "Informe o texto em q e um limite entre 1 e 50."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not texto_valido(texto):
+            return Response(
+                {
+                    "detail": f"O texto em q deve ter até {TAMANHO_MAXIMO_TEXTO} "
+                    f"caracteres e {MAXIMO_PALAVRAS} palavras."
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        def sugerir():
+            versoes = self.versoes_tabelas()
+            return self.responder_condicional(
+                request,
+                *validadores_listagem(versoes),
+                lambda: Response(sugerir_modelos(texto, limite)),
+            )
+
+        return self.responder_do_cache(request, sugerir)
+
+
+class CarroViewSet(
+    UploadStreamingMixin,
+    CamposEsparsosMixin,
+    CacheRespostasMixin,
+    RespostaCondicionalMixin,
+    ListagemRapidaMixin,
+    LeiturasAssincronasMixin,
+    viewsets.ModelViewSet,
+):
+    queryset = (
+        Carro.objects.all()
+        .select_related("modelo", "imagem_capa")
+        .order_by("-data_cadastro")
+    )
     serializer_class = CarroSerializer
+    # Listagem lida com .values(), com a mesma saída do CarroListaSerializer
+    representacao_valores = RepresentacaoCarroLista
+    pagination_class = PaginacaoVeiculos
+    # Ordem da paginação por cursor (?paginacao=cursor)
+    ordenacao_keyset = ("-data_cadastro", "-id")
+    # Tabelas e colunas que compõem o ETag/Last-Modified e a chave do cache de
+    # respostas (o modelo e as imagens são serializados junto com o carro)
+    tabelas_versao = (Carro, Modelo, ImagemCarro)
+    campos_versao = ("atualizado_em", "modelo__atualizado_em")
 
     # Filtros e Buscas
-    # filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [
+        DjangoFilterBackend,
+        filters.SearchFilter,
+        filters.OrderingFilter,
+        # Busca textual indexada (?q=), ordenada pela relevância
+        BuscaTextualFilter,
+    ]
 
     filterset_fields = [
         "cor",
@@ -43,11 +182,136 @@ class CarroViewSet(viewsets.ModelViewSet):
     ]  # Campos que pode ordenar
     ordering = ["-data_cadastro"]  # Ordenação
 
+    def get_serializer_class(self):
+        # A listagem usa a representação compacta, a menos que `fields` escolha
+        # campos da representação completa
+        if self.action == "list" and self.campos_solicitados() is None:
+            return CarroListaSerializer
+        return super().get_serializer_class()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        campos = self.campos_solicitados()
+        if self.get_serializer_class() is CarroSerializer and (
+            campos is None or "imagens" in campos
+        ):
+            # As imagens de toda a página são carregadas em uma única consulta, na
+            # mesma ordem de ImagemCarro.Meta.ordering, evitando o N+1
+            queryset = queryset.prefetch_related(
+                Prefetch(
+                    "imagens",
+                    queryset=ImagemCarro.objects.order_by(*ImagemCarro._meta.ordering),
+                )
+            )
+        return queryset
+
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context.update({"request": self.request})
         return context
 
+    @action(
+        detail=False, methods=["get"], content_negotiation_class=SemNegociacaoConteudo
+    )
+    def exportar(self, request):
+        """
+        Exporta os carros em streaming, com os mesmos filtros e busca da
+        listagem, na ordem do id e sem paginação.
+
+        Args:
+            request: Requisição com o formato em "formato" (csv ou jsonl; padrão
+                csv). Com Accept-Encoding: gzip, a saída é compactada.
+
+        Returns:
+            StreamingHttpResponse com o arquivo, ou erro se o formato for inválido
+        """
+        formato = request.query_params.get("formato", "csv")
+        if formato not in FORMATOS_EXPORTACAO:
+            return Response(
+                {
+                    "detail": "Formato inválido. Use "
+                    f"{' ou '.join(FORMATOS_EXPORTACAO)}."
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        queryset = self.filter_queryset(self.get_queryset())
+        return ExportacaoCarros(request, queryset, formato).resposta()
+
+    # As contagens não dependem das imagens: só escritas em carros e modelos
+    # invalidam o cache e o ETag das facetas
+    @action(detail=False, methods=["get"], tabelas_versao=(Carro, Modelo))
+    def facetas(self, request):
+        """
+        Conta os carros por marca, modelo, cor e ano de fabricação, com os mesmos
+        filtros e busca da listagem. A resposta passa pelo cache de respostas e
+        pelo GET condicional, como a listagem.
+
+        Args:
+            request: Requisição com os filtros da listagem e, em "limite", a
+                quantidade máxima de valores por faceta (padrão 50, até 500)
+
+        Returns:
+            Response com o total e, por faceta, os valores e as quantidades
+        """
+        try:
+            limite = int(request.query_params.get("limite", 50))
+        except ValueError:
+            limite = 0
+        if not 1 <= limite <= 500:
+            return Response(
+                {"detail": "O limite deve ser um número entre 1 e 500."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        def contar():
+            versoes = self.versoes_tabelas()
+            return self.responder_condicional(
+                request,
+                *validadores_listagem(versoes),
+                lambda: Response(
+                    contar_facetas(self.filter_queryset(self.get_queryset()), limite)
+                ),
+            )
+
+        return self.responder_do_cache(request, contar)
+
+    @action(detail=False, methods=["post"])
+    def lote(self, request):
+        """
+        Cria e atualiza vários carros em uma requisição, em uma única transação.
+        Os itens inválidos são recusados sem impedir a gravação dos demais.
+
+        Args:
+            request: Requisição com a lista de carros em JSON (com "id", o carro
+                é atualizado apenas nos campos enviados; sem "id", é criado)
+
+        Returns:
+            Response com as quantidades por status e o resultado de cada item,
+            com status 200, ou 207 se algum item foi recusado
+        """
+        itens = request.data
+        if not isinstance(itens, list) or not 1 <= len(itens) <= LIMITE_LOTE:
+            return Response(
+                {"detail": f"Envie uma lista com 1 a {LIMITE_LOTE} carros."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        gravacao = GravacaoLoteCarros(itens)
+        resultados = gravacao.gravar()
+        resumo = gravacao.resumo()
+        return Response(
+            {
+                "criados": resumo["criado"],
+                "atualizados": resumo["atualizado"],
+                "erros": resumo["erro"],
+                "resultados": resultados,
+            },
+            status=(
+                status.HTTP_207_MULTI_STATUS if resumo["erro"] else status.HTTP_200_OK
+            ),
+        )
+
     @action(detail=True, methods=["delete"])
     def delete_imagem(self, request, pk=None):
         """
@@ -74,11 +338,7 @@ class CarroViewSet(viewsets.ModelViewSet):
 
             imagem = get_object_or_404(ImagemCarro, id=imagem_id, carro=carro)
 
-            # Se a imagem a ser excluída for a principal, atualiza o campo imagem_principal do carro
-            if imagem.e_principal and carro.imagem_principal:
-                carro.imagem_principal = None
-                carro.save(update_fields=["imagem_principal"])
-
+            # Se a imagem for a principal, ImagemCarro.delete limpa o ponteiro do carro
             imagem.delete()
             return Response({"detail": "Imagem excluída com sucesso."})
 
@@ -88,42 +348,110 @@ class CarroViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
 
+    @action(detail=True, methods=["post"], parser_classes=[MultiPartParser])
+    def upload_imagens(self, request, pk=None):
+        """
+        Envia várias imagens para o veículo de uma só vez.
+
+        Os arquivos são gravados no storage e as linhas inseridas com um único
+        bulk_create em uma transação, com número fixo de consultas.
+
+        Args:
+            request: Requisição multipart com os arquivos no campo "imagens"
+            pk: ID do veículo
+
+        Returns:
+            Response com as imagens criadas ou erro
+        """
+        carro = self.get_object()
+
+        serializer = UploadImagensSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            imagens = carro.adicionar_imagens(serializer.validated_data["imagens"])
+        except Exception as e:
+            return Response(
+                {"detail": f"Erro ao enviar imagens: {str(e)}"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+        return Response(
+            ImagemCarroSerializer(
+                imagens, many=True, context=self.get_serializer_context()
+            ).data,
+            status=status.HTTP_201_CREATED,
+        )
+
     @action(detail=True, methods=["post"])
     def reordenar_imagens(self, request, pk=None):
         """
         Reordena as imagens de um veículo.
 
+        A operação é atômica e usa um único UPDATE para todas as imagens. As
+        imagens informadas são ordenadas pela "ordem" enviada, seguidas das não
+        informadas na ordem atual, e a ordem é normalizada para 1, 2, 3...
+
         Args:
             request: Objeto de requisição com a lista de IDs e ordens
             pk: ID do veículo
 
         Returns:
-            Response confirmando a reordenação ou erro
+            Response com a ordem resultante ou erro
         """
         carro = self.get_object()
 
-        try:
-            imagens_ordem = request.data.get("imagens", [])
-
-            if not imagens_ordem or not isinstance(imagens_ordem, list):
-                return Response(
-                    {
-                        "detail": "É necessário fornecer uma lista de imagens e suas ordens."
-                    },
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
+        serializer = ReordenarImagensSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        imagens_ordem = serializer.validated_data["imagens"]
 
-            # Atualizar a ordem de cada imagem
-            for item in imagens_ordem:
-                imagem_id = item.get("id")
-                nova_ordem = item.get("ordem")
+        try:
+            with transaction.atomic():
+                imagens = {
+                    imagem.id: imagem
+                    for imagem in ImagemCarro.objects.select_for_update()
+                    .filter(carro=carro)
+                    .order_by("ordem", "data_upload", "id")
+                    .only("id", "ordem")
+                }
 
-                if imagem_id is not None and nova_ordem is not None:
-                    ImagemCarro.objects.filter(id=imagem_id, carro=carro).update(
-                        ordem=nova_ordem
+                invalidas = [
+                    item["id"] for item in imagens_ordem if item["id"] not in imagens
+                ]
+                if invalidas:
+                    return Response(
+                        {
+                            "detail": "Imagens não pertencem a este veículo.",
+                            "imagens_invalidas": invalidas,
+                        },
+                        status=status.HTTP_400_BAD_REQUEST,
                     )
 
-            return Response({"detail": "Imagens reordenadas com sucesso."})
+                # sorted é estável: empates mantêm a ordem em que foram enviados
+                informadas = [
+                    imagens.pop(item["id"])
+                    for item in sorted(imagens_ordem, key=lambda item: item["ordem"])
+                ]
+                nova_ordem = informadas + list(imagens.values())
+
+                alteradas = []
+                for posicao, imagem in enumerate(nova_ordem, start=1):
+                    if imagem.ordem != posicao:
+                        imagem.ordem = posicao
+                        alteradas.append(imagem)
+                ImagemCarro.objects.bulk_update(alteradas, ["ordem"])
+                if alteradas:
+                    Carro.marcar_alterados([carro.id])
+
+            return Response(
+                {
+                    "detail": "Imagens reordenadas com sucesso.",
+                    "imagens": [
+                        {"id": imagem.id, "ordem": imagem.ordem}
+                        for imagem in nova_ordem
+                    ],
+                }
+            )
 
         except Exception as e:
             return Response(
@@ -158,19 +486,8 @@ class CarroViewSet(viewsets.ModelViewSet):
                 ImagemCarro, id=imagem_id, carro=carro
             )
 
-            # Importante: primeiro remova o status de principal das outras imagens,
-            # Não exlue
-            ImagemCarro.objects.filter(carro=carro, e_principal=True).update(
-                e_principal=False
-            )
-
-            # Define a nova imagem como principal
-            nova_imagem_principal.e_principal = True
-            nova_imagem_principal.save()
-
-            # Atualiza o campo imagem_principal do carro para manter compatibilidade
-            carro.imagem_principal = nova_imagem_principal.imagem
-            carro.save(update_fields=["imagem_principal"])
+            # Desmarca as outras imagens e atualiza o ponteiro do carro atomicamente
+            carro.definir_imagem_principal(nova_imagem_principal)
 
             return Response(
                 {
@@ -0,0 +1,179 @@
+import glob
+import hashlib
+import os
+import tempfile
+import uuid
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from PIL import Image
+
+"""
+Módulo: armazenamento
+---------------------
+Storage endereçado por conteúdo das imagens dos veículos. Cada upload é lido em
+blocos uma única vez, calculando o SHA-256 enquanto é gravado em um arquivo
+temporário, e fica em imagens_carros/conteudo/<2 primeiros dígitos>/<hash>.<ext>.
+Se o mesmo conteúdo já existir, o temporário é descartado e o nome do arquivo
+existente é retornado: fotos repetidas (ex.: as mesmas fotos de divulgação em
+vários carros do mesmo modelo) ocupam o disco uma única vez.
+
+Vários registros de ImagemCarro podem apontar para o mesmo arquivo. A contagem de
+referências é a quantidade de registros com aquele nome (coluna indexada): o
+arquivo só é apagado quando ela chega a zero (ver veiculos.arquivos).
+
+O registro que reaproveita um arquivo só é confirmado no commit, e até lá não
+aparece na contagem de referências. Para que uma remoção concorrente não apague o
+arquivo nesse intervalo, o upload guarda a sua cópia como reserva
+(<hash>.<ext>.<id>.reserva) até o commit, quando ela é descartada ou, se o
+arquivo tiver sumido, volta a ser o arquivo. A remoção (apagar_se_ocioso)
+primeiro toma o arquivo para si, renomeando-o, e só então confere as referências
+e as reservas pendentes, devolvendo-o se houver alguma.
+"""
+
+DIRETORIO_CONTEUDO = "imagens_carros/conteudo"
+
+# Extensão dos arquivos pelo formato detectado no conteúdo (a do nome enviado
+# pelo cliente não é usada)
+EXTENSOES_FORMATOS = {
+    "JPEG": ".jpg",
+    "PNG": ".png",
+    "GIF": ".gif",
+    "WEBP": ".webp",
+    "BMP": ".bmp",
+    "TIFF": ".tif",
+}
+
+
+class ArmazenamentoDeduplicado(FileSystemStorage):
+    tamanho_bloco = 64 * 1024
+
+    def get_available_name(self, name, max_length=None):
+        # O nome definitivo depende do conteúdo e é definido em _save
+        return name
+
+    def _save(self, name, content):
+        resumo = hashlib.sha256()
+        temporario = None
+
+        if hasattr(content, "temporary_file_path"):
+            # Upload já gravado em disco pelo Django: apenas lê para o hash e move
+            origem = content.temporary_file_path()
+            with open(origem, "rb") as arquivo:
+                for bloco in iter(lambda: arquivo.read(self.tamanho_bloco), b""):
+                    resumo.update(bloco)
+        else:
+            diretorio = self.path(DIRETORIO_CONTEUDO)
+            os.makedirs(diretorio, exist_ok=True)
+            descritor, temporario = tempfile.mkstemp(dir=diretorio, suffix=".parcial")
+            with os.fdopen(descritor, "wb") as destino:
+                for bloco in content.chunks(self.tamanho_bloco):
+                    resumo.update(bloco)
+                    destino.write(bloco)
+            origem = temporario
+
+        digest = resumo.hexdigest()
+        extensao = self.extensao(origem)
+        nome = f"{DIRETORIO_CONTEUDO}/{digest[:2]}/{digest}{extensao}"
+        caminho = self.path(nome)
+
+        if os.path.exists(caminho):
+            # Reaproveitamento: a cópia fica reservada até o commit, e o arquivo é
+            # conferido de novo depois de a reserva existir
+            reserva = f"{caminho}.{uuid.uuid4().hex}.reserva"
+            self.mover(origem, reserva, temporario)
+            if os.path.exists(caminho):
+                transaction.on_commit(lambda: self.confirmar_reserva(caminho, reserva))
+                return nome
+            origem, temporario = reserva, reserva
+
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        self.mover(origem, caminho, temporario)
+        if self.file_permissions_mode is not None:
+            os.chmod(caminho, self.file_permissions_mode)
+        return nome
+
+    def gravar_com_nome(self, nome, conteudo):
+        """
+        Grava o conteúdo exatamente em `nome`, substituindo (atomicamente) o arquivo
+        existente, sem a deduplicação de _save. Usado pelo worker para as versões
+        derivadas, que têm caminho fixo ao lado do original, e para regravar o
+        original sem metadados: o nome continua sendo o hash do upload, e um novo
+        upload da mesma foto reaproveita a versão já regravada.
+        """
+        caminho = self.path(nome)
+        os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        descritor, temporario = tempfile.mkstemp(
+            dir=os.path.dirname(caminho), suffix=".parcial"
+        )
+        with os.fdopen(descritor, "wb") as destino:
+            for bloco in conteudo.chunks(self.tamanho_bloco):
+                destino.write(bloco)
+        if self.file_permissions_mode is not None:
+            os.chmod(temporario, self.file_permissions_mode)
+        os.replace(temporario, caminho)
+        return nome
+
+    def mover(self, origem, destino, temporario):
+        if temporario:
+            # Renomeação atômica: leitores nunca veem um arquivo incompleto
+            os.replace(temporario, destino)
+        else:
+            file_move_safe(origem, destino, allow_overwrite=True)
+
+    def extensao(self, caminho):
+        """
+        Extensão do arquivo pelo formato da imagem (vazia se não for reconhecido).
+        """
+        try:
+            with Image.open(caminho) as imagem:
+                formato = imagem.format
+        except (OSError, SyntaxError, ValueError):
+            return ""
+        return EXTENSOES_FORMATOS.get(formato, "")
+
+    def confirmar_reserva(self, caminho, reserva):
+        """
+        Após o commit do registro que reaproveitou o arquivo, descarta a reserva,
+        ou a usa para recriar o arquivo se ele tiver sido removido.
+        """
+        try:
+            if os.path.exists(caminho):
+                os.remove(reserva)
+            else:
+                os.replace(reserva, caminho)
+        except FileNotFoundError:
+            # Reserva antiga já recolhida pelo limpar_media
+            pass
+
+    def reservas_pendentes(self, caminho):
+        return glob.glob(f"{glob.escape(caminho)}.*.reserva")
+
+    def apagar_se_ocioso(self, nome, referenciado):
+        """
+        Apaga o arquivo `nome`, a menos que `referenciado()` seja verdadeiro ou
+        haja reservas pendentes de uploads que o reaproveitaram. O arquivo é
+        antes renomeado (atomicamente): um upload posterior não o encontra e
+        grava uma nova cópia, e um anterior já deixou a sua reserva. Retorna se
+        o arquivo foi apagado.
+        """
+        caminho = self.path(nome)
+        tomado = f"{caminho}.{uuid.uuid4().hex}.removendo"
+        try:
+            os.rename(caminho, tomado)
+        except FileNotFoundError:
+            return False
+        if self.reservas_pendentes(caminho) or referenciado():
+            os.replace(tomado, caminho)
+            return False
+        os.remove(tomado)
+        return True
+
+
+def armazenamento_imagens():
+    """
+    Storage do campo ImagemCarro.imagem (callable, para não fixar a instância
+    nas migrações).
+    """
+    return ArmazenamentoDeduplicado()
@@ -0,0 +1,116 @@
+import os
+
+from django.db import transaction
+
+from .imagens import TAMANHOS_DERIVADAS, caminho_derivada
+
+"""
+Módulo: arquivos
+----------------
+Remoção dos arquivos de imagem que deixam de ser usados pelo catálogo (imagens
+excluídas, diretamente ou em cascata com o carro, e arquivos substituídos).
+A remoção acontece apenas depois do commit da transação que removeu a referência,
+para que um rollback não deixe registros apontando para arquivos apagados, e
+somente se nenhum outro registro ainda referenciar o mesmo arquivo.
+Os arquivos que sobrarem (ex.: falhas de remoção, uploads interrompidos) são
+recolhidos pelo comando `limpar_media`.
+"""
+
+
+def arquivos_derivados(nome, derivadas=None):
+    """
+    Caminhos das versões derivadas do arquivo `nome`: os gravados em `derivadas`
+    (ImagemCarro.derivadas) e os caminhos padrão de cada tamanho.
+    """
+    caminhos = {caminho_derivada(nome, tamanho) for tamanho in TAMANHOS_DERIVADAS}
+    if derivadas and derivadas.get("origem") == nome:
+        caminhos.update(
+            caminho for chave, caminho in derivadas.items() if chave != "origem"
+        )
+    return sorted(caminhos)
+
+
+def nomes_referenciados(nomes):
+    """
+    Retorna, dentre `nomes`, os arquivos ainda usados por alguma imagem ou pelo
+    campo legado imagem_principal de algum carro.
+    """
+    from .models import Carro, ImagemCarro
+
+    nomes = list(nomes)
+    referenciados = set(
+        ImagemCarro.objects.filter(imagem__in=nomes)
+        .values_list("imagem", flat=True)
+        .distinct()
+    )
+    referenciados.update(
+        Carro.objects.filter(imagem_principal__in=nomes)
+        .values_list("imagem_principal", flat=True)
+        .distinct()
+    )
+    return referenciados
+
+
+def remover_se_nao_referenciado(storage, nome, derivadas=None):
+    """
+    Apaga do storage o arquivo `nome` e as suas versões derivadas, caso nenhum
+    registro o referencie mais.
+    """
+    if nome in nomes_referenciados([nome]):
+        return
+    if hasattr(storage, "apagar_se_ocioso"):
+        # As referências são conferidas de novo com o arquivo já tomado pela
+        # remoção, junto com os uploads que o reaproveitaram e não foram
+        # confirmados (ver veiculos.armazenamento)
+        try:
+            if not storage.apagar_se_ocioso(
+                nome, lambda: nome in nomes_referenciados([nome])
+            ):
+                return
+        except OSError:
+            return
+        caminhos = arquivos_derivados(nome, derivadas)
+    else:
+        caminhos = [nome, *arquivos_derivados(nome, derivadas)]
+    for caminho in caminhos:
+        try:
+            storage.delete(caminho)
+        except OSError:
+            # O que não puder ser apagado agora é recolhido pelo limpar_media
+            pass
+
+
+def remover_apos_commit(storage, nome, derivadas=None):
+    """
+    Agenda a remoção do arquivo `nome` (e das versões derivadas) para depois do
+    commit da transação atual. Sem transação, remove imediatamente.
+    """
+    if not nome:
+        return
+    derivadas = dict(derivadas or {})
+    transaction.on_commit(lambda: remover_se_nao_referenciado(storage, nome, derivadas))
+
+
+def percorrer_diretorios(raiz):
+    """
+    Percorre a árvore a partir de `raiz` sem carregá-la inteira na memória,
+    gerando (diretório, arquivos) para cada diretório, com os arquivos como
+    (nome, tamanho em bytes, data de modificação).
+    """
+    pendentes = [raiz]
+    while pendentes:
+        diretorio = pendentes.pop()
+        arquivos = []
+        try:
+            with os.scandir(diretorio) as entradas:
+                for entrada in entradas:
+                    if entrada.is_dir(follow_symlinks=False):
+                        pendentes.append(entrada.path)
+                    elif entrada.is_file(follow_symlinks=False):
+                        informacoes = entrada.stat(follow_symlinks=False)
+                        arquivos.append(
+                            (entrada.name, informacoes.st_size, informacoes.st_mtime)
+                        )
+        except FileNotFoundError:
+            continue
+        yield diretorio, arquivos
@@ -0,0 +1,59 @@
+from django.db.models import Q
+
+from .models import Modelo
+
+"""
+Módulo: autocompletar
+---------------------
+Sugestões de modelos para os campos de seleção do frontend (ação autocompletar
+do ModeloViewSet): os primeiros modelos cuja marca ou nome começam com o texto
+digitado, sem diferenciar maiúsculas, com apenas as colunas exibidas.
+
+A busca é um prefixo (LIKE 'texto%'), que no MySQL percorre apenas a faixa dos
+índices de (nome_marca, nome_modelo, ano_modelo) e de nome_modelo, em vez de
+toda a tabela. Um texto com a marca completa seguida do início do nome (ex.:
+"fiat un") também é aceito.
+"""
+
+# Limites do texto digitado: cada palavra acrescenta uma condição ao filtro
+TAMANHO_MAXIMO_TEXTO = 100
+MAXIMO_PALAVRAS = 6
+
+
+def texto_valido(texto):
+    """
+    Indica se `texto` (já normalizado) está dentro dos limites de tamanho e de
+    palavras.
+    """
+    return len(texto) <= TAMANHO_MAXIMO_TEXTO and (
+        len(texto.split(" ")) <= MAXIMO_PALAVRAS
+    )
+
+
+def filtro_prefixo(texto):
+    """
+    Modelos cuja marca ou nome começam com `texto`, ou cuja marca é o início de
+    `texto` (palavras inteiras) e o nome começa com o restante.
+    """
+    filtro = Q(nome_marca__istartswith=texto) | Q(nome_modelo__istartswith=texto)
+    palavras = texto.split(" ")
+    for divisao in range(1, len(palavras)):
+        filtro |= Q(
+            nome_marca__iexact=" ".join(palavras[:divisao]),
+            nome_modelo__istartswith=" ".join(palavras[divisao:]),
+        )
+    return filtro
+
+
+def sugerir_modelos(texto, limite):
+    """
+    Até `limite` modelos que completam `texto` (já normalizado), em ordem de marca e nome (os
+    anos mais recentes primeiro).
+    """
+    linhas = (
+        Modelo.objects.filter(filtro_prefixo(texto))
+        .order_by("nome_marca", "nome_modelo", "-ano_modelo")
+        .values("id", "nome_marca", "nome_modelo", "ano_modelo")[:limite]
+    )
+    # Mesmo formato de id do ModeloSerializer
+    return [{**linha, "id": f"M{linha['id']:04d}"} for linha in linhas]
@@ -0,0 +1,209 @@
+import re
+import unicodedata
+from functools import lru_cache, reduce
+from itertools import islice
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q, Subquery, Sum
+from rest_framework.filters import BaseFilterBackend
+
+from .models import TermoBusca
+
+"""
+Módulo: busca
+-------------
+Busca textual dos carros por um índice invertido mantido pela aplicação
+(TermoBusca: termo, carro e peso), no lugar do LIKE '%termo%' do SearchFilter,
+que não usa índices e percorre todas as linhas do JOIN de carros e modelos.
+
+- Tokenização para o português: o texto é normalizado sem acentos e em
+  minúsculas, quebrado em palavras e sem as palavras vazias mais comuns, então
+  "Câmbio automático" e "cambio AUTOMATICO" geram os mesmos termos.
+- Cada carro é indexado com a marca, o nome e a descrição do modelo, a cor e a
+  descrição do carro, com pesos por campo. O índice é atualizado pelos sinais
+  de Carro e Modelo (ver veiculos.signals), pelas escritas em lote e pelo
+  comando indexar_busca, que o reconstrói.
+- Na consulta, cada palavra buscada é um prefixo ("autom" encontra
+  "automatico"), procurado como intervalo no índice de termos. Os carros devem
+  conter todas as palavras, e a relevância é a soma dos pesos dos termos
+  encontrados.
+"""
+
+# Palavras ignoradas na indexação e na busca (já sem acentos)
+PALAVRAS_VAZIAS = frozenset(
+    "a o as os ao aos um uma uns umas de da do das dos e em no na nos nas "
+    "com sem para por pela pelo pelas pelos que se ou".split()
+)
+
+# Peso de cada campo na relevância
+PESOS = {
+    "modelo__nome_marca": 3,
+    "modelo__nome_modelo": 3,
+    "cor": 2,
+    "modelo__descricao_modelo": 1,
+    "descricao_carro": 1,
+}
+
+TAMANHO_MAXIMO_TERMO = 40
+
+# Caracteres dos termos, na ordem em que os bancos os comparam
+ALFABETO = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+# Entradas do índice contadas, no máximo, para escolher o termo menos frequente
+LIMITE_FREQUENCIA = 5000
+
+
+def normalizar(texto):
+    """
+    Remove os acentos e converte para minúsculas ("Câmbio" -> "cambio").
+    """
+    decomposto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in decomposto if not unicodedata.combining(c)).casefold()
+
+
+@lru_cache(maxsize=4096)
+def tokenizar(texto):
+    """
+    Termos de `texto`, na ordem, sem repetição e sem as palavras vazias.
+    Palavras de uma letra só são mantidas se forem números. Em cache, pois
+    marcas, modelos e cores se repetem entre os carros indexados.
+    """
+    termos = []
+    for palavra in re.findall(r"[a-z0-9]+", normalizar(texto or "")):
+        termo = palavra[:TAMANHO_MAXIMO_TERMO]
+        if termo in PALAVRAS_VAZIAS or (len(termo) < 2 and not termo.isdigit()):
+            continue
+        if termo not in termos:
+            termos.append(termo)
+    return tuple(termos)
+
+
+def termos_ponderados(linha):
+    """
+    Retorna {termo: peso} de uma linha com as colunas de PESOS. Um termo presente
+    em vários campos soma os pesos.
+    """
+    termos = {}
+    for campo, peso in PESOS.items():
+        for termo in tokenizar(linha[campo]):
+            termos[termo] = termos.get(termo, 0) + peso
+    return termos
+
+
+def indexar_carros(carros, tamanho_lote=2000):
+    """
+    Regrava os termos dos carros do queryset `carros`, em lotes. Retorna a
+    quantidade de carros indexados.
+    """
+    linhas = carros.order_by().values("id", *PESOS).iterator(chunk_size=tamanho_lote)
+    indexados = 0
+    while lote := list(islice(linhas, tamanho_lote)):
+        TermoBusca.objects.filter(carro_id__in=[linha["id"] for linha in lote]).delete()
+        TermoBusca.objects.bulk_create(
+            [
+                TermoBusca(termo=termo, carro_id=linha["id"], peso=peso)
+                for linha in lote
+                for termo, peso in termos_ponderados(linha).items()
+            ],
+            batch_size=5000,
+        )
+        indexados += len(lote)
+    return indexados
+
+
+def indexar_por_faixas(carros, tamanho_lote=2000):
+    """
+    Indexa os carros do queryset `carros` em faixas de id, uma transação por
+    faixa (nenhuma transação trava o índice inteiro, e a busca não fica sem os
+    termos de um carro durante a regravação). Gera a quantidade acumulada de
+    carros indexados após cada faixa.
+    """
+    ultimo, indexados = 0, 0
+    while ids := list(
+        carros.filter(id__gt=ultimo)
+        .order_by("id")
+        .values_list("id", flat=True)[:tamanho_lote]
+    ):
+        with transaction.atomic():
+            indexados += indexar_carros(
+                carros.filter(id__gte=ids[0], id__lte=ids[-1]), tamanho_lote
+            )
+        ultimo = ids[-1]
+        yield indexados
+
+
+def faixa_prefixo(prefixo):
+    """
+    Filtro dos termos que começam com `prefixo`, como intervalo
+    [prefixo, sucessor), que usa o índice em qualquer banco e colação (o LIKE
+    'prefixo%' não usa o índice no SQLite).
+    """
+    fim = prefixo.rstrip(ALFABETO[-1])
+    if not fim:
+        return Q(termo__gte=prefixo)
+    fim = fim[:-1] + ALFABETO[ALFABETO.index(fim[-1]) + 1]
+    return Q(termo__gte=prefixo, termo__lt=fim)
+
+
+def frequencia(faixa, limite=LIMITE_FREQUENCIA):
+    """
+    Quantidade de entradas do índice na `faixa`, contadas até `limite` (só
+    serve para comparar os termos buscados).
+    """
+    return TermoBusca.objects.filter(faixa)[:limite].count()
+
+
+def correspondencias(termos):
+    """
+    Ids dos carros que contêm todos os `termos` (como prefixos). A consulta
+    percorre a faixa do termo menos frequente no índice de termos e confere os
+    demais em cada carro encontrado (EXISTS pelo índice de carro e termo), em
+    vez de agrupar todas as entradas dos termos buscados.
+    """
+    faixas = sorted(map(faixa_prefixo, termos), key=frequencia)
+    carros = TermoBusca.objects.filter(faixas[0])
+    for faixa in faixas[1:]:
+        carros = carros.filter(
+            Exists(TermoBusca.objects.filter(faixa, carro_id=OuterRef("carro_id")))
+        )
+    return carros.values("carro_id")
+
+
+def relevancia(termos):
+    """
+    Soma dos pesos dos termos encontrados no carro da consulta externa.
+    """
+    return Subquery(
+        TermoBusca.objects.filter(
+            reduce(or_, map(faixa_prefixo, termos)), carro_id=OuterRef("pk")
+        )
+        .values("carro_id")
+        .annotate(soma=Sum("peso"))
+        .values("soma")
+    )
+
+
+class BuscaTextualFilter(BaseFilterBackend):
+    """
+    Filtro da listagem pelo parâmetro `q`, com os resultados ordenados pela
+    relevância (a menos que `ordering` seja informado). Deve vir depois do
+    OrderingFilter, que aplica a ordenação padrão do viewset.
+    """
+
+    parametro = "q"
+    parametro_ordenacao = "ordering"
+
+    def filter_queryset(self, request, queryset, view):
+        if self.parametro not in request.query_params:
+            return queryset
+        termos = tokenizar(request.query_params[self.parametro])
+        if not termos:
+            return queryset.none()
+
+        queryset = queryset.filter(id__in=correspondencias(termos))
+        if request.query_params.get(self.parametro_ordenacao):
+            return queryset
+        return queryset.annotate(relevancia=relevancia(termos)).order_by(
+            "-relevancia", *queryset.query.order_by
+        )
@@ -0,0 +1,202 @@
+import hashlib
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from core.metricas import registro
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import (
+    cc_delim_re,
+    get_conditional_response,
+    patch_vary_headers,
+)
+from django.utils.http import parse_http_date_safe
+
+"""
+Módulo: cache_respostas
+-----------------------
+Cache das respostas de leitura (list e retrieve) da API de veículos.
+A chave de uma resposta inclui a versão, no banco, de cada tabela de que ela
+depende (VersaoTabela, incrementada a cada escrita, em qualquer processo: API,
+worker de imagens, comandos de carga). Uma escrita torna as entradas anteriores
+inalcançáveis sem precisar apagá-las: elas expiram pelo TIMEOUT do cache. Um
+acerto é servido com uma única consulta, às versões das tabelas (a mesma que
+valida o GET condicional), sem ler os dados.
+
+O backend é configurado no alias "respostas" de CACHES (ver core.settings).
+Os acertos e falhas são contados no registro de métricas do processo
+(core.metricas), exposto em /metricas/ junto com os percentis por endpoint.
+"""
+
+ALIAS_CACHE = "respostas"
+CONTADOR_ACERTOS = "cache_respostas.acertos"
+CONTADOR_FALHAS = "cache_respostas.falhas"
+
+# Cabeçalhos gravados junto com o corpo da resposta
+CABECALHOS_CACHEADOS = ("ETag", "Last-Modified", "Cache-Control", "Vary")
+
+
+def cache_respostas():
+    return caches[ALIAS_CACHE]
+
+
+def estatisticas():
+    """
+    Retorna os contadores de acertos e falhas do cache de respostas neste processo.
+    """
+    contadores = registro.contadores()
+    acertos = contadores.get(CONTADOR_ACERTOS, 0)
+    falhas = contadores.get(CONTADOR_FALHAS, 0)
+    total = acertos + falhas
+    return {
+        "acertos": acertos,
+        "falhas": falhas,
+        "taxa_acerto": acertos / total if total else None,
+    }
+
+
+class CacheRespostasMixin:
+    """
+    Mixin para ModelViewSet que serve list e retrieve do cache de respostas.
+    A chave combina o formato e o tipo da resposta, o esquema e o host, o
+    caminho, os parâmetros de consulta normalizados (ordenados) e a versão dos
+    modelos em `tabelas_versao` (RespostaCondicionalMixin.versoes_tabelas).
+    Deve preceder RespostaCondicionalMixin na herança, para que um acerto também
+    responda 304 sem gerar a resposta. Só o JSON é cacheado: a API navegável
+    (HTML) contém dados da sessão, como o token CSRF.
+    """
+
+    tabelas_versao = ()
+    formatos_cacheados = ("json",)
+    chave_cache = None
+
+    def list(self, request, *args, **kwargs):
+        return self.responder_do_cache(
+            request,
+            lambda: super(CacheRespostasMixin, self).list(request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.responder_do_cache(
+            request,
+            lambda: super(CacheRespostasMixin, self).retrieve(request, *args, **kwargs),
+        )
+
+    async def alist(self, request, *args, **kwargs):
+        return await self.aresponder_do_cache(
+            request,
+            lambda: super(CacheRespostasMixin, self).alist(request, *args, **kwargs),
+        )
+
+    async def aretrieve(self, request, *args, **kwargs):
+        return await self.aresponder_do_cache(
+            request,
+            lambda: super(CacheRespostasMixin, self).aretrieve(
+                request, *args, **kwargs
+            ),
+        )
+
+    def montar_chave_cache(self, request):
+        parametros = sorted(
+            (nome, valor)
+            for nome, valores in request.query_params.lists()
+            for valor in valores
+        )
+        versoes = self.versoes_tabelas()
+        partes = [
+            request.accepted_renderer.format,
+            # O tipo inclui os parâmetros do renderer (ex.: indent), e o esquema
+            # entra nas URLs absolutas (build_absolute_uri) do corpo
+            request.accepted_media_type,
+            request.scheme,
+            request.get_host(),
+            request.path,
+            urlencode(parametros),
+            # A data da versão distingue contadores recriados (ex.: banco restaurado)
+            *(
+                f"{tabela}:{versao}:{atualizado_em.isoformat()}"
+                for tabela, (versao, atualizado_em) in sorted(versoes.items())
+            ),
+        ]
+        return "resposta:" + hashlib.md5("\n".join(partes).encode()).hexdigest()
+
+    def consultar_cache(self, request):
+        """
+        Retorna a chave da resposta e a entrada do cache (None em uma falha),
+        contabilizando o acerto ou a falha.
+        """
+        chave = self.montar_chave_cache(request)
+        entrada = cache_respostas().get(chave)
+        registro.contar(CONTADOR_FALHAS if entrada is None else CONTADOR_ACERTOS)
+        return chave, entrada
+
+    def responder_do_cache(self, request, gerar_resposta):
+        if request.accepted_renderer.format not in self.formatos_cacheados:
+            return gerar_resposta()
+
+        chave, entrada = self.consultar_cache(request)
+        if entrada is None:
+            # A resposta é gravada em finalize_response, já renderizada
+            self.chave_cache = chave
+            resposta = gerar_resposta()
+            resposta["X-Cache"] = "MISS"
+            return resposta
+        return self.resposta_do_cache(request, entrada)
+
+    async def aresponder_do_cache(self, request, gerar_resposta):
+        if request.accepted_renderer.format not in self.formatos_cacheados:
+            return await gerar_resposta()
+
+        # As operações no cache de cada etapa são feitas em uma única chamada
+        # sync_to_async (o backend pode fazer E/S), em vez de uma por operação
+        chave, entrada = await sync_to_async(self.consultar_cache)(request)
+        if entrada is None:
+            resposta = await gerar_resposta()
+            resposta["X-Cache"] = "MISS"
+            if resposta.status_code == 200:
+                # Gravada já renderizada, como em finalize_response
+                resposta = self.finalize_response(request, resposta)
+                resposta.render()
+                await sync_to_async(cache_respostas().set)(
+                    chave, self.entrada_cache(resposta)
+                )
+            return resposta
+        return self.resposta_do_cache(request, entrada)
+
+    def resposta_do_cache(self, request, entrada):
+        cabecalhos = entrada["cabecalhos"]
+        resposta = get_conditional_response(
+            request,
+            etag=cabecalhos.get("ETag"),
+            last_modified=parse_http_date_safe(cabecalhos.get("Last-Modified", "")),
+        )
+        if resposta is None:
+            resposta = HttpResponse(
+                entrada["conteudo"], content_type=entrada["content_type"]
+            )
+        for nome, valor in cabecalhos.items():
+            if nome == "Vary":
+                # Somado ao Vary que o DRF e os middlewares aplicam na saída
+                patch_vary_headers(resposta, cc_delim_re.split(valor))
+            else:
+                resposta[nome] = valor
+        resposta["X-Cache"] = "HIT"
+        return resposta
+
+    def entrada_cache(self, response):
+        return {
+            "conteudo": response.content,
+            "content_type": response["Content-Type"],
+            "cabecalhos": {
+                nome: response[nome]
+                for nome in CABECALHOS_CACHEADOS
+                if nome in response
+            },
+        }
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.chave_cache and response.status_code == 200:
+            response.render()
+            cache_respostas().set(self.chave_cache, self.entrada_cache(response))
+        return response
@@ -0,0 +1,178 @@
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .models import VersaoTabela
+
+"""
+Módulo: condicional
+-------------------
+Suporte a GET condicional (ETag / Last-Modified) para os viewsets da API.
+Os validadores são calculados sem serializar o corpo e sem varrer as tabelas:
+- list: a partir das versões das tabelas envolvidas (VersaoTabela), uma leitura
+  de poucas linhas independente do tamanho do catálogo e dos filtros;
+- retrieve: a partir das colunas de atualização do próprio registro.
+Quando o cliente já possui a versão atual, a resposta é 304 Not Modified.
+"""
+
+
+class RespostaCondicionalMixin:
+    """
+    Mixin para ModelViewSet que adiciona ETag e Last-Modified às ações list e
+    retrieve. `tabelas_versao` lista os modelos cuja alteração muda a listagem e
+    `campos_versao` as colunas de data de atualização que compõem a representação
+    de um registro (ex.: a do próprio carro e a do modelo relacionado).
+    """
+
+    tabelas_versao = ()
+    campos_versao = ("atualizado_em",)
+    _versoes_tabelas = None
+
+    def versoes_tabelas(self):
+        """
+        Versões das `tabelas_versao` (ver VersaoTabela.versoes), lidas uma vez
+        por requisição: validam a listagem e compõem a chave do cache de
+        respostas.
+        """
+        if self._versoes_tabelas is None:
+            self._versoes_tabelas = VersaoTabela.versoes(*self.tabelas_versao)
+        return self._versoes_tabelas
+
+    async def aversoes_tabelas(self):
+        if self._versoes_tabelas is None:
+            self._versoes_tabelas = await VersaoTabela.aversoes(*self.tabelas_versao)
+        return self._versoes_tabelas
+
+    def list(self, request, *args, **kwargs):
+        versoes = self.versoes_tabelas()
+        return self.responder_condicional(
+            request,
+            *validadores_listagem(versoes),
+            lambda: super(RespostaCondicionalMixin, self).list(
+                request, *args, **kwargs
+            ),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        datas = self.consulta_datas_versao(kwargs).first()
+        if datas is None:
+            # Registro inexistente: o próprio retrieve responde 404
+            return super().retrieve(request, *args, **kwargs)
+        return self.responder_condicional(
+            request,
+            *validadores_registro(datas),
+            lambda: super(RespostaCondicionalMixin, self).retrieve(
+                request, *args, **kwargs
+            ),
+        )
+
+    async def alist(self, request, *args, **kwargs):
+        versoes = await self.aversoes_tabelas()
+        return await self.aresponder_condicional(
+            request,
+            *validadores_listagem(versoes),
+            lambda: super(RespostaCondicionalMixin, self).alist(
+                request, *args, **kwargs
+            ),
+        )
+
+    async def aretrieve(self, request, *args, **kwargs):
+        consulta = await sync_to_async(self.consulta_datas_versao)(kwargs)
+        datas = await consulta.afirst()
+        if datas is None:
+            return await super().aretrieve(request, *args, **kwargs)
+        return await self.aresponder_condicional(
+            request,
+            *validadores_registro(datas),
+            lambda: super(RespostaCondicionalMixin, self).aretrieve(
+                request, *args, **kwargs
+            ),
+        )
+
+    def consulta_datas_versao(self, kwargs):
+        """
+        Colunas de `campos_versao` do registro pedido na URL. Um identificador
+        inválido (ex.: texto em uma chave numérica) resulta em consulta vazia e
+        o retrieve responde 404.
+        """
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = self.filter_queryset(self.get_queryset())
+        try:
+            queryset = queryset.filter(**{self.lookup_field: kwargs[lookup_url_kwarg]})
+        except (TypeError, ValueError, ValidationError):
+            queryset = queryset.none()
+        return queryset.values_list(*self.campos_versao)
+
+    async def aresponder_condicional(
+        self, request, assinatura, ultima_modificacao, gerar_resposta
+    ):
+        validadores = Validadores(request, assinatura, ultima_modificacao)
+        resposta = validadores.resposta_nao_modificada()
+        if resposta is None:
+            resposta = await gerar_resposta()
+        return validadores.aplicar(resposta)
+
+    def responder_condicional(
+        self, request, assinatura, ultima_modificacao, gerar_resposta
+    ):
+        validadores = Validadores(request, assinatura, ultima_modificacao)
+        resposta = validadores.resposta_nao_modificada()
+        if resposta is None:
+            resposta = gerar_resposta()
+        return validadores.aplicar(resposta)
+
+
+def validadores_listagem(versoes):
+    """
+    Assinatura e data de modificação de uma listagem, a partir das versões das
+    tabelas ({tabela: (versão, atualizado_em)}, ver VersaoTabela.versoes).
+    """
+    assinatura = [
+        f"{tabela}:{versao}" for tabela, (versao, _) in sorted(versoes.items())
+    ]
+    datas = [data for _, data in versoes.values()]
+    return assinatura, max(datas) if datas else None
+
+
+def validadores_registro(datas):
+    """
+    Assinatura e data de modificação de um registro, a partir das suas colunas
+    de data de atualização (`campos_versao`).
+    """
+    datas = [data for data in datas if data is not None]
+    return [data.isoformat() for data in datas], max(datas) if datas else None
+
+
+class Validadores:
+    """
+    ETag e Last-Modified de uma resposta de leitura.
+    """
+
+    def __init__(self, request, assinatura, ultima_modificacao):
+        self.request = request
+        # O formato diferencia o JSON da API navegável na mesma URL
+        assinatura = ":".join([request.accepted_renderer.format, *assinatura])
+        self.etag = f'"{hashlib.md5(assinatura.encode()).hexdigest()}"'
+        self.timestamp = (
+            int(ultima_modificacao.timestamp()) if ultima_modificacao else None
+        )
+
+    def resposta_nao_modificada(self):
+        """
+        Retorna a resposta 304 (ou 412) se o cliente já possui a versão atual.
+        """
+        return get_conditional_response(
+            self.request, etag=self.etag, last_modified=self.timestamp
+        )
+
+    def aplicar(self, resposta):
+        if resposta.status_code in (200, 304):
+            resposta["ETag"] = self.etag
+            if self.timestamp is not None:
+                resposta["Last-Modified"] = http_date(self.timestamp)
+            # O navegador revalida a cada uso, em vez de reutilizar por heurística
+            patch_cache_control(resposta, no_cache=True)
+        return resposta
@@ -0,0 +1,215 @@
+import csv
+import io
+import json
+import re
+
+from asgiref.sync import sync_to_async
+from django.core.files.storage import FileSystemStorage
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.encoding import filepath_to_uri
+from django.utils.text import compress_sequence
+from rest_framework import serializers
+from rest_framework.negotiation import BaseContentNegotiation
+
+from .models import Carro, ImagemCarro
+
+"""
+Módulo: exportacao
+------------------
+Exportação do catálogo de carros em streaming (CSV ou JSON lines), usada pela
+ação exportar do CarroViewSet. Os carros são lidos em lotes pela ordem do id,
+cada lote em uma consulta própria (keyset: id > último ORDER BY id LIMIT n), as
+imagens de cada lote em uma única consulta, e cada lote é convertido em texto e
+enviado antes do próximo ser lido: a memória usada não depende do tamanho do
+catálogo. Um único cursor com .iterator() não bastaria: no MySQL, o mysqlclient
+traz todo o resultado para a memória do cliente. Com `Accept-Encoding: gzip`,
+a saída é compactada à medida que é gerada.
+
+As colunas são as aceitas pelo comando importar_inventario, mais as datas e as
+URLs das imagens.
+"""
+
+FORMATOS_EXPORTACAO = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson; charset=utf-8",
+}
+
+# Mesma verificação do GZipMiddleware do Django
+ACEITA_GZIP = re.compile(r"\bgzip\b")
+
+
+class SemNegociacaoConteudo(BaseContentNegotiation):
+    """
+    A exportação não é renderizada pelos renderers do DRF: qualquer Accept é
+    aceito, e as respostas de erro usam o primeiro renderer (JSON).
+    """
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class ExportacaoCarros:
+    colunas = (
+        "id",
+        "nome_marca",
+        "nome_modelo",
+        "ano_modelo",
+        "descricao_modelo",
+        "ano_fabricacao",
+        "cor",
+        "descricao_carro",
+        "data_cadastro",
+        "atualizado_em",
+        "imagens",
+    )
+    colunas_consulta = (
+        "id",
+        "modelo__nome_marca",
+        "modelo__nome_modelo",
+        "modelo__ano_modelo",
+        "modelo__descricao_modelo",
+        "ano_fabricacao",
+        "cor",
+        "descricao_carro",
+        "data_cadastro",
+        "atualizado_em",
+        "imagem_principal",
+    )
+
+    # Carros lidos (e convertidos em texto) por vez
+    tamanho_lote = 2000
+
+    # Mesma conversão de datas (fuso e formato) dos serializers
+    campo_data = serializers.DateTimeField()
+
+    def __init__(self, request, queryset, formato):
+        self.request = request
+        self.queryset = queryset
+        self.formato = formato
+        self.url_imagem = self.montador_urls(
+            ImagemCarro._meta.get_field("imagem").storage
+        )
+        self.url_imagem_principal = self.montador_urls(
+            Carro._meta.get_field("imagem_principal").storage
+        )
+
+    def montador_urls(self, armazenamento):
+        """
+        Função que monta a URL absoluta de um arquivo do `armazenamento`. No
+        FileSystemStorage, o prefixo (MEDIA_URL absoluta) é calculado uma única
+        vez, em vez de dois urljoin por arquivo como em storage.url e
+        build_absolute_uri.
+        """
+        if isinstance(armazenamento, FileSystemStorage):
+            prefixo = self.request.build_absolute_uri(armazenamento.base_url)
+            return lambda nome: prefixo + filepath_to_uri(nome).lstrip("/")
+        return lambda nome: self.request.build_absolute_uri(armazenamento.url(nome))
+
+    def resposta(self):
+        partes = (parte.encode() for parte in self.partes())
+        compactar = ACEITA_GZIP.search(
+            self.request.META.get("HTTP_ACCEPT_ENCODING", "")
+        )
+        if compactar:
+            partes = compress_sequence(partes)
+        if isinstance(self.request._request, ASGIRequest):
+            # Sob ASGI, um iterador síncrono seria lido inteiro antes do envio
+            partes = iterar_em_thread(partes)
+
+        resposta = StreamingHttpResponse(
+            partes, content_type=FORMATOS_EXPORTACAO[self.formato]
+        )
+        resposta["Content-Disposition"] = (
+            f'attachment; filename="carros.{self.formato}"'
+        )
+        if compactar:
+            resposta["Content-Encoding"] = "gzip"
+        patch_vary_headers(resposta, ("Accept-Encoding",))
+        return resposta
+
+    def partes(self):
+        """
+        Gera o texto da exportação, um lote de carros por vez.
+        """
+        if self.formato == "csv":
+            yield self.texto_csv([self.colunas])
+        for lote in self.lotes():
+            if self.formato == "csv":
+                yield self.texto_csv(self.linha_csv(registro) for registro in lote)
+            else:
+                yield "".join(
+                    json.dumps(registro, ensure_ascii=False) + "\n" for registro in lote
+                )
+
+    def lotes(self):
+        consulta = (
+            self.queryset.prefetch_related(None)
+            .order_by("id")
+            .values(*self.colunas_consulta)
+        )
+        ultimo = 0
+        while lote := list(consulta.filter(id__gt=ultimo)[: self.tamanho_lote]):
+            imagens = self.urls_imagens([linha["id"] for linha in lote])
+            yield [self.registro(linha, imagens.get(linha["id"])) for linha in lote]
+            ultimo = lote[-1]["id"]
+
+    def urls_imagens(self, ids):
+        """
+        URLs das imagens dos carros `ids`, na ordem de exibição, em uma única
+        consulta: {carro_id: [url, ...]}.
+        """
+        imagens = {}
+        for carro_id, nome in (
+            ImagemCarro.objects.filter(carro_id__in=ids)
+            .order_by("carro_id", *ImagemCarro._meta.ordering)
+            .values_list("carro_id", "imagem")
+        ):
+            imagens.setdefault(carro_id, []).append(self.url_imagem(nome))
+        return imagens
+
+    def registro(self, linha, imagens):
+        if not imagens and linha["imagem_principal"]:
+            # Carros anteriores à galeria têm apenas o campo legado
+            imagens = [self.url_imagem_principal(linha["imagem_principal"])]
+        return {
+            "id": linha["id"],
+            "nome_marca": linha["modelo__nome_marca"],
+            "nome_modelo": linha["modelo__nome_modelo"],
+            "ano_modelo": linha["modelo__ano_modelo"],
+            "descricao_modelo": linha["modelo__descricao_modelo"],
+            "ano_fabricacao": linha["ano_fabricacao"],
+            "cor": linha["cor"],
+            "descricao_carro": linha["descricao_carro"],
+            "data_cadastro": self.campo_data.to_representation(linha["data_cadastro"]),
+            "atualizado_em": self.campo_data.to_representation(linha["atualizado_em"]),
+            "imagens": imagens or [],
+        }
+
+    def linha_csv(self, registro):
+        # No CSV, as URLs das imagens ficam em uma única coluna, separadas por espaço
+        return [
+            " ".join(valor) if coluna == "imagens" else valor
+            for coluna, valor in registro.items()
+        ]
+
+    def texto_csv(self, linhas):
+        texto = io.StringIO()
+        csv.writer(texto).writerows(linhas)
+        return texto.getvalue()
+
+
+async def iterar_em_thread(partes):
+    """
+    Percorre o iterador síncrono `partes` em sync_to_async, uma parte por vez,
+    sempre na mesma thread (thread_sensitive): as consultas de todos os lotes
+    usam a conexão do banco dessa thread, a mesma do restante da requisição.
+    """
+    fim = object()
+    proxima = sync_to_async(next)
+    while (parte := await proxima(partes, fim)) is not fim:
+        yield parte
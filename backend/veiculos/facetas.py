@@ -0,0 +1,65 @@
+from django.db.models import Count
+
+from .models import Modelo
+
+"""
+Módulo: facetas
+---------------
+Contagem de carros por marca, modelo, cor e ano de fabricação (ação facetas do
+CarroViewSet), sobre o queryset já filtrado da listagem. Cada faceta é um único
+GROUP BY: cor e ano_fabricacao pelos índices compostos da tabela de carros, e
+marca e modelo a partir de um GROUP BY por modelo_id (índice da chave
+estrangeira, sem JOIN com a tabela de modelos), somado em memória com os nomes
+dos modelos encontrados.
+
+As facetas são identificadas pelos nomes dos filtros da listagem, para que o
+valor escolhido possa ser enviado de volta como filtro.
+"""
+
+FACETAS = ("modelo__nome_marca", "modelo__nome_modelo", "cor", "ano_fabricacao")
+
+
+def contar_por(queryset, campo):
+    """
+    Retorna {valor: quantidade} de `campo` no queryset.
+    """
+    return dict(
+        queryset.order_by()
+        .values_list(campo)
+        .annotate(quantidade=Count("*"))
+        .values_list(campo, "quantidade")
+    )
+
+
+def ordenar(contagens, limite):
+    """
+    Valores mais frequentes primeiro (empates pelo valor), limitados a `limite`.
+    """
+    itens = sorted(contagens.items(), key=lambda item: (-item[1], item[0]))[:limite]
+    return [{"valor": valor, "quantidade": quantidade} for valor, quantidade in itens]
+
+
+def contar_facetas(queryset, limite):
+    """
+    Retorna o total de carros do queryset e as contagens de cada faceta.
+    """
+    queryset = queryset.prefetch_related(None)
+    por_modelo = contar_por(queryset, "modelo_id")
+    marcas, modelos = {}, {}
+    for id, nome_marca, nome_modelo in Modelo.objects.filter(
+        id__in=por_modelo
+    ).values_list("id", "nome_marca", "nome_modelo"):
+        quantidade = por_modelo[id]
+        marcas[nome_marca] = marcas.get(nome_marca, 0) + quantidade
+        modelos[nome_modelo] = modelos.get(nome_modelo, 0) + quantidade
+
+    contagens = {
+        "modelo__nome_marca": marcas,
+        "modelo__nome_modelo": modelos,
+        "cor": contar_por(queryset, "cor"),
+        "ano_fabricacao": contar_por(queryset, "ano_fabricacao"),
+    }
+    return {
+        "total": sum(por_modelo.values()),
+        "facetas": {faceta: ordenar(contagens[faceta], limite) for faceta in FACETAS},
+    }
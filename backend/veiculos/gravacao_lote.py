@@ -0,0 +1,200 @@
+"""
+Módulo: gravacao_lote
+---------------------
+Cadastro e atualização de muitos carros em uma requisição (ação lote do
+CarroViewSet), para clientes que sincronizam o estoque. Em vez de uma escrita
+por carro pelo CarroSerializer, com uma consulta de modelo por carro:
+
+- cada item é validado pelo CarroLoteSerializer (uma instância para todo o
+  lote), e os itens inválidos são recusados sem impedir a gravação dos demais;
+- os modelos de todo o lote são conferidos em uma única consulta (IN), e os
+  carros a atualizar são lidos em outra;
+- as gravações são feitas em uma transação, com bulk_create para os carros
+  novos e um upsert pelo id (bulk_create com update_conflicts) para os
+  alterados, em qualquer banco, e o índice da busca textual e a versão da
+  tabela são atualizados uma única vez.
+
+O resultado traz, para cada item, na ordem do envio, o status (criado,
+atualizado ou erro), o id do carro e os erros de validação.
+"""
+
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from rest_framework import serializers
+
+from .busca import indexar_carros
+from .models import Carro, Modelo, VersaoTabela
+from .serializers import CarroLoteSerializer
+
+# Itens aceitos por requisição
+LIMITE_LOTE = 5000
+
+
+def opcoes_upsert(campos_unicos):
+    """
+    Opções do bulk_create com update_conflicts para o conflito em
+    `campos_unicos`.
+    """
+    # O MySQL não aceita indicar os campos do conflito (ON DUPLICATE KEY)
+    if connection.features.supports_update_conflicts_with_target:
+        return {"unique_fields": campos_unicos}
+    return {}
+
+
+class GravacaoLoteCarros:
+    # Linhas por comando INSERT/UPDATE
+    tamanho_lote = 500
+
+    def __init__(self, itens):
+        self.itens = itens
+        self.resultados = [None] * len(itens)
+
+    def gravar(self):
+        """
+        Valida e grava os itens. Retorna os resultados por item.
+        """
+        validos = self.validar()
+        novos = {i: dados for i, dados in validos.items() if not dados.get("id")}
+        alterados = {i: dados for i, dados in validos.items() if dados.get("id")}
+
+        with transaction.atomic():
+            gravados = self.atualizar(alterados) + self.criar(novos)
+            if gravados:
+                # As gravações em lote não disparam os sinais que indexam a busca
+                # textual e invalidam o cache
+                indexar_carros(Carro.objects.filter(id__in=gravados))
+                VersaoTabela.incrementar(Carro)
+        return self.resultados
+
+    def validar(self):
+        """
+        Retorna {índice: dados validados} dos itens válidos e registra o erro dos
+        demais.
+        """
+        criacao = CarroLoteSerializer()
+        # Na atualização, apenas os campos enviados são alterados
+        atualizacao = CarroLoteSerializer(partial=True)
+        validos, ids = {}, set()
+        for indice, item in enumerate(self.itens):
+            atualizar = isinstance(item, dict) and item.get("id") is not None
+            try:
+                dados = (atualizacao if atualizar else criacao).run_validation(item)
+            except serializers.ValidationError as erro:
+                self.recusar(indice, erro.detail)
+                continue
+            if dados.get("id"):
+                if dados["id"] in ids:
+                    self.recusar(indice, {"id": ["Carro repetido no lote."]})
+                    continue
+                ids.add(dados["id"])
+            validos[indice] = dados
+
+        modelos = {
+            dados["modelo_id"] for dados in validos.values() if "modelo_id" in dados
+        }
+        existentes = set(
+            Modelo.objects.filter(id__in=modelos).values_list("id", flat=True)
+        )
+        for indice, dados in list(validos.items()):
+            if "modelo_id" in dados and dados["modelo_id"] not in existentes:
+                self.recusar(indice, {"modelo_id": ["Modelo não encontrado."]})
+                del validos[indice]
+        return validos
+
+    def atualizar(self, alterados):
+        """
+        Aplica os campos enviados aos carros existentes e os grava em upsert
+        pelo id: um INSERT ... ON CONFLICT por lote de linhas, em vez do
+        bulk_update, que monta um CASE por campo e linha. Retorna os ids
+        atualizados.
+        """
+        carros = Carro.objects.select_for_update().in_bulk(
+            [dados["id"] for dados in alterados.values()]
+        )
+        agora = timezone.now()
+        campos = {"atualizado_em"}
+        atualizados = []
+        for indice, dados in alterados.items():
+            carro = carros.get(dados["id"])
+            if carro is None:
+                self.recusar(indice, {"id": ["Carro não encontrado."]})
+                continue
+            for campo, valor in dados.items():
+                setattr(carro, campo, valor)
+            carro.atualizado_em = agora
+            campos.update(dados)
+            atualizados.append(carro)
+            self.resultados[indice] = self.resultado(indice, "atualizado", carro)
+
+        campos.discard("id")
+        if "modelo_id" in campos:
+            campos.remove("modelo_id")
+            campos.add("modelo")
+        # Os carros estão travados (select_for_update): o conflito pelo id sempre
+        # acontece, e apenas os campos enviados são sobrescritos
+        Carro.objects.bulk_create(
+            atualizados,
+            batch_size=self.tamanho_lote,
+            update_conflicts=True,
+            update_fields=sorted(campos),
+            **opcoes_upsert(["id"]),
+        )
+        return [carro.id for carro in atualizados]
+
+    def criar(self, novos):
+        """
+        Cria os carros novos com bulk_create. Retorna os ids criados.
+        """
+        carros = {indice: Carro(**dados) for indice, dados in novos.items()}
+        retorna_chaves = connection.features.can_return_rows_from_bulk_insert
+        if not retorna_chaves:
+            ultimo_id = Carro.objects.aggregate(ultimo=Max("id"))["ultimo"] or 0
+        Carro.objects.bulk_create(carros.values(), batch_size=self.tamanho_lote)
+        if not retorna_chaves:
+            self.recuperar_ids(list(carros.values()), ultimo_id)
+        for indice, carro in carros.items():
+            self.resultados[indice] = self.resultado(indice, "criado", carro)
+        return [carro.id for carro in carros.values()]
+
+    def recuperar_ids(self, carros, ultimo_id):
+        """
+        Preenche o id dos `carros` inseridos por um banco que não os retorna no
+        bulk_create (ex.: MySQL), relendo as linhas com id acima de `ultimo_id`,
+        o maior antes da inserção, em uma única consulta. As chaves de cada
+        INSERT são crescentes na ordem das linhas, então as linhas do lote
+        aparecem, pelo id, na ordem dos carros; linhas de outras transações
+        (visíveis fora do REPEATABLE READ) são puladas pelo conteúdo.
+        """
+        campos = ("modelo_id", "ano_fabricacao", "cor", "descricao_carro")
+        pendentes = iter(carros)
+        carro = next(pendentes, None)
+        for linha in (
+            Carro.objects.filter(id__gt=ultimo_id)
+            .order_by("id")
+            .values("id", *campos)
+            .iterator()
+        ):
+            if carro is None:
+                break
+            if all(linha[campo] == getattr(carro, campo) for campo in campos):
+                carro.id = linha["id"]
+                carro = next(pendentes, None)
+        if carro is not None:
+            raise RuntimeError("Carros do lote não encontrados após a inserção.")
+
+    def resultado(self, indice, situacao, carro):
+        # Mesmo formato de id do CarroSerializer
+        return {"indice": indice, "status": situacao, "id": f"{carro.id:04d}"}
+
+    def recusar(self, indice, erros):
+        self.resultados[indice] = {"indice": indice, "status": "erro", "erros": erros}
+
+    def resumo(self):
+        """
+        Quantidade de itens por status.
+        """
+        contagem = {"criado": 0, "atualizado": 0, "erro": 0}
+        for resultado in self.resultados:
+            contagem[resultado["status"]] += 1
+        return contagem
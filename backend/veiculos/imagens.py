@@ -0,0 +1,110 @@
+import io
+import os
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+"""
+Módulo: imagens
+---------------
+Geração das versões derivadas (redimensionadas) das imagens dos veículos.
+Para cada imagem original são gravadas, ao lado do arquivo original, as versões
+definidas em TAMANHOS_DERIVADAS, em WebP (ou JPEG, se o Pillow não tiver suporte
+a WebP). A listagem e o admin usam a miniatura em vez da foto original.
+O próprio original, que também é servido pela API, é regravado sem os metadados
+(EXIF com GPS e câmera, XMP, comentários).
+A geração roda fora da requisição, no comando `processar_imagens`.
+"""
+
+# Nome da versão -> maior dimensão (largura ou altura) em pixels
+TAMANHOS_DERIVADAS = {
+    "miniatura": 320,
+    "card": 800,
+    "completa": 1600,
+}
+
+FORMATO_DERIVADAS = "WEBP" if features.check("webp") else "JPEG"
+EXTENSAO_DERIVADAS = {"WEBP": "webp", "JPEG": "jpg"}[FORMATO_DERIVADAS]
+OPCOES_DERIVADAS = {
+    "WEBP": {"quality": 80, "method": 4},
+    "JPEG": {"quality": 85, "optimize": True, "progressive": True},
+}[FORMATO_DERIVADAS]
+
+# Chaves de Image.info com metadados a remover do original
+METADADOS = ("exif", "xmp", "XML:com.adobe.xmp", "comment")
+TAG_ORIENTACAO = 0x0112
+
+
+def caminho_derivada(nome_original, tamanho):
+    """
+    Caminho da versão derivada, ao lado do original:
+    imagens_carros/<id>/foto.jpg -> imagens_carros/<id>/derivadas/foto_miniatura.webp
+    """
+    diretorio, arquivo = os.path.split(nome_original)
+    base = os.path.splitext(arquivo)[0]
+    return os.path.join(
+        diretorio, "derivadas", f"{base}_{tamanho}.{EXTENSAO_DERIVADAS}"
+    )
+
+
+def original_sem_metadados(original):
+    """
+    Conteúdo do arquivo original regravado sem metadados, no mesmo formato, ou
+    None se não houver o que remover (ou se for animado). Como a tag de orientação
+    também sai, a rotação da câmera é aplicada aos pixels; o perfil de cor é mantido.
+    """
+    if not any(chave in original.info for chave in METADADOS):
+        return None
+    if getattr(original, "n_frames", 1) > 1:
+        return None
+
+    opcoes = {"icc_profile": original.info.get("icc_profile"), "comment": b""}
+    if original.getexif().get(TAG_ORIENTACAO, 1) != 1:
+        imagem = ImageOps.exif_transpose(original)
+        if original.format in ("JPEG", "WEBP"):
+            opcoes["quality"] = 95
+    else:
+        imagem = original
+        if original.format == "JPEG":
+            # Reaproveita as tabelas de quantização: sem perda adicional visível
+            opcoes["quality"] = "keep"
+        elif original.format == "WEBP":
+            opcoes["quality"] = 95
+
+    conteudo = io.BytesIO()
+    imagem.save(conteudo, original.format, **opcoes)
+    return conteudo.getvalue()
+
+
+def gerar_derivadas(nome_original, storage):
+    """
+    Gera e grava no storage (o do campo ImagemCarro.imagem) todas as versões de
+    TAMANHOS_DERIVADAS a partir do arquivo `nome_original`, e regrava o original
+    sem metadados. Retorna o dicionário gravado em ImagemCarro.derivadas, com o
+    nome do arquivo de origem e o caminho de cada versão.
+
+    Não acessa o banco de dados, então pode rodar em um processo separado.
+    """
+    with storage.open(nome_original, "rb") as origem:
+        original = Image.open(origem)
+        original.load()
+        sem_metadados = original_sem_metadados(original)
+    imagem = ImageOps.exif_transpose(original)  # Aplica a rotação da câmera
+    imagem = imagem.convert("RGB")
+
+    if sem_metadados is not None:
+        storage.gravar_com_nome(nome_original, ContentFile(sem_metadados))
+
+    derivadas = {"origem": nome_original}
+    for tamanho, dimensao in TAMANHOS_DERIVADAS.items():
+        versao = imagem.copy()
+        versao.thumbnail((dimensao, dimensao), Image.LANCZOS)
+
+        # Os metadados EXIF (GPS, câmera) não são copiados para as versões
+        conteudo = io.BytesIO()
+        versao.save(conteudo, FORMATO_DERIVADAS, **OPCOES_DERIVADAS)
+
+        derivadas[tamanho] = storage.gravar_com_nome(
+            caminho_derivada(nome_original, tamanho), ContentFile(conteudo.getvalue())
+        )
+    return derivadas
@@ -0,0 +1,179 @@
+from abc import ABC, abstractmethod
+
+from asgiref.sync import sync_to_async
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from core.metricas import medir_serializacao
+from .models import Carro, ImagemCarro
+
+"""
+Módulo: listagem_rapida
+-----------------------
+Caminho rápido das listagens de modelos e carros: a página é lida com .values()
+(colunas do registro e dos relacionamentos em uma única consulta com JOIN) e cada
+linha é convertida diretamente no dicionário da resposta, sem instanciar models
+nem serializers do DRF. A saída deve ser idêntica, byte a byte, à do serializer
+correspondente (ModeloSerializer e CarroListaSerializer), o que é verificado
+pelos testes de paridade: ao alterar um desses serializers, altere também a
+representação aqui.
+"""
+
+
+class RepresentacaoValores(ABC):
+    """
+    Converte as linhas de .values(*colunas) na representação de um serializer.
+    As subclasses definem as colunas lidas e a conversão de cada linha.
+    """
+
+    colunas = ()
+
+    def __init__(self, request):
+        self.request = request
+
+    def representar(self, linhas):
+        return [self.representar_linha(linha) for linha in linhas]
+
+    @abstractmethod
+    def representar_linha(self, linha):
+        """
+        Dicionário da resposta para uma linha de .values(*colunas).
+        """
+
+
+class RepresentacaoModelo(RepresentacaoValores):
+    """
+    Equivalente a ModeloSerializer.
+    """
+
+    colunas = ("id", "nome_marca", "nome_modelo", "descricao_modelo", "ano_modelo")
+
+    def representar_linha(self, linha):
+        return {
+            "id": f"M{linha['id']:04d}",
+            "nome_marca": linha["nome_marca"],
+            "nome_modelo": linha["nome_modelo"],
+            "descricao_modelo": linha["descricao_modelo"],
+            "ano_modelo": linha["ano_modelo"],
+        }
+
+
+class RepresentacaoCarroLista(RepresentacaoValores):
+    """
+    Equivalente a CarroListaSerializer, com o modelo resumido e a URL da miniatura
+    da imagem principal lidos pelos JOINs com Modelo e com a imagem_capa.
+    """
+
+    colunas = (
+        "id",
+        "modelo__id",
+        "modelo__nome_marca",
+        "modelo__nome_modelo",
+        "modelo__ano_modelo",
+        "ano_fabricacao",
+        "cor",
+        "imagem_principal",
+        "imagem_capa__imagem",
+        "imagem_capa__derivadas",
+        "data_cadastro",
+    )
+
+    # Mesma conversão de datas (fuso e formato) do serializer
+    campo_data = serializers.DateTimeField()
+
+    def __init__(self, request):
+        super().__init__(request)
+        self.armazenamento_imagens = ImagemCarro._meta.get_field("imagem").storage
+        self.armazenamento_principal = Carro._meta.get_field("imagem_principal").storage
+
+    def representar_linha(self, linha):
+        return {
+            "id": f"{linha['id']:04d}",
+            "modelo": {
+                "id": f"M{linha['modelo__id']:04d}",
+                "nome_marca": linha["modelo__nome_marca"],
+                "nome_modelo": linha["modelo__nome_modelo"],
+                "ano_modelo": linha["modelo__ano_modelo"],
+            },
+            "ano_fabricacao": linha["ano_fabricacao"],
+            "cor": linha["cor"],
+            "imagem_principal_miniatura_url": self.url_miniatura(linha),
+            "data_cadastro": self.campo_data.to_representation(linha["data_cadastro"]),
+        }
+
+    def url_miniatura(self, linha):
+        """
+        Mesma regra de ImagemPrincipalUrlsMixin.get_imagem_principal_miniatura_url
+        e de ImagemCarro.url_derivada.
+        """
+        nome = linha["imagem_capa__imagem"]
+        if nome:
+            derivadas = linha["imagem_capa__derivadas"] or {}
+            caminho = None
+            if derivadas.get("origem") == nome:
+                caminho = derivadas.get("miniatura")
+            return self.request.build_absolute_uri(
+                self.armazenamento_imagens.url(caminho or nome)
+            )
+
+        if linha["imagem_principal"]:
+            return self.request.build_absolute_uri(
+                self.armazenamento_principal.url(linha["imagem_principal"])
+            )
+        return None
+
+
+class ListagemRapidaMixin:
+    """
+    Mixin para ModelViewSet que serve a ação list pela `representacao_valores`,
+    com os mesmos filtros, busca, ordenação e paginação do viewset. Deve ficar
+    imediatamente antes de ModelViewSet na herança, para que o cache e o GET
+    condicional continuem envolvendo a listagem. Com `fields` (CamposEsparsosMixin)
+    a listagem volta a usar o serializer.
+    """
+
+    representacao_valores = None
+
+    def list(self, request, *args, **kwargs):
+        if not self.usa_representacao_valores():
+            return super().list(request, *args, **kwargs)
+
+        representacao, linhas = self.linhas_valores(request)
+        page = self.paginate_queryset(linhas)
+        data = self.representar(representacao, linhas if page is None else page)
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    async def alist(self, request, *args, **kwargs):
+        if not self.usa_representacao_valores():
+            return await super().alist(request, *args, **kwargs)
+
+        representacao, linhas = await sync_to_async(self.linhas_valores)(request)
+        page = None
+        if self.paginator is not None:
+            page = await self.paginator.apaginate_queryset(linhas, request, view=self)
+        if page is not None:
+            data = await sync_to_async(self.representar)(representacao, page)
+            return self.get_paginated_response(data)
+        linhas = [linha async for linha in linhas]
+        return Response(await sync_to_async(self.representar)(representacao, linhas))
+
+    def usa_representacao_valores(self):
+        return (
+            self.representacao_valores is not None and self.campos_solicitados() is None
+        )
+
+    def linhas_valores(self, request):
+        representacao = self.representacao_valores(request)
+        queryset = self.filter_queryset(self.get_queryset())
+        linhas = queryset.values(*representacao.colunas)
+        # O COUNT(*) da paginação por página é feito sem os JOINs que o .values()
+        # adiciona para as colunas dos relacionamentos (como no select_related)
+        linhas.count = queryset.count
+        linhas.acount = queryset.acount
+        return representacao, linhas
+
+    def representar(self, representacao, linhas):
+        with medir_serializacao():
+            return representacao.representar(linhas)
@@ -0,0 +1,273 @@
+import io
+import json
+import random
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+from collections import defaultdict
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from core.metricas import percentil
+from veiculos.models import Carro, ImagemCarro, Modelo
+from veiculos.serializers import CarroSerializer
+
+# Tempo de serialização informado pelo core.metricas no cabeçalho Server-Timing
+SERIALIZACAO_SERVER_TIMING = re.compile(r"serializacao;dur=([\d.]+)")
+
+
+class Command(BaseCommand):
+    help = (
+        "Executa os cenários de benchmark da API (listagem, detalhe, filtro, "
+        "cadastro com imagens e reordenação) pelo cliente de testes do Django e "
+        "emite um JSON com vazão, latência (p50/p95/p99) e consultas por cenário. "
+        "As escritas são desfeitas ao final e os uploads vão para um diretório "
+        "temporário. Use o comando semear_catalogo para gerar os dados."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--iteracoes",
+            type=int,
+            default=100,
+            help="Requisições medidas por cenário.",
+        )
+        parser.add_argument(
+            "--aquecimento",
+            type=int,
+            default=5,
+            help="Requisições descartadas antes da medição de cada cenário.",
+        )
+        parser.add_argument("--semente", type=int, default=42)
+        parser.add_argument(
+            "--com-cache",
+            action="store_true",
+            help="Mantém o cache de respostas ligado (por padrão é desligado).",
+        )
+        parser.add_argument("--saida", help="Arquivo onde gravar o JSON.")
+        parser.add_argument(
+            "--comparar",
+            help="JSON de uma execução anterior; exibe a variação do p95 e das consultas.",
+        )
+
+    def handle(self, *args, **options):
+        # Carros sorteados nos cenários de detalhe e reordenação, com as imagens
+        # carregadas antes, para não contar essas consultas nas medições
+        self.imagens = defaultdict(list)
+        carros = Carro.objects.order_by("id").values_list("id", flat=True)[:1000]
+        for carro_id, imagem_id in ImagemCarro.objects.filter(
+            carro_id__in=list(carros)
+        ).values_list("carro_id", "id"):
+            self.imagens[carro_id].append(imagem_id)
+        self.carros = sorted(self.imagens)
+        self.modelo = Modelo.objects.first()
+        if not self.carros or self.modelo is None:
+            raise CommandError(
+                "Catálogo vazio: execute antes `python manage.py semear_catalogo`."
+            )
+
+        self.aleatorio = random.Random(options["semente"])
+        self.imagem = self.gerar_imagem()
+
+        media_root = tempfile.mkdtemp(prefix="benchmark_api_")
+        ajustes = {
+            "ALLOWED_HOSTS": ["testserver"],
+            "MEDIA_ROOT": media_root,
+            # Todas as requisições medidas, para obter o tempo de serialização
+            "METRICAS_AMOSTRAGEM": 1,
+        }
+        if not options["com_cache"]:
+            ajustes["CACHES"] = {
+                "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+                "respostas": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+            }
+
+        resultado = {
+            "commit": self.commit_atual(),
+            "data": timezone.now().isoformat(),
+            "banco": connection.vendor,
+            "catalogo": {
+                "modelos": Modelo.objects.count(),
+                "carros": Carro.objects.count(),
+            },
+            "iteracoes": options["iteracoes"],
+            "cenarios": {},
+        }
+        try:
+            with override_settings(**ajustes), transaction.atomic():
+                self.client = Client()
+                for nome, requisitar in self.cenarios():
+                    resultado["cenarios"][nome] = self.medir(
+                        requisitar, options["iteracoes"], options["aquecimento"]
+                    )
+                transaction.set_rollback(True)
+        finally:
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        saida = json.dumps(resultado, indent=2, ensure_ascii=False)
+        if options["saida"]:
+            with open(options["saida"], "w", encoding="utf-8") as arquivo:
+                arquivo.write(saida)
+        else:
+            self.stdout.write(saida)
+
+        if options["comparar"]:
+            with open(options["comparar"], encoding="utf-8") as arquivo:
+                self.comparar(json.load(arquivo), resultado)
+
+    def cenarios(self):
+        lista = reverse("carro-list")
+        campos_completos = ",".join(
+            nome
+            for nome, campo in CarroSerializer().fields.items()
+            if not campo.write_only
+        )
+        return [
+            ("listagem", lambda: self.client.get(lista)),
+            ("listagem_100", lambda: self.client.get(lista, {"page_size": 100})),
+            # Representação completa (anterior à listagem compacta), para comparação
+            (
+                "listagem_100_completa",
+                lambda: self.client.get(
+                    lista, {"page_size": 100, "fields": campos_completos}
+                ),
+            ),
+            (
+                "listagem_cursor",
+                lambda: self.client.get(lista, {"paginacao": "cursor"}),
+            ),
+            (
+                "detalhe",
+                lambda: self.client.get(
+                    reverse("carro-detail", args=[self.aleatorio.choice(self.carros)])
+                ),
+            ),
+            (
+                "filtro",
+                lambda: self.client.get(
+                    lista, {"cor": "Prata", "ano_fabricacao": 2020}
+                ),
+            ),
+            # Busca com LIKE (search=) e pelo índice de termos (q=), com um termo
+            # frequente e com termos seletivos
+            ("busca", lambda: self.client.get(lista, {"search": "Fiat"})),
+            ("busca_indexada", lambda: self.client.get(lista, {"q": "Fiat"})),
+            (
+                "busca_seletiva",
+                lambda: self.client.get(lista, {"search": "Modelo 00042"}),
+            ),
+            (
+                "busca_indexada_seletiva",
+                lambda: self.client.get(lista, {"q": "Modelo 00042"}),
+            ),
+            ("modelos", lambda: self.client.get(reverse("modelo-list"))),
+            ("cadastro_com_imagens", self.cadastrar),
+            ("reordenacao", self.reordenar),
+        ]
+
+    def cadastrar(self):
+        return self.client.post(
+            reverse("carro-list"),
+            {
+                "modelo_id": self.modelo.id,
+                "ano_fabricacao": 2020,
+                "cor": "Prata",
+                "imagens_para_upload": [
+                    SimpleUploadedFile(f"foto_{i}.jpg", self.imagem, "image/jpeg")
+                    for i in range(3)
+                ],
+            },
+        )
+
+    def reordenar(self):
+        carro_id = self.aleatorio.choice(self.carros)
+        ids = list(self.imagens[carro_id])
+        self.aleatorio.shuffle(ids)
+        return self.client.post(
+            reverse("carro-reordenar-imagens", args=[carro_id]),
+            {
+                "imagens": [
+                    {"id": imagem_id, "ordem": ordem}
+                    for ordem, imagem_id in enumerate(ids, start=1)
+                ]
+            },
+            content_type="application/json",
+        )
+
+    def medir(self, requisitar, iteracoes, aquecimento):
+        for _ in range(aquecimento):
+            self.verificar(requisitar())
+
+        tempos, consultas, tamanhos, serializacao = [], [], [], []
+        inicio = time.perf_counter()
+        for _ in range(iteracoes):
+            with CaptureQueriesContext(connection) as capturadas:
+                antes = time.perf_counter()
+                response = requisitar()
+                tempos.append((time.perf_counter() - antes) * 1000)
+            self.verificar(response)
+            consultas.append(len(capturadas))
+            tamanhos.append(len(response.content))
+            medido = SERIALIZACAO_SERVER_TIMING.search(
+                response.get("Server-Timing", "")
+            )
+            serializacao.append(float(medido.group(1)) if medido else 0.0)
+        duracao = time.perf_counter() - inicio
+
+        return {
+            "requisicoes_por_segundo": round(iteracoes / duracao, 1),
+            "latencia_ms": {
+                "p50": round(percentil(tempos, 50), 2),
+                "p95": round(percentil(tempos, 95), 2),
+                "p99": round(percentil(tempos, 99), 2),
+            },
+            "consultas": {"p50": percentil(consultas, 50), "max": max(consultas)},
+            "serializacao_ms": {"p50": percentil(serializacao, 50)},
+            "bytes_resposta": percentil(tamanhos, 50),
+        }
+
+    def verificar(self, response):
+        if response.status_code >= 400:
+            raise CommandError(
+                f"Requisição falhou ({response.status_code}): {response.content[:200]}"
+            )
+
+    def comparar(self, anterior, atual):
+        self.stderr.write(
+            f"Comparação com {anterior.get('commit') or 'execução anterior'}:"
+        )
+        for nome, cenario in atual["cenarios"].items():
+            base = anterior["cenarios"].get(nome)
+            if base is None:
+                continue
+            p95, p95_base = cenario["latencia_ms"]["p95"], base["latencia_ms"]["p95"]
+            variacao = (p95 - p95_base) / p95_base * 100 if p95_base else 0
+            self.stderr.write(
+                f"  {nome}: p95 {p95_base} -> {p95} ms ({variacao:+.1f}%), "
+                f"consultas {base['consultas']['max']} -> {cenario['consultas']['max']}"
+            )
+
+    def gerar_imagem(self):
+        conteudo = io.BytesIO()
+        Image.new("RGB", (64, 48), "gray").save(conteudo, "JPEG")
+        return conteudo.getvalue()
+
+    def commit_atual(self):
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
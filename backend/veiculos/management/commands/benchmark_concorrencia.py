@@ -0,0 +1,321 @@
+import asyncio
+import importlib.util
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+
+from core.metricas import percentil
+from veiculos.models import Carro, Modelo
+
+# Servidores comparados: WSGI (views síncronas do DRF, uma thread por requisição
+# em andamento) e ASGI (leituras assíncronas de veiculos.api_assincrona)
+SERVIDORES = {
+    "wsgi": lambda porta, opcoes: [
+        "gunicorn",
+        "core.wsgi:application",
+        "--bind",
+        f"127.0.0.1:{porta}",
+        "--workers",
+        str(opcoes["workers"]),
+        "--worker-class",
+        "gthread",
+        "--threads",
+        str(opcoes["threads"]),
+        "--backlog",
+        "2048",
+        "--log-level",
+        "warning",
+    ],
+    "asgi": lambda porta, opcoes: [
+        "uvicorn",
+        "core.asgi:application",
+        "--host",
+        "127.0.0.1",
+        "--port",
+        str(porta),
+        "--workers",
+        str(opcoes["workers"]),
+        "--backlog",
+        "2048",
+        "--log-level",
+        "warning",
+    ],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara a API sob WSGI (gunicorn, workers gthread) e sob ASGI (uvicorn, "
+        "leituras assíncronas) com vários níveis de clientes concorrentes. Cada "
+        "cliente mantém uma conexão HTTP/1.1 e repete requisições de leitura "
+        "(listagem, cursor, detalhe e modelos) durante o tempo de cada nível. "
+        "Emite um JSON com vazão, latência (p50/p95/p99) e erros por servidor e "
+        "nível. Usa o banco configurado no ambiente; gere os dados com "
+        "semear_catalogo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--clientes",
+            default="50,100,250,500",
+            help="Níveis de clientes concorrentes, separados por vírgula.",
+        )
+        parser.add_argument(
+            "--duracao",
+            type=float,
+            default=10,
+            help="Segundos medidos em cada nível.",
+        )
+        parser.add_argument(
+            "--aquecimento",
+            type=float,
+            default=2,
+            help="Segundos descartados antes da medição de cada nível.",
+        )
+        parser.add_argument(
+            "--servidores",
+            default="wsgi,asgi",
+            help=f"Servidores comparados ({', '.join(SERVIDORES)}).",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Processos de cada servidor.",
+        )
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=32,
+            help="Threads por processo do servidor WSGI.",
+        )
+        parser.add_argument(
+            "--pool",
+            type=int,
+            default=20,
+            help="DB_POOL_SIZE dos servidores (0 desliga o pool de conexões).",
+        )
+        parser.add_argument("--porta", type=int, default=8790)
+        parser.add_argument("--semente", type=int, default=42)
+        parser.add_argument(
+            "--com-cache",
+            action="store_true",
+            help="Mantém o cache de respostas ligado (por padrão é desligado).",
+        )
+        parser.add_argument("--saida", help="Arquivo onde gravar o JSON.")
+
+    def handle(self, *args, **options):
+        servidores = [nome.strip() for nome in options["servidores"].split(",")]
+        for nome in servidores:
+            if nome not in SERVIDORES:
+                raise CommandError(f"Servidor desconhecido: {nome}.")
+            modulo = SERVIDORES[nome](0, options)[0]
+            if importlib.util.find_spec(modulo) is None:
+                raise CommandError(f"Instale o {modulo} para o servidor {nome}.")
+        try:
+            niveis = [int(nivel) for nivel in options["clientes"].split(",")]
+        except ValueError:
+            raise CommandError("--clientes deve ser uma lista de inteiros.")
+
+        self.carros = list(
+            Carro.objects.order_by("id").values_list("id", flat=True)[:1000]
+        )
+        if not self.carros or not Modelo.objects.exists():
+            raise CommandError(
+                "Catálogo vazio: execute antes `python manage.py semear_catalogo`."
+            )
+        self.opcoes = options
+        self.lista = reverse("carro-list")
+
+        resultado = {
+            "data": timezone.now().isoformat(),
+            "banco": connection.vendor,
+            "catalogo": {
+                "modelos": Modelo.objects.count(),
+                "carros": Carro.objects.count(),
+            },
+            "workers": options["workers"],
+            "threads_wsgi": options["threads"],
+            "pool": options["pool"],
+            "duracao_s": options["duracao"],
+            "servidores": {},
+        }
+        for nome in servidores:
+            resultado["servidores"][nome] = self.medir_servidor(nome, niveis)
+
+        saida = json.dumps(resultado, indent=2, ensure_ascii=False)
+        if options["saida"]:
+            with open(options["saida"], "w", encoding="utf-8") as arquivo:
+                arquivo.write(saida)
+        else:
+            self.stdout.write(saida)
+        self.resumir(resultado["servidores"], niveis)
+
+    def medir_servidor(self, nome, niveis):
+        porta = self.opcoes["porta"]
+        ambiente = {
+            **os.environ,
+            "ALLOWED_HOSTS": "127.0.0.1",
+            "DEBUG": "False",
+            "METRICAS_AMOSTRAGEM": "0",
+            "DB_POOL_SIZE": str(self.opcoes["pool"]),
+        }
+        if not self.opcoes["com_cache"]:
+            ambiente["CACHE_RESPOSTAS_BACKEND"] = (
+                "django.core.cache.backends.dummy.DummyCache"
+            )
+        processo = subprocess.Popen(
+            [sys.executable, "-m", *SERVIDORES[nome](porta, self.opcoes)],
+            cwd=settings.BASE_DIR,
+            env=ambiente,
+        )
+        try:
+            asyncio.run(self.aguardar_servidor(porta))
+            medicoes = {}
+            for clientes in niveis:
+                self.stderr.write(f"{nome}: {clientes} clientes...")
+                medicoes[str(clientes)] = asyncio.run(self.medir_nivel(porta, clientes))
+            return medicoes
+        finally:
+            processo.terminate()
+            try:
+                processo.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                processo.kill()
+
+    async def aguardar_servidor(self, porta, limite=30):
+        fim = time.monotonic() + limite
+        while time.monotonic() < fim:
+            try:
+                conexao = await asyncio.open_connection("127.0.0.1", porta)
+                status, _ = await self.requisitar(
+                    *conexao, porta, reverse("modelo-list")
+                )
+                conexao[1].close()
+                if status == 200:
+                    return
+                raise CommandError(f"O servidor respondeu {status}.")
+            except OSError:
+                await asyncio.sleep(0.2)
+        raise CommandError("O servidor não iniciou a tempo.")
+
+    async def medir_nivel(self, porta, clientes):
+        aleatorio = random.Random(self.opcoes["semente"])
+        inicio = time.monotonic()
+        inicio_medicao = inicio + self.opcoes["aquecimento"]
+        fim = inicio_medicao + self.opcoes["duracao"]
+        tempos, erros = [], [0]
+        await asyncio.gather(
+            *[
+                self.cliente(
+                    porta,
+                    random.Random(aleatorio.random()),
+                    inicio_medicao,
+                    fim,
+                    tempos,
+                    erros,
+                )
+                for _ in range(clientes)
+            ]
+        )
+        return {
+            "requisicoes": len(tempos),
+            "requisicoes_por_segundo": round(len(tempos) / self.opcoes["duracao"], 1),
+            "latencia_ms": {
+                "p50": round(percentil(tempos, 50) or 0, 2),
+                "p95": round(percentil(tempos, 95) or 0, 2),
+                "p99": round(percentil(tempos, 99) or 0, 2),
+            },
+            "erros": erros[0],
+        }
+
+    async def cliente(self, porta, aleatorio, inicio_medicao, fim, tempos, erros):
+        conexao = None
+        while time.monotonic() < fim:
+            caminho = self.sortear_caminho(aleatorio)
+            antes = time.monotonic()
+            try:
+                if conexao is None:
+                    conexao = await asyncio.open_connection("127.0.0.1", porta)
+                status, manter = await asyncio.wait_for(
+                    self.requisitar(*conexao, porta, caminho), timeout=60
+                )
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                status, manter = None, False
+            depois = time.monotonic()
+
+            if not manter and conexao is not None:
+                conexao[1].close()
+                conexao = None
+            # Conta as respostas concluídas dentro da janela de medição, mesmo as
+            # enviadas antes dela: com latências maiores que a janela, descartá-las
+            # subestimaria a vazão
+            if not inicio_medicao <= depois <= fim:
+                continue
+            if status == 200:
+                tempos.append((depois - antes) * 1000)
+            else:
+                erros[0] += 1
+        if conexao is not None:
+            conexao[1].close()
+
+    def sortear_caminho(self, aleatorio):
+        sorteio = aleatorio.random()
+        if sorteio < 0.4:
+            return self.lista
+        if sorteio < 0.6:
+            return f"{self.lista}?paginacao=cursor"
+        if sorteio < 0.9:
+            return reverse("carro-detail", args=[aleatorio.choice(self.carros)])
+        return reverse("modelo-list")
+
+    async def requisitar(self, leitor, escritor, porta, caminho):
+        """
+        Envia um GET e lê a resposta inteira. Retorna o status e se a conexão
+        pode ser reutilizada.
+        """
+        escritor.write(
+            f"GET {caminho} HTTP/1.1\r\nHost: 127.0.0.1:{porta}\r\n"
+            f"Accept: application/json\r\n\r\n".encode()
+        )
+        await escritor.drain()
+
+        cabecalho = await leitor.readuntil(b"\r\n\r\n")
+        linhas = cabecalho.decode("latin-1").split("\r\n")
+        status = int(linhas[0].split(" ", 2)[1])
+        cabecalhos = {}
+        for linha in linhas[1:]:
+            if ":" in linha:
+                nome, valor = linha.split(":", 1)
+                cabecalhos[nome.strip().lower()] = valor.strip().lower()
+
+        if cabecalhos.get("transfer-encoding") == "chunked":
+            while True:
+                tamanho = int((await leitor.readline()).split(b";")[0], 16)
+                await leitor.readexactly(tamanho + 2)
+                if tamanho == 0:
+                    break
+        else:
+            await leitor.readexactly(int(cabecalhos.get("content-length", 0)))
+        return status, cabecalhos.get("connection") != "close"
+
+    def resumir(self, servidores, niveis):
+        for clientes in niveis:
+            partes = []
+            for nome, medicoes in servidores.items():
+                medicao = medicoes[str(clientes)]
+                partes.append(
+                    f"{nome} {medicao['requisicoes_por_segundo']} req/s, "
+                    f"p95 {medicao['latencia_ms']['p95']} ms, "
+                    f"{medicao['erros']} erro(s)"
+                )
+            self.stderr.write(f"{clientes} clientes: " + " | ".join(partes))
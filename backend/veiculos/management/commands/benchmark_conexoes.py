@@ -0,0 +1,108 @@
+import statistics
+import time
+from urllib.parse import urlsplit
+from wsgiref.util import setup_testing_defaults
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+
+from core.banco.pool import PoolMixin
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede a latência por requisição da API com e sem reaproveitamento de "
+        "conexões com o banco (DB_CONN_MAX_AGE) ou, com DB_POOL_SIZE, usando o pool "
+        "em processo. As requisições passam pelo WSGIHandler completo, incluindo a "
+        "abertura e o fechamento de conexões ao início e fim de cada uma."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requisicoes",
+            type=int,
+            default=200,
+            help="Número de requisições medidas em cada modo.",
+        )
+        parser.add_argument(
+            "--url",
+            default="/api/v1/modelos/?page_size=1",
+            help="Caminho (com parâmetros) requisitado.",
+        )
+
+    def handle(self, *args, **options):
+        banco = connections[DEFAULT_DB_ALIAS]
+        if isinstance(banco, PoolMixin):
+            modos = [("pool", 0)]
+        else:
+            modos = [("sem reuso", 0), ("com reuso", 600)]
+
+        conexoes = []
+
+        def contar_conexao(sender, connection, **kwargs):
+            conexoes.append(connection.alias)
+
+        connection_created.connect(contar_conexao)
+        # O cache de respostas é desligado para que toda requisição consulte o banco
+        sem_cache = override_settings(
+            ALLOWED_HOSTS=["localhost"],
+            CACHES={
+                "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+                "respostas": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"},
+            },
+        )
+        try:
+            with sem_cache:
+                handler = WSGIHandler()
+                for modo, max_age in modos:
+                    banco.close()
+                    banco.settings_dict["CONN_MAX_AGE"] = max_age
+                    self.requisitar(handler, options["url"])  # Aquecimento
+                    conexoes.clear()
+
+                    tempos = [
+                        self.requisitar(handler, options["url"])
+                        for _ in range(options["requisicoes"])
+                    ]
+                    self.relatar(modo, tempos, len(conexoes), banco)
+        finally:
+            connection_created.disconnect(contar_conexao)
+            banco.close()
+
+    def requisitar(self, handler, url):
+        """
+        Executa uma requisição GET pelo WSGIHandler e retorna a duração em ms.
+        """
+        partes = urlsplit(url)
+        environ = {
+            "PATH_INFO": partes.path,
+            "QUERY_STRING": partes.query,
+            "HTTP_HOST": "localhost",
+        }
+        setup_testing_defaults(environ)
+
+        inicio = time.perf_counter()
+        resposta = handler(environ, lambda status, cabecalhos: None)
+        b"".join(resposta)
+        # Como um servidor WSGI, fecha a resposta: dispara o request_finished, que
+        # encerra (ou mantém) a conexão conforme o CONN_MAX_AGE
+        resposta.close()
+        duracao = (time.perf_counter() - inicio) * 1000
+
+        if resposta.status_code != 200:
+            raise CommandError(f"{url} respondeu {resposta.status_code}.")
+        return duracao
+
+    def relatar(self, modo, tempos, conexoes, banco):
+        percentis = statistics.quantiles(tempos, n=100)
+        linha = (
+            f"{modo}: {len(tempos)} requisições, {conexoes} conexão(ões) obtida(s), "
+            f"média {statistics.mean(tempos):.2f} ms, p50 {percentis[49]:.2f} ms, "
+            f"p95 {percentis[94]:.2f} ms"
+        )
+        if isinstance(banco, PoolMixin):
+            linha += f", {banco.pool_atual.criadas} conexão(ões) criada(s) no pool"
+        self.stdout.write(linha)
@@ -0,0 +1,479 @@
+import csv
+import gzip
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from veiculos.busca import indexar_carros, indexar_por_faixas
+from veiculos.gravacao_lote import opcoes_upsert
+from veiculos.models import Carro, Modelo, VersaoTabela
+
+# Chave natural do modelo (unique_together de Modelo)
+CHAVE_MODELO = ("nome_marca", "nome_modelo", "ano_modelo")
+
+# Campos regravados quando o carro (pelo id) já existe
+CAMPOS_ATUALIZADOS_CARRO = [
+    "modelo",
+    "ano_fabricacao",
+    "cor",
+    "descricao_carro",
+    "atualizado_em",
+]
+
+# Maior valor aceito pelos campos PositiveIntegerField em todos os bancos
+MAIOR_INTEIRO = 2147483647
+
+
+def texto(registro, campo, maximo=None, obrigatorio=True):
+    valor = registro.get(campo)
+    valor = "" if valor is None else str(valor).strip()
+    if not valor:
+        if obrigatorio:
+            raise ValueError(f"{campo}: campo obrigatório.")
+        return None
+    if maximo and len(valor) > maximo:
+        raise ValueError(f"{campo}: máximo de {maximo} caracteres.")
+    return valor
+
+
+def inteiro(registro, campo, obrigatorio=True):
+    valor = registro.get(campo)
+    if valor is None or valor == "":
+        if obrigatorio:
+            raise ValueError(f"{campo}: campo obrigatório.")
+        return None
+    if isinstance(valor, bool):
+        raise ValueError(f"{campo}: informe um número inteiro.")
+    try:
+        valor = int(str(valor).strip())
+    except ValueError:
+        raise ValueError(f"{campo}: informe um número inteiro.")
+    if not 0 <= valor <= MAIOR_INTEIRO:
+        raise ValueError(f"{campo}: fora do intervalo permitido.")
+    return valor
+
+
+def validar_registro(registro):
+    """
+    Valida uma linha do inventário. Retorna (chave do modelo, descrição do modelo,
+    campos do carro), com os campos do carro None quando a linha traz apenas o
+    modelo (sem ano_fabricacao e cor).
+    """
+    if not isinstance(registro, dict):
+        raise ValueError("a linha deve ser um objeto JSON.")
+    chave = (
+        texto(registro, "nome_marca", 100),
+        texto(registro, "nome_modelo", 100),
+        inteiro(registro, "ano_modelo"),
+    )
+    descricao_modelo = texto(registro, "descricao_modelo", obrigatorio=False)
+
+    if all(registro.get(campo) in (None, "") for campo in ("ano_fabricacao", "cor")):
+        return chave, descricao_modelo, None
+    carro = {
+        "id": inteiro(registro, "id", obrigatorio=False) or None,
+        "ano_fabricacao": inteiro(registro, "ano_fabricacao"),
+        "cor": texto(registro, "cor", 50),
+        "descricao_carro": texto(registro, "descricao_carro", obrigatorio=False),
+    }
+    return chave, descricao_modelo, carro
+
+
+def normalizar_chave(chave):
+    nome_marca, nome_modelo, ano_modelo = chave
+    return nome_marca.casefold(), nome_modelo.casefold(), ano_modelo
+
+
+class Command(BaseCommand):
+    help = (
+        "Importa um inventário de veículos em CSV ou JSON lines (opcionalmente "
+        ".gz). Cada linha traz o modelo pela chave natural (nome_marca, "
+        "nome_modelo, ano_modelo, e opcionalmente descricao_modelo) e o carro "
+        "(ano_fabricacao, cor, descricao_carro e, para atualizar um carro "
+        "existente, id; um id inexistente recusa a linha). Linhas sem ano_fabricacao e cor importam apenas o "
+        "modelo. Os modelos são resolvidos por uma tabela em memória e os "
+        "registros são gravados em lotes com bulk_create (upsert), uma transação "
+        "por lote. Um checkpoint é gravado após cada lote e a importação "
+        "interrompida é retomada dele na próxima execução. O índice da busca "
+        "textual é atualizado a cada lote, ou uma única vez ao final com "
+        "--indice-ao-final."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("arquivo", help="Arquivo do inventário (- para stdin).")
+        parser.add_argument(
+            "--formato",
+            choices=["csv", "jsonl"],
+            help="Formato do arquivo (padrão: pela extensão; csv se não for .jsonl).",
+        )
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=2000,
+            help="Linhas gravadas por transação.",
+        )
+        parser.add_argument(
+            "--delimitador", default=",", help="Delimitador das colunas do CSV."
+        )
+        parser.add_argument("--encoding", default="utf-8-sig")
+        parser.add_argument(
+            "--checkpoint",
+            help="Arquivo do checkpoint (padrão: <arquivo>.checkpoint).",
+        )
+        parser.add_argument(
+            "--reiniciar",
+            action="store_true",
+            help="Ignora o checkpoint existente e importa desde a primeira linha.",
+        )
+        parser.add_argument(
+            "--rejeitados",
+            help="Arquivo JSON lines onde gravar as linhas recusadas e o motivo.",
+        )
+        parser.add_argument(
+            "--indice-ao-final",
+            action="store_true",
+            help=(
+                "Atualiza o índice da busca textual uma única vez, ao final da "
+                "importação, em vez de a cada lote (mais rápido em cargas grandes; "
+                "até lá, os carros importados não aparecem na busca por ?q=)."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        if options["lote"] < 1:
+            raise CommandError("--lote deve ser maior que zero.")
+        arquivo = options["arquivo"]
+        formato = options["formato"] or self.formato_pela_extensao(arquivo)
+
+        self.checkpoint = None
+        if arquivo != "-":
+            if not os.path.isfile(arquivo):
+                raise CommandError(f"Arquivo não encontrado: {arquivo}.")
+            self.checkpoint = options["checkpoint"] or f"{arquivo}.checkpoint"
+        self.origem = self.identificar_origem(arquivo)
+        self.situacao = {"registros": 0, "modelos": 0, "carros": 0, "rejeitados": 0}
+        if self.checkpoint and not options["reiniciar"]:
+            self.carregar_checkpoint()
+        # Uma importação retomada com o índice pendente também o atualiza ao final
+        self.indice_ao_final = (
+            options["indice_ao_final"] or "indice_desde" in self.situacao
+        )
+        if self.indice_ao_final:
+            self.situacao.setdefault("indice_desde", timezone.now().isoformat())
+        ja_processados = self.situacao["registros"]
+        if ja_processados:
+            self.stdout.write(f"Retomando após {ja_processados} registro(s).")
+
+        self.modelos = {
+            (nome_marca, nome_modelo, ano_modelo): id
+            for id, nome_marca, nome_modelo, ano_modelo in Modelo.objects.values_list(
+                "id", *CHAVE_MODELO
+            ).iterator(chunk_size=5000)
+        }
+        self.rejeitados = (
+            open(options["rejeitados"], "a", encoding="utf-8")
+            if options["rejeitados"]
+            else None
+        )
+
+        inicio = time.perf_counter()
+        try:
+            with self.abrir(arquivo, options["encoding"]) as entrada:
+                linhas = islice(
+                    self.ler(entrada, formato, options["delimitador"]),
+                    ja_processados,
+                    None,
+                )
+                while lote := list(islice(linhas, options["lote"])):
+                    self.gravar_lote(lote)
+                    self.situacao["registros"] += len(lote)
+                    self.gravar_checkpoint()
+                    processados = self.situacao["registros"] - ja_processados
+                    self.stdout.write(
+                        f"{self.situacao['registros']} registros processados "
+                        f"({processados / (time.perf_counter() - inicio):.0f}/s)."
+                    )
+        finally:
+            if self.rejeitados:
+                self.rejeitados.close()
+
+        if self.indice_ao_final:
+            # Antes de remover o checkpoint: interrompida aqui, a próxima execução
+            # apenas atualiza o índice
+            self.indexar_importados(options["lote"])
+        if self.checkpoint and os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
+        duracao = time.perf_counter() - inicio
+        processados = self.situacao["registros"] - ja_processados
+        self.stdout.write(
+            f"Importação concluída em {duracao:.1f}s "
+            f"({processados / duracao if duracao else 0:.0f} registros/s): "
+            f"{self.situacao['registros']} registros, "
+            f"{self.situacao['modelos']} modelo(s) gravado(s), "
+            f"{self.situacao['carros']} carro(s) gravado(s), "
+            f"{self.situacao['rejeitados']} linha(s) recusada(s)."
+        )
+
+    def formato_pela_extensao(self, arquivo):
+        nome = arquivo[:-3] if arquivo.endswith(".gz") else arquivo
+        return "jsonl" if nome.endswith((".jsonl", ".ndjson")) else "csv"
+
+    def abrir(self, arquivo, encoding):
+        if arquivo == "-":
+            return open(
+                sys.stdin.fileno(), encoding=encoding, newline="", closefd=False
+            )
+        if arquivo.endswith(".gz"):
+            return gzip.open(arquivo, "rt", encoding=encoding, newline="")
+        return open(arquivo, encoding=encoding, newline="")
+
+    def ler(self, entrada, formato, delimitador):
+        """
+        Gera (número da linha, registro, erro de leitura) para cada registro do
+        arquivo, inclusive os que não puderam ser lidos, para que a contagem do
+        checkpoint não dependa do conteúdo das linhas.
+        """
+        if formato == "csv":
+            leitor = csv.DictReader(entrada, delimiter=delimitador)
+            for registro in leitor:
+                yield leitor.line_num, registro, None
+            return
+        for numero, linha in enumerate(entrada, start=1):
+            if not linha.strip():
+                continue
+            try:
+                yield numero, json.loads(linha), None
+            except ValueError:
+                yield numero, None, "JSON inválido."
+
+    def gravar_lote(self, lote):
+        modelos, carros = {}, {}
+        validos = []
+        for numero, registro, erro in lote:
+            try:
+                if erro:
+                    raise ValueError(erro)
+                chave, descricao_modelo, carro = validar_registro(registro)
+            except ValueError as erro:
+                self.rejeitar(numero, registro, str(erro))
+                continue
+            if chave not in modelos or descricao_modelo:
+                modelos[chave] = descricao_modelo
+            if carro:
+                validos.append((numero, registro, chave, carro))
+
+        inicio = timezone.now()
+        with transaction.atomic():
+            gravados = self.gravar_modelos(modelos)
+            existentes = self.carros_existentes(
+                {carro["id"] for _, _, _, carro in validos if carro["id"]}
+            )
+            for numero, registro, chave, carro in validos:
+                modelo_id = self.modelos.get(chave)
+                if modelo_id is None:
+                    self.rejeitar(numero, registro, "o modelo não pôde ser gravado.")
+                    continue
+                if carro["id"] and carro["id"] not in existentes:
+                    self.rejeitar(numero, registro, "carro não encontrado.")
+                    continue
+                # Sem id, a linha é sempre um carro novo; com id repetido no
+                # lote, prevalece a última linha
+                chave_carro = carro["id"] or ("linha", numero)
+                carros[chave_carro] = Carro(modelo_id=modelo_id, **carro)
+            if carros:
+                Carro.objects.bulk_create(
+                    carros.values(),
+                    update_conflicts=True,
+                    update_fields=CAMPOS_ATUALIZADOS_CARRO,
+                    **opcoes_upsert(["id"]),
+                )
+
+            # As gravações em lote não disparam os sinais que indexam a busca
+            # textual (carros gravados agora e os dos modelos com nova descrição)
+            # e que invalidam o cache
+            descritos = [
+                self.modelos[chave]
+                for chave, descricao in modelos.items()
+                if descricao and chave in self.modelos
+            ]
+            if not self.indice_ao_final and (carros or descritos):
+                indexar_carros(
+                    Carro.objects.filter(
+                        self.filtro_gravados(carros.values(), inicio)
+                        | Q(modelo_id__in=descritos)
+                    )
+                )
+            if gravados:
+                VersaoTabela.incrementar(Modelo)
+            if carros:
+                VersaoTabela.incrementar(Carro)
+
+        self.situacao["modelos"] += gravados
+        self.situacao["carros"] += len(carros)
+
+    def indexar_importados(self, tamanho_lote):
+        """
+        Atualiza, de uma vez, o índice da busca dos carros gravados desde o início
+        da importação e dos carros dos modelos gravados nela, em faixas de id.
+        """
+        desde = datetime.fromisoformat(self.situacao["indice_desde"])
+        carros = Carro.objects.filter(
+            Q(atualizado_em__gte=desde) | Q(modelo__atualizado_em__gte=desde)
+        )
+        inicio = time.perf_counter()
+        indexados = 0
+        for indexados in indexar_por_faixas(carros, tamanho_lote):
+            pass
+        self.stdout.write(
+            f"Índice da busca atualizado em {time.perf_counter() - inicio:.1f}s: "
+            f"{indexados} carro(s)."
+        )
+
+    def carros_existentes(self, ids):
+        """
+        Ids do lote que pertencem a carros existentes. Com id, a linha apenas
+        atualiza um carro (como na gravação em lote da API): o arquivo não
+        escolhe a chave de carros novos. Os carros ficam travados até o commit,
+        para que uma exclusão concorrente não transforme o upsert em um INSERT.
+        """
+        if not ids:
+            return set()
+        return set(
+            Carro.objects.select_for_update()
+            .filter(id__in=ids)
+            .values_list("id", flat=True)
+        )
+
+    def filtro_gravados(self, carros, inicio):
+        """
+        Filtro dos carros gravados no lote: pelas chaves, ou, quando o banco não
+        as retorna no bulk_create (ex.: MySQL), pelos modelos do lote e pela
+        data de atualização.
+        """
+        ids = [carro.pk for carro in carros]
+        if None not in ids:
+            return Q(id__in=ids)
+        return Q(
+            modelo_id__in={carro.modelo_id for carro in carros},
+            atualizado_em__gte=inicio,
+        )
+
+    def gravar_modelos(self, modelos):
+        """
+        Cria os modelos do lote que ainda não estão na tabela em memória e
+        atualiza a descrição dos que a trazem na linha. Retorna a quantidade de
+        modelos gravados.
+        """
+        novos = [
+            Modelo(**dict(zip(CHAVE_MODELO, chave)), descricao_modelo=descricao)
+            for chave, descricao in modelos.items()
+            if chave not in self.modelos or descricao
+        ]
+        # O conflito acontece com o modelo existente cuja descrição veio na linha,
+        # ou com um modelo criado por outro processo (ou com outra grafia, em
+        # colações sem distinção de maiúsculas): sem descrição na linha, a
+        # existente é mantida
+        for campos in (["atualizado_em"], ["descricao_modelo", "atualizado_em"]):
+            lote = [
+                modelo
+                for modelo in novos
+                if bool(modelo.descricao_modelo) == ("descricao_modelo" in campos)
+            ]
+            if lote:
+                Modelo.objects.bulk_create(
+                    lote,
+                    update_conflicts=True,
+                    update_fields=campos,
+                    **opcoes_upsert(list(CHAVE_MODELO)),
+                )
+
+        # Nem todo banco retorna as chaves do bulk_create (ex.: MySQL): as que
+        # faltam são consultadas
+        faltantes = []
+        for modelo in novos:
+            chave = (modelo.nome_marca, modelo.nome_modelo, modelo.ano_modelo)
+            if modelo.pk:
+                self.modelos[chave] = modelo.pk
+            elif chave not in self.modelos:
+                faltantes.append(chave)
+        if faltantes:
+            self.resolver_modelos(faltantes)
+        return len(novos)
+
+    def resolver_modelos(self, chaves):
+        encontrados = {
+            (nome_marca, nome_modelo, ano_modelo): id
+            for id, nome_marca, nome_modelo, ano_modelo in Modelo.objects.filter(
+                nome_marca__in={chave[0] for chave in chaves},
+                nome_modelo__in={chave[1] for chave in chaves},
+                ano_modelo__in={chave[2] for chave in chaves},
+            ).values_list("id", *CHAVE_MODELO)
+        }
+        # Em colações sem distinção de maiúsculas (ex.: MySQL) o modelo existente
+        # pode ter a mesma chave com outra grafia
+        normalizados = {
+            normalizar_chave(chave): id for chave, id in encontrados.items()
+        }
+        for chave in chaves:
+            modelo_id = encontrados.get(chave) or normalizados.get(
+                normalizar_chave(chave)
+            )
+            if modelo_id is not None:
+                self.modelos[chave] = modelo_id
+
+    def rejeitar(self, numero, registro, motivo):
+        self.situacao["rejeitados"] += 1
+        if self.rejeitados:
+            self.rejeitados.write(
+                json.dumps(
+                    {"linha": numero, "motivo": motivo, "registro": registro},
+                    ensure_ascii=False,
+                    default=str,
+                )
+                + "\n"
+            )
+        elif self.situacao["rejeitados"] <= 20:
+            self.stderr.write(f"Linha {numero} recusada: {motivo}")
+
+    def identificar_origem(self, arquivo):
+        if arquivo == "-":
+            return None
+        informacoes = os.stat(arquivo)
+        return {
+            "arquivo": os.path.abspath(arquivo),
+            "tamanho": informacoes.st_size,
+            "modificado": informacoes.st_mtime,
+        }
+
+    def carregar_checkpoint(self):
+        try:
+            with open(self.checkpoint, encoding="utf-8") as arquivo:
+                salvo = json.load(arquivo)
+        except FileNotFoundError:
+            return
+        if salvo.get("origem") != self.origem:
+            raise CommandError(
+                f"O checkpoint {self.checkpoint} é de outro arquivo (ou de outra "
+                f"versão dele): use --reiniciar para importar desde o início."
+            )
+        self.situacao.update(salvo["situacao"])
+
+    def gravar_checkpoint(self):
+        """
+        Grava a posição após o lote confirmado. A escrita é atômica: uma
+        interrupção não deixa um checkpoint incompleto.
+        """
+        if not self.checkpoint:
+            return
+        temporario = f"{self.checkpoint}.parcial"
+        with open(temporario, "w", encoding="utf-8") as arquivo:
+            json.dump({"origem": self.origem, "situacao": self.situacao}, arquivo)
+        os.replace(temporario, self.checkpoint)
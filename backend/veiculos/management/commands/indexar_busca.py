@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from veiculos.busca import indexar_por_faixas
+from veiculos.models import Carro, TermoBusca
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstrói o índice da busca textual (?q=) de todos os carros, em lotes "
+        "por faixa de id, uma transação por lote. Necessário depois de gravações "
+        "que não passam pelos sinais nem pelos comandos de carga (ex.: SQL direto)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=2000,
+            help="Carros indexados por transação.",
+        )
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        TermoBusca.objects.all().delete()
+
+        indexados = 0
+        for indexados in indexar_por_faixas(Carro.objects.all(), options["lote"]):
+            self.stdout.write(f"{indexados} carros indexados.")
+
+        self.stdout.write(
+            f"Índice reconstruído em {time.perf_counter() - inicio:.1f}s: "
+            f"{indexados} carros, {TermoBusca.objects.count()} termos."
+        )
@@ -0,0 +1,166 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from veiculos.arquivos import nomes_referenciados, percorrer_diretorios
+from veiculos.imagens import TAMANHOS_DERIVADAS
+from veiculos.models import Carro, ImagemCarro
+
+# Diretório (relativo ao storage) onde ficam as imagens dos veículos
+DIRETORIO_IMAGENS = "imagens_carros"
+
+
+class Command(BaseCommand):
+    help = (
+        "Procura arquivos órfãos em MEDIA_ROOT/imagens_carros: percorre a árvore "
+        "por diretório, sem carregá-la inteira na memória, e compara cada lote de "
+        "diretórios com os arquivos referenciados no banco (imagens, imagem_principal "
+        "dos carros e versões derivadas). Por padrão apenas relata; use --remover "
+        "para apagar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--remover",
+            action="store_true",
+            help="Apaga os arquivos órfãos encontrados.",
+        )
+        parser.add_argument(
+            "--idade-minima",
+            type=float,
+            default=60,
+            help=(
+                "Ignora arquivos modificados há menos minutos que isso, como os "
+                "gravados por uploads ainda em andamento."
+            ),
+        )
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=200,
+            help="Diretórios comparados com o banco por consulta.",
+        )
+
+    def handle(self, *args, **options):
+        self.storage = ImagemCarro._meta.get_field("imagem").storage
+        try:
+            self.raiz = self.storage.path("")
+        except NotImplementedError:
+            raise CommandError("O storage das imagens não é um sistema de arquivos.")
+
+        self.limite = time.time() - options["idade_minima"] * 60
+        self.remover = options["remover"]
+        self.verbosity = options["verbosity"]
+        self.verificados = self.orfaos = self.bytes_orfaos = 0
+
+        lote = []
+        for diretorio, arquivos in percorrer_diretorios(
+            os.path.join(self.raiz, DIRETORIO_IMAGENS)
+        ):
+            if arquivos:
+                lote.append((self.relativo(diretorio), arquivos))
+            if len(lote) >= options["lote"]:
+                self.processar_lote(lote)
+                lote = []
+        if lote:
+            self.processar_lote(lote)
+
+        acao = "removido(s)" if self.remover else "encontrado(s)"
+        self.stdout.write(
+            f"{self.verificados} arquivo(s) verificado(s), {self.orfaos} órfão(s) "
+            f"{acao} ({self.bytes_orfaos / 1024 / 1024:.1f} MB)."
+        )
+
+    def relativo(self, caminho):
+        return os.path.relpath(caminho, self.raiz).replace(os.sep, "/")
+
+    def diretorio_dos_originais(self, diretorio):
+        """
+        As versões derivadas ficam em <diretório do original>/derivadas.
+        """
+        if os.path.basename(diretorio) == "derivadas":
+            return os.path.dirname(diretorio)
+        return diretorio
+
+    def referenciados(self, diretorios):
+        """
+        Nomes dos arquivos, nos `diretorios`, referenciados por alguma imagem ou
+        carro: uma consulta por tabela para todo o lote.
+        """
+        filtro_imagens, filtro_carros = Q(), Q()
+        for diretorio in diretorios:
+            filtro_imagens |= Q(imagem__startswith=f"{diretorio}/")
+            filtro_carros |= Q(imagem_principal__startswith=f"{diretorio}/")
+
+        nomes = set(
+            ImagemCarro.objects.filter(filtro_imagens)
+            .values_list("imagem", flat=True)
+            .distinct()
+        )
+        nomes.update(
+            Carro.objects.filter(filtro_carros)
+            .values_list("imagem_principal", flat=True)
+            .distinct()
+        )
+        return nomes
+
+    def processar_lote(self, lote):
+        nomes = self.referenciados(
+            {self.diretorio_dos_originais(diretorio) for diretorio, _ in lote}
+        )
+        # Uma versão derivada (foto_miniatura.webp) é mantida enquanto o original
+        # de mesmo nome base (foto.jpg) for referenciado
+        bases = {os.path.splitext(nome)[0] for nome in nomes}
+
+        for diretorio, arquivos in lote:
+            originais = self.diretorio_dos_originais(diretorio)
+            derivados = originais != diretorio
+            for arquivo, tamanho, modificado_em in arquivos:
+                self.verificados += 1
+                nome = f"{diretorio}/{arquivo}"
+                if derivados:
+                    base = self.base_do_original(originais, arquivo)
+                    referenciado = base is None or base in bases
+                else:
+                    referenciado = nome in nomes
+                if referenciado or modificado_em > self.limite:
+                    continue
+                if self.remover and not self.apagar(nome, derivados):
+                    continue
+
+                self.orfaos += 1
+                self.bytes_orfaos += tamanho
+                if self.verbosity >= 2:
+                    self.stdout.write(f"Órfão: {nome}")
+
+            if self.remover:
+                try:
+                    os.rmdir(self.storage.path(diretorio))  # Apenas se vazio
+                except OSError:
+                    pass
+
+    def apagar(self, nome, derivado):
+        """
+        Apaga o arquivo órfão. Os originais são conferidos de novo já tomados
+        pela remoção (ver ArmazenamentoDeduplicado.apagar_se_ocioso), pois um
+        upload pode tê-los reaproveitado depois da consulta do lote. Retorna se
+        o arquivo foi apagado.
+        """
+        if derivado or not hasattr(self.storage, "apagar_se_ocioso"):
+            self.storage.delete(nome)
+            return True
+        return self.storage.apagar_se_ocioso(
+            nome, lambda: bool(nomes_referenciados([nome]))
+        )
+
+    def base_do_original(self, diretorio, arquivo):
+        """
+        "foto_miniatura.webp" -> "<diretório>/foto". Retorna None para arquivos
+        que não seguem o padrão das versões derivadas, que são mantidos.
+        """
+        base, _, tamanho = os.path.splitext(arquivo)[0].rpartition("_")
+        if not base or tamanho not in TAMANHOS_DERIVADAS:
+            return None
+        return f"{diretorio}/{base}"
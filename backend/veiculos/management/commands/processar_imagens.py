@@ -0,0 +1,160 @@
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import chain
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import connection, connections, transaction
+
+from veiculos.imagens import gerar_derivadas
+from veiculos.models import Carro, ImagemCarro
+
+Status = ImagemCarro.StatusProcessamento
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker que processa a fila de imagens de veículos (status pendente): "
+        "decodifica, aplica a rotação EXIF, gera as versões redimensionadas sem "
+        "metadados e grava no storage, distribuindo o trabalho em processos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--processos",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Número de processos do pool (0 processa no próprio processo).",
+        )
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=20,
+            help="Quantidade de imagens reservadas da fila por vez.",
+        )
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=2.0,
+            help="Segundos de espera quando a fila está vazia.",
+        )
+        parser.add_argument(
+            "--uma-vez",
+            action="store_true",
+            help="Processa as imagens pendentes e encerra, em vez de aguardar novas.",
+        )
+        parser.add_argument(
+            "--reprocessar",
+            action="store_true",
+            help=(
+                "Antes de iniciar, devolve para a fila as imagens com erro ou que "
+                "ficaram em processamento (ex.: worker interrompido)."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        # As versões são gravadas no mesmo storage do arquivo original
+        self.storage = ImagemCarro._meta.get_field("imagem").storage
+
+        if options["reprocessar"]:
+            interrompidas = ImagemCarro.objects.filter(
+                status_processamento__in=[Status.PROCESSANDO, Status.ERRO]
+            )
+            carros = set(interrompidas.values_list("carro_id", flat=True))
+            devolvidas = interrompidas.update(status_processamento=Status.PENDENTE)
+            if devolvidas:
+                Carro.marcar_alterados(carros)
+            self.stdout.write(f"{devolvidas} imagem(ns) devolvida(s) para a fila.")
+
+        pool = None
+        if options["processos"] > 0:
+            # Os processos filhos só acessam o storage; a conexão com o banco não
+            # deve ser herdada por eles
+            connections.close_all()
+            pool = ProcessPoolExecutor(
+                max_workers=options["processos"], initializer=django.setup
+            )
+
+        try:
+            while True:
+                lote = self.reservar_lote(options["lote"])
+                if lote:
+                    self.processar_lote(lote, pool)
+                elif options["uma_vez"]:
+                    break
+                else:
+                    time.sleep(options["intervalo"])
+        finally:
+            if pool:
+                pool.shutdown()
+
+    def reservar_lote(self, tamanho):
+        """
+        Marca como "processando" até `tamanho` imagens pendentes e as retorna como
+        tuplas (id, id do carro, nome do arquivo). Com SKIP LOCKED (MySQL 8), vários workers
+        podem consumir a fila sem reservar a mesma imagem.
+        """
+        with transaction.atomic():
+            pendentes = ImagemCarro.objects.filter(
+                status_processamento=Status.PENDENTE
+            ).order_by("id")
+            if connection.features.has_select_for_update_skip_locked:
+                pendentes = pendentes.select_for_update(skip_locked=True)
+            lote = list(pendentes.values_list("id", "carro_id", "imagem")[:tamanho])
+            ImagemCarro.objects.filter(
+                id__in=[imagem_id for imagem_id, _, _ in lote]
+            ).update(status_processamento=Status.PROCESSANDO)
+            if lote:
+                # O status faz parte da representação do carro
+                Carro.marcar_alterados({carro_id for _, carro_id, _ in lote})
+        return lote
+
+    def processar_lote(self, lote, pool):
+        # Imagens que compartilham o arquivo (ver veiculos.armazenamento) são
+        # geradas uma única vez, e reaproveitadas se já tiverem sido geradas antes
+        imagens_por_nome = defaultdict(list)
+        for imagem_id, _, nome in lote:
+            imagens_por_nome[nome].append(imagem_id)
+        existentes = ImagemCarro.derivadas_existentes(imagens_por_nome)
+        pendentes = [nome for nome in imagens_por_nome if nome not in existentes]
+
+        if pool:
+            futuros = {
+                pool.submit(gerar_derivadas, nome, self.storage): nome
+                for nome in pendentes
+            }
+            resultados = (
+                (futuros[futuro], futuro.exception() or futuro.result())
+                for futuro in as_completed(futuros)
+            )
+        else:
+            resultados = ((nome, self.gerar(nome)) for nome in pendentes)
+
+        for nome, resultado in chain(existentes.items(), resultados):
+            ids = imagens_por_nome[nome]
+            if isinstance(resultado, Exception):
+                ImagemCarro.objects.filter(pk__in=ids, imagem=nome).update(
+                    status_processamento=Status.ERRO
+                )
+                self.stderr.write(
+                    f"Erro ao processar a(s) imagem(ns) {ids} ({nome}): {resultado}"
+                )
+                continue
+
+            # O filtro pelo nome descarta o resultado se o arquivo foi trocado ou a
+            # imagem excluída durante o processamento
+            ImagemCarro.objects.filter(pk__in=ids, imagem=nome).update(
+                derivadas=resultado, status_processamento=Status.CONCLUIDO
+            )
+
+        # As URLs das versões fazem parte da representação do carro
+        Carro.marcar_alterados({carro_id for _, carro_id, _ in lote})
+        self.stdout.write(f"{len(lote)} imagem(ns) processada(s).")
+
+    def gerar(self, nome):
+        try:
+            return gerar_derivadas(nome, self.storage)
+        except Exception as erro:
+            return erro
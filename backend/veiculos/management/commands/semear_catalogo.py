@@ -0,0 +1,164 @@
+import io
+import random
+import time
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F, Max
+from PIL import Image
+
+from veiculos.busca import indexar_carros
+from veiculos.models import Carro, ImagemCarro, Modelo, VersaoTabela
+
+MARCAS = [
+    "Chevrolet",
+    "Fiat",
+    "Ford",
+    "Honda",
+    "Hyundai",
+    "Jeep",
+    "Nissan",
+    "Renault",
+    "Toyota",
+    "Volkswagen",
+]
+CORES = ["Branco", "Preto", "Prata", "Cinza", "Vermelho", "Azul", "Verde", "Bege"]
+
+# Arquivos compartilhados por todas as imagens sintéticas, um por posição na galeria
+DIRETORIO_PLACEHOLDERS = "imagens_carros/sinteticas"
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera um catálogo sintético (modelos, carros e imagens) com inserções em "
+        "lote, para benchmarks. Os dados são reproduzíveis a partir da --semente e "
+        "todas as imagens apontam para poucos arquivos placeholder minúsculos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--modelos", type=int, default=5000)
+        parser.add_argument("--carros", type=int, default=500000)
+        parser.add_argument("--imagens-por-carro", type=int, default=3)
+        parser.add_argument(
+            "--lote",
+            type=int,
+            default=5000,
+            help="Carros inseridos por transação.",
+        )
+        parser.add_argument("--semente", type=int, default=42)
+
+    def handle(self, *args, **options):
+        aleatorio = random.Random(options["semente"])
+        inicio = time.perf_counter()
+
+        placeholders = self.gravar_placeholders(options["imagens_por_carro"])
+        modelos = self.semear_modelos(options["modelos"], aleatorio)
+        self.semear_carros(
+            options["carros"], modelos, placeholders, options["lote"], aleatorio
+        )
+
+        # As inserções em lote não disparam os sinais que invalidam o cache
+        for modelo in (Modelo, Carro, ImagemCarro):
+            VersaoTabela.incrementar(modelo)
+
+        self.stdout.write(
+            f"Catálogo gerado em {time.perf_counter() - inicio:.1f}s: "
+            f"{len(modelos)} modelos, {options['carros']} carros, "
+            f"{options['carros'] * options['imagens_por_carro']} imagens."
+        )
+
+    def gravar_placeholders(self, quantidade):
+        """
+        Grava (uma única vez) os JPEGs de 8x6 px usados por todas as imagens.
+        """
+        nomes = []
+        for ordem in range(quantidade):
+            nome = f"{DIRETORIO_PLACEHOLDERS}/foto_{ordem}.jpg"
+            if not default_storage.exists(nome):
+                conteudo = io.BytesIO()
+                Image.new("RGB", (8, 6), (40 * ordem % 256, 90, 160)).save(
+                    conteudo, "JPEG"
+                )
+                nome = default_storage.save(nome, ContentFile(conteudo.getvalue()))
+            nomes.append(nome)
+        return nomes
+
+    def semear_modelos(self, quantidade, aleatorio):
+        inicial = Modelo.objects.count()
+        Modelo.objects.bulk_create(
+            [
+                Modelo(
+                    nome_marca=aleatorio.choice(MARCAS),
+                    nome_modelo=f"Modelo {inicial + i:05d}",
+                    descricao_modelo=f"Modelo sintético {inicial + i}",
+                    ano_modelo=aleatorio.randint(2000, 2025),
+                )
+                for i in range(quantidade)
+            ],
+            batch_size=1000,
+        )
+        return list(Modelo.objects.values_list("id", flat=True))
+
+    def semear_carros(self, quantidade, modelos, placeholders, lote, aleatorio):
+        """
+        Insere os carros e as imagens em lotes. Os ids são atribuídos aqui, pois o
+        MySQL não os retorna no bulk_create: assim as imagens referenciam os carros
+        e o ponteiro imagem_capa é preenchido com um único UPDATE por lote.
+        """
+        por_carro = len(placeholders)
+        proximo_carro = (Carro.objects.aggregate(maior=Max("id"))["maior"] or 0) + 1
+        proxima_imagem = (
+            ImagemCarro.objects.aggregate(maior=Max("id"))["maior"] or 0
+        ) + 1
+        status_concluido = ImagemCarro.StatusProcessamento.CONCLUIDO
+
+        for inicio in range(0, quantidade, lote):
+            tamanho = min(lote, quantidade - inicio)
+            primeiro_carro, primeira_imagem = proximo_carro, proxima_imagem
+            carros = [
+                Carro(
+                    id=primeiro_carro + i,
+                    modelo_id=aleatorio.choice(modelos),
+                    ano_fabricacao=aleatorio.randint(2000, 2025),
+                    cor=aleatorio.choice(CORES),
+                    descricao_carro=f"Carro sintético {primeiro_carro + i}",
+                )
+                for i in range(tamanho)
+            ]
+            imagens = [
+                ImagemCarro(
+                    id=primeira_imagem + i * por_carro + ordem,
+                    carro_id=carro.id,
+                    imagem=nome,
+                    e_principal=ordem == 0,
+                    ordem=ordem,
+                    status_processamento=status_concluido,
+                )
+                for i, carro in enumerate(carros)
+                for ordem, nome in enumerate(placeholders)
+            ]
+
+            with transaction.atomic():
+                Carro.objects.bulk_create(carros, batch_size=1000)
+                ImagemCarro.objects.bulk_create(imagens, batch_size=1000)
+                if por_carro:
+                    # A principal de cada carro é a primeira das suas imagens
+                    Carro.objects.filter(
+                        id__gte=primeiro_carro, id__lt=primeiro_carro + tamanho
+                    ).update(
+                        imagem_capa_id=(F("id") - primeiro_carro) * por_carro
+                        + primeira_imagem,
+                        imagem_principal=placeholders[0],
+                    )
+                # O bulk_create não dispara o sinal que indexa a busca textual
+                indexar_carros(
+                    Carro.objects.filter(
+                        id__gte=primeiro_carro, id__lt=primeiro_carro + tamanho
+                    )
+                )
+
+            proximo_carro += tamanho
+            proxima_imagem += tamanho * por_carro
+            self.stdout.write(f"{inicio + tamanho}/{quantidade} carros inseridos.")
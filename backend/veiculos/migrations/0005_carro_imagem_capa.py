@@ -0,0 +1,51 @@
+# Generated by Django 5.2.3 on 2026-10-18 12:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def preencher_imagem_capa(apps, schema_editor):
+    """
+    Mantém apenas uma imagem principal por carro (a primeira pela ordem de exibição)
+    e preenche o ponteiro imagem_capa e o campo legado imagem_principal.
+    """
+    Carro = apps.get_model("veiculos", "Carro")
+    ImagemCarro = apps.get_model("veiculos", "ImagemCarro")
+
+    capas = {}
+    excedentes = []
+    for imagem_id, carro_id, imagem in (
+        ImagemCarro.objects.filter(e_principal=True)
+        .order_by("carro_id", "ordem", "data_upload", "id")
+        .values_list("id", "carro_id", "imagem")
+    ):
+        if carro_id in capas:
+            excedentes.append(imagem_id)
+        else:
+            capas[carro_id] = (imagem_id, imagem)
+
+    ImagemCarro.objects.filter(id__in=excedentes).update(e_principal=False)
+    for carro_id, (imagem_id, imagem) in capas.items():
+        Carro.objects.filter(id=carro_id).update(
+            imagem_capa_id=imagem_id, imagem_principal=imagem
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('veiculos', '0004_alter_imagemcarro_unique_together'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='carro',
+            name='imagem_capa',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='veiculos.imagemcarro', verbose_name='Imagem Principal da Galeria'),
+        ),
+        migrations.RunPython(preencher_imagem_capa, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='imagemcarro',
+            constraint=models.UniqueConstraint(models.F('carro'), models.Case(models.When(e_principal=True, then=models.Value(True)), output_field=models.BooleanField()), name='imagem_principal_unica_por_carro'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.3 on 2026-10-18 12:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('veiculos', '0005_carro_imagem_capa'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='carro',
+            index=models.Index(fields=['cor', 'data_cadastro'], name='carro_cor_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='carro',
+            index=models.Index(fields=['ano_fabricacao', 'data_cadastro'], name='carro_ano_fab_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='carro',
+            index=models.Index(fields=['data_cadastro'], name='carro_data_cadastro_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='modelo',
+            index=models.Index(fields=['nome_modelo'], name='modelo_nome_modelo_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 12:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('veiculos', '0006_indices_filtros'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagemcarro',
+            name='derivadas',
+            field=models.JSONField(blank=True, default=dict, editable=False, verbose_name='Versões Derivadas'),
+        ),
+    ]
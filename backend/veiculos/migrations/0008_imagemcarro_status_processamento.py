@@ -0,0 +1,37 @@
+# Generated by Django 5.2.3 on 2026-10-18 12:58
+
+from django.db import migrations, models
+
+
+def marcar_processadas(apps, schema_editor):
+    """
+    Imagens cujas versões derivadas já foram geradas no upload não voltam para a fila.
+    """
+    ImagemCarro = apps.get_model("veiculos", "ImagemCarro")
+
+    concluidas = [
+        imagem_id
+        for imagem_id, imagem, derivadas in ImagemCarro.objects.values_list(
+            "id", "imagem", "derivadas"
+        ).iterator()
+        if derivadas and derivadas.get("origem") == imagem
+    ]
+    ImagemCarro.objects.filter(id__in=concluidas).update(
+        status_processamento="concluido"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('veiculos', '0007_imagemcarro_derivadas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagemcarro',
+            name='status_processamento',
+            field=models.CharField(choices=[('pendente', 'Pendente'), ('processando', 'Processando'), ('concluido', 'Concluído'), ('erro', 'Erro')], db_index=True, default='pendente', editable=False, max_length=12, verbose_name='Status do Processamento'),
+        ),
+        migrations.RunPython(marcar_processadas, migrations.RunPython.noop),
+    ]
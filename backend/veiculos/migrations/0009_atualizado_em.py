@@ -0,0 +1,48 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:03
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def criar_versoes(apps, schema_editor):
+    """
+    Cria o contador de cada tabela do catálogo, evitando a criação concorrente
+    na primeira escrita.
+    """
+    VersaoTabela = apps.get_model("veiculos", "VersaoTabela")
+
+    for tabela in ("veiculos.modelo", "veiculos.carro", "veiculos.imagemcarro"):
+        VersaoTabela.objects.get_or_create(tabela=tabela)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('veiculos', '0008_imagemcarro_status_processamento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersaoTabela',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tabela', models.CharField(max_length=100, unique=True, verbose_name='Tabela')),
+                ('versao', models.PositiveBigIntegerField(default=0, verbose_name='Versão')),
+                ('atualizado_em', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Atualizado em')),
+            ],
+            options={
+                'verbose_name': 'Versão de Tabela',
+                'verbose_name_plural': 'Versões de Tabelas',
+            },
+        ),
+        migrations.AddField(
+            model_name='carro',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True, verbose_name='Atualizado em'),
+        ),
+        migrations.AddField(
+            model_name='modelo',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True, verbose_name='Atualizado em'),
+        ),
+        migrations.RunPython(criar_versoes, migrations.RunPython.noop),
+    ]
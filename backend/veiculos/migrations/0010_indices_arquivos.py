@@ -0,0 +1,21 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('veiculos', '0009_atualizado_em'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='carro',
+            index=models.Index(fields=['imagem_principal'], name='carro_imagem_principal_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='imagemcarro',
+            index=models.Index(fields=['imagem'], name='imagem_carro_arquivo_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.3 on 2026-10-18 13:28
+
+import veiculos.armazenamento
+import veiculos.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('veiculos', '0010_indices_arquivos'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='imagemcarro',
+            name='imagem',
+            field=models.ImageField(storage=veiculos.armazenamento.armazenamento_imagens, upload_to=veiculos.models.get_upload_path_imagem_carro, verbose_name='Imagem do Veículo'),
+        ),
+    ]
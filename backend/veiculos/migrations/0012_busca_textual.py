@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-18 14:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('veiculos', '0011_imagens_deduplicadas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TermoBusca',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('termo', models.CharField(max_length=40, verbose_name='Termo')),
+                ('peso', models.PositiveSmallIntegerField(default=1, verbose_name='Peso')),
+                ('carro', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='termos_busca', to='veiculos.carro', verbose_name='Veículo')),
+            ],
+            options={
+                'verbose_name': 'Termo de Busca',
+                'verbose_name_plural': 'Termos de Busca',
+                'indexes': [models.Index(fields=['termo', 'carro', 'peso'], name='termo_busca_idx'), models.Index(fields=['carro', 'termo', 'peso'], name='termo_busca_carro_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.3 on 2026-10-18 14:39
+
+import veiculos.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('veiculos', '0012_busca_textual'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='imagemcarro',
+            name='imagem_principal_unica_por_carro',
+        ),
+        migrations.AddConstraint(
+            model_name='imagemcarro',
+            constraint=models.UniqueConstraint(condition=models.Q(('e_principal', True)), fields=('carro',), name='imagem_principal_unica_por_carro'),
+        ),
+        migrations.AddConstraint(
+            model_name='imagemcarro',
+            constraint=veiculos.models.RestricaoUnicaMySQL(models.F('carro'), models.Case(models.When(e_principal=True, then=models.Value(True)), output_field=models.BooleanField()), name='imagem_principal_unica_mysql'),
+        ),
+    ]
@@ -1,5 +1,9 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
+from .armazenamento import armazenamento_imagens
+from .arquivos import remover_apos_commit
 import os  # Importação o módulo os para manipulação das imagens
+from functools import partial
 
 
 # Entidade de Modelos
@@ -10,12 +14,18 @@ class Modelo(models.Model):
         blank=True, null=True, verbose_name="Descrição do Modelo"
     )
     ano_modelo = models.PositiveIntegerField(verbose_name="Ano do Modelo do Veículo")
+    atualizado_em = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
 
     class Meta:
         verbose_name = "Modelo de Veículo"
         verbose_name_plural = "Modelos de Veículos"
         unique_together = ("nome_marca", "nome_modelo", "ano_modelo")
         ordering = ["nome_marca", "nome_modelo"]
+        # O índice do unique_together já atende filtros por nome_marca e por
+        # (nome_marca, nome_modelo); este cobre o filtro apenas por nome_modelo
+        indexes = [
+            models.Index(fields=["nome_modelo"], name="modelo_nome_modelo_idx"),
+        ]
 
     def __str__(self):
         return f"{self.nome_marca} {self.nome_modelo} ({self.ano_modelo})"
@@ -46,6 +56,9 @@ class Carro(models.Model):
     data_cadastro = models.DateTimeField(
         auto_now_add=True, verbose_name="Data de Cadastro"
     )
+    # Alterado também quando as imagens do carro mudam (ver Carro.marcar_alterados),
+    # é a base do ETag/Last-Modified da API
+    atualizado_em = models.DateTimeField(auto_now=True, verbose_name="Atualizado em")
     ano_fabricacao = models.PositiveIntegerField(verbose_name="Ano de Fabricação")
     cor = models.CharField(max_length=50, verbose_name="Cor do Veículo")
     descricao_carro = models.TextField(
@@ -60,40 +73,455 @@ class Carro(models.Model):
         blank=True,  # Permite que o campo seja opcional no formulário do admin
     )
 
+    # Ponteiro desnormalizado para a imagem principal da galeria. É mantido apenas
+    # por ImagemCarro.save/delete, então a leitura não precisa consultar as imagens
+    imagem_capa = models.ForeignKey(
+        "ImagemCarro",
+        on_delete=models.SET_NULL,
+        related_name="+",
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Imagem Principal da Galeria",
+    )
+
     class Meta:
         verbose_name = "Veículo"
         verbose_name_plural = "Veículos"
         ordering = ["-data_cadastro"]
+        # Índices compostos com data_cadastro permitem filtrar e já percorrer na
+        # ordenação padrão da listagem, sem ordenar o resultado em memória
+        indexes = [
+            models.Index(fields=["cor", "data_cadastro"], name="carro_cor_idx"),
+            models.Index(
+                fields=["ano_fabricacao", "data_cadastro"], name="carro_ano_fab_idx"
+            ),
+            models.Index(fields=["data_cadastro"], name="carro_data_cadastro_idx"),
+            # Verificação de arquivos ainda referenciados (ver veiculos.arquivos)
+            models.Index(
+                fields=["imagem_principal"], name="carro_imagem_principal_idx"
+            ),
+        ]
 
     def __str__(self):
         modelo_str = str(self.modelo) if self.modelo else "Modelo Desconhecido"
         return f"{self.modelo} - {self.cor} - ({self.ano_fabricacao})"
 
+    def definir_imagem_principal(self, imagem):
+        """
+        Define uma imagem da galeria como principal do veículo.
+        A consistência (uma única principal e o ponteiro imagem_capa) é
+        garantida por ImagemCarro.save.
+        """
+        imagem.carro = self
+        imagem.e_principal = True
+        imagem.save(update_fields=["e_principal"])
+
+    @classmethod
+    def marcar_alterados(cls, ids):
+        """
+        Atualiza atualizado_em dos carros cujas imagens foram alteradas por
+        operações que não passam por Carro.save (update, bulk_create, bulk_update)
+        e, como elas não disparam sinais, incrementa a versão da tabela.
+        """
+        cls.objects.filter(pk__in=ids).update(atualizado_em=timezone.now())
+        VersaoTabela.incrementar(cls)
+
+    def _aplicar_imagem_capa(self, imagem):
+        """
+        Grava a imagem principal em imagem_capa e no campo legado
+        imagem_principal, tanto no banco quanto na instância em memória.
+        """
+        self.imagem_capa = imagem
+        self.imagem_principal = imagem.imagem.name
+        self.atualizado_em = timezone.now()
+        Carro.objects.filter(pk=self.pk).update(
+            imagem_capa=imagem,
+            imagem_principal=self.imagem_principal,
+            atualizado_em=self.atualizado_em,
+        )
+
+    def _liberar_imagem_capa(self, imagem):
+        """
+        Remove o ponteiro imagem_capa caso ele aponte para `imagem`. A condição é
+        avaliada no banco, então funciona mesmo com a instância em memória desatualizada.
+        """
+        if Carro.objects.filter(pk=self.pk, imagem_capa=imagem).update(
+            imagem_capa=None, imagem_principal=None
+        ):
+            self.imagem_capa = None
+            self.imagem_principal = None
+
+    def adicionar_imagens(self, arquivos):
+        """
+        Adiciona várias imagens à galeria com um número fixo de consultas: os arquivos
+        são gravados no storage antes da transação e, dentro dela, a ordem é calculada
+        uma única vez e todas as linhas são inseridas com um bulk_create. Se o carro
+        não tiver imagem principal, a primeira imagem adicionada passa a ser a principal.
+        Arquivos idênticos a imagens já processadas reaproveitam as versões derivadas
+        delas, sem voltar para a fila de processamento.
+
+        Retorna as imagens criadas, na ordem de exibição.
+        """
+        imagens = []
+        try:
+            for arquivo in arquivos:
+                imagem = ImagemCarro(carro=self)
+                imagem.imagem.save(arquivo.name, arquivo, save=False)
+                imagens.append(imagem)
+
+            processadas = ImagemCarro.derivadas_existentes(
+                [imagem.imagem.name for imagem in imagens]
+            )
+            for imagem in imagens:
+                if imagem.imagem.name in processadas:
+                    imagem.derivadas = processadas[imagem.imagem.name]
+                    imagem.status_processamento = (
+                        ImagemCarro.StatusProcessamento.CONCLUIDO
+                    )
+
+            with transaction.atomic():
+                # Trava o carro para que uploads concorrentes não repitam a ordem
+                # nem elejam duas imagens principais
+                imagem_capa_id = (
+                    Carro.objects.select_for_update()
+                    .values_list("imagem_capa_id", flat=True)
+                    .get(pk=self.pk)
+                )
+                ultima_ordem = (
+                    self.imagens.aggregate(ultima_ordem=models.Max("ordem"))[
+                        "ultima_ordem"
+                    ]
+                    or 0
+                )
+                for i, imagem in enumerate(imagens):
+                    imagem.ordem = ultima_ordem + i + 1
+                    imagem.e_principal = i == 0 and imagem_capa_id is None
+                ImagemCarro.objects.bulk_create(imagens)
+                # O bulk_create não dispara os sinais de post_save
+                VersaoTabela.incrementar(ImagemCarro)
+
+                # Nem todo banco retorna as chaves do bulk_create (ex.: MySQL). O
+                # filtro pela ordem exclui imagens anteriores com o mesmo arquivo
+                criadas = list(
+                    self.imagens.filter(
+                        imagem__in=[imagem.imagem.name for imagem in imagens],
+                        ordem__gt=ultima_ordem,
+                    ).order_by("ordem")
+                )
+                if criadas and criadas[0].e_principal:
+                    self._aplicar_imagem_capa(criadas[0])
+                else:
+                    Carro.marcar_alterados([self.pk])
+        except Exception:
+            # Os arquivos podem ser compartilhados com outras imagens
+            for imagem in imagens:
+                remover_apos_commit(imagem.imagem.storage, imagem.imagem.name)
+            raise
+
+        return criadas
+
+
+class RestricaoUnicaMySQL(models.UniqueConstraint):
+    """
+    Restrição única (funcional) criada apenas no MySQL, que não suporta as
+    restrições com `condition` (índices parciais). Nos demais bancos a regra é
+    aplicada pela restrição parcial equivalente, e a validação dos modelos
+    (full_clean) fica a cargo dela: o Django não sabe validar expressões com
+    When/Q.
+    """
+
+    def constraint_sql(self, model, schema_editor):
+        if schema_editor.connection.vendor == "mysql":
+            return super().constraint_sql(model, schema_editor)
+
+    def create_sql(self, model, schema_editor):
+        if schema_editor.connection.vendor == "mysql":
+            return super().create_sql(model, schema_editor)
+
+    def remove_sql(self, model, schema_editor):
+        if schema_editor.connection.vendor == "mysql":
+            return super().remove_sql(model, schema_editor)
+
+    def validate(self, model, instance, exclude=None, using=None):
+        pass
+
 
 # Modelo para imagens de carros (principal e adicionais)
 class ImagemCarro(models.Model):
+    class StatusProcessamento(models.TextChoices):
+        PENDENTE = "pendente", "Pendente"
+        PROCESSANDO = "processando", "Processando"
+        CONCLUIDO = "concluido", "Concluído"
+        ERRO = "erro", "Erro"
+
     carro = models.ForeignKey(
         Carro, on_delete=models.CASCADE, related_name="imagens", verbose_name="Veículo"
     )
+    # Arquivos deduplicados pelo conteúdo: várias imagens podem apontar para o
+    # mesmo arquivo (ver veiculos.armazenamento)
     imagem = models.ImageField(
-        upload_to=get_upload_path_imagem_carro, verbose_name="Imagem do Veículo"
+        upload_to=get_upload_path_imagem_carro,
+        storage=armazenamento_imagens,
+        verbose_name="Imagem do Veículo",
     )
     e_principal = models.BooleanField(default=False, verbose_name="É imagem principal")
     ordem = models.PositiveSmallIntegerField(
         default=0, verbose_name="Ordem de Exibição"
     )
     data_upload = models.DateTimeField(auto_now_add=True, verbose_name="Data de Upload")
+    # Caminhos das versões redimensionadas (ver veiculos.imagens), gerados em segundo
+    # plano pelo comando processar_imagens, que usa este status como fila
+    derivadas = models.JSONField(
+        default=dict, blank=True, editable=False, verbose_name="Versões Derivadas"
+    )
+    status_processamento = models.CharField(
+        max_length=12,
+        choices=StatusProcessamento.choices,
+        default=StatusProcessamento.PENDENTE,
+        db_index=True,
+        editable=False,
+        verbose_name="Status do Processamento",
+    )
 
     class Meta:
         verbose_name = "Imagem do Veículo"
         verbose_name_plural = "Imagens dos Veículos"
         ordering = ["-e_principal", "ordem", "data_upload"]
-        # Removida a unique_together para permitir múltiplas imagens marcadas como principal,
-        # já que a lógica de exibição determina qual será usada na lista de veículos.
+        # Verificação de arquivos ainda referenciados (ver veiculos.arquivos)
+        indexes = [models.Index(fields=["imagem"], name="imagem_carro_arquivo_idx")]
+        constraints = [
+            # No máximo uma imagem principal por carro
+            models.UniqueConstraint(
+                fields=["carro"],
+                condition=models.Q(e_principal=True),
+                name="imagem_principal_unica_por_carro",
+            ),
+            # A mesma regra no MySQL, que ignora a restrição acima: a expressão
+            # vale NULL para as imagens adicionais, que não colidem no índice
+            RestricaoUnicaMySQL(
+                models.F("carro"),
+                models.Case(
+                    models.When(e_principal=True, then=models.Value(True)),
+                    output_field=models.BooleanField(),
+                ),
+                name="imagem_principal_unica_mysql",
+            ),
+        ]
 
     def __str__(self):
         return f"{'Principal' if self.e_principal else 'Adicional'} - {self.carro}"
 
+    def get_constraints(self):
+        # Ao marcar esta imagem como principal, o save() desmarca a anterior: a
+        # validação (ex.: formulários do admin) não deve recusar a troca
+        return [
+            (
+                classe,
+                [
+                    restricao
+                    for restricao in restricoes
+                    if restricao.name != "imagem_principal_unica_por_carro"
+                ],
+            )
+            for classe, restricoes in super().get_constraints()
+        ]
+
+    @classmethod
+    def derivadas_existentes(cls, nomes):
+        """
+        Versões derivadas já geradas para os arquivos `nomes` (compartilhados por
+        outras imagens, ver veiculos.armazenamento), como {nome: derivadas}.
+        """
+        return {
+            nome: derivadas
+            for nome, derivadas in cls.objects.filter(
+                imagem__in=set(nomes),
+                status_processamento=cls.StatusProcessamento.CONCLUIDO,
+            ).values_list("imagem", "derivadas")
+            if derivadas.get("origem") == nome
+        }
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Arquivo lido do banco, para remover o anterior quando for substituído
+        if "imagem" in instancia.__dict__:
+            instancia._arquivo_salvo = (
+                instancia.imagem.name,
+                instancia.__dict__.get("derivadas"),
+            )
+        return instancia
+
     def save(self, *args, **kwargs):
-        # Não desmarca outras imagens ao marcar como principal, pois não há restrição para apenas uma.
-        super().save(*args, **kwargs)
+        # Único ponto que mantém a imagem principal consistente: ao marcar esta imagem
+        # como principal, trava a linha do carro, desmarca as demais e atualiza o
+        # ponteiro imagem_capa na mesma transação
+        adicionando = self._state.adding
+        with transaction.atomic():
+            if self.e_principal:
+                list(
+                    Carro.objects.select_for_update()
+                    .filter(pk=self.carro_id)
+                    .values_list("pk", flat=True)
+                )
+                outras_principais = ImagemCarro.objects.filter(
+                    carro_id=self.carro_id, e_principal=True
+                )
+                if self.pk:
+                    outras_principais = outras_principais.exclude(pk=self.pk)
+                outras_principais.update(e_principal=False)
+
+            super().save(*args, **kwargs)
+
+            if self.e_principal:
+                self.carro._aplicar_imagem_capa(self)
+            else:
+                if not adicionando:
+                    self.carro._liberar_imagem_capa(self)
+                Carro.marcar_alterados([self.carro_id])
+
+            # Arquivo substituído: removido do storage após o commit
+            nome_anterior, derivadas_anteriores = getattr(
+                self, "_arquivo_salvo", (None, None)
+            )
+            if nome_anterior and nome_anterior != self.imagem.name:
+                remover_apos_commit(
+                    self.imagem.storage, nome_anterior, derivadas_anteriores
+                )
+            self._arquivo_salvo = (self.imagem.name, self.derivadas)
+
+        # Quando o arquivo original muda, a imagem volta para a fila de processamento
+        # (imagens novas já são gravadas como pendentes)
+        if (
+            self.imagem
+            and self.derivadas.get("origem") != self.imagem.name
+            and self.status_processamento != self.StatusProcessamento.PENDENTE
+        ):
+            self.status_processamento = self.StatusProcessamento.PENDENTE
+            ImagemCarro.objects.filter(pk=self.pk).update(
+                status_processamento=self.status_processamento
+            )
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            self.carro._liberar_imagem_capa(self)
+            Carro.marcar_alterados([self.carro_id])
+            return super().delete(*args, **kwargs)
+
+    def url_derivada(self, tamanho):
+        """
+        Retorna a URL da versão `tamanho` (miniatura, card ou completa), ou a do
+        arquivo original enquanto a versão não tiver sido gerada.
+        """
+        caminho = None
+        if self.derivadas.get("origem") == self.imagem.name:
+            caminho = self.derivadas.get(tamanho)
+        if caminho:
+            return self.imagem.storage.url(caminho)
+        return self.imagem.url
+
+
+# Índice invertido da busca textual (ver veiculos.busca)
+class TermoBusca(models.Model):
+    termo = models.CharField(max_length=40, verbose_name="Termo")
+    carro = models.ForeignKey(
+        Carro,
+        on_delete=models.CASCADE,
+        related_name="termos_busca",
+        verbose_name="Veículo",
+        # Coberto pelo índice (carro, termo, peso)
+        db_index=False,
+    )
+    peso = models.PositiveSmallIntegerField(default=1, verbose_name="Peso")
+
+    class Meta:
+        verbose_name = "Termo de Busca"
+        verbose_name_plural = "Termos de Busca"
+        # Cobrem as consultas da busca sem ler a tabela: a faixa de um termo
+        # (carros que o contêm) e os termos de um carro (demais termos buscados
+        # e relevância)
+        indexes = [
+            models.Index(fields=["termo", "carro", "peso"], name="termo_busca_idx"),
+            models.Index(
+                fields=["carro", "termo", "peso"], name="termo_busca_carro_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.termo} ({self.carro_id})"
+
+
+# Contador de versão por tabela do catálogo
+class VersaoTabela(models.Model):
+    """
+    Versão de cada tabela do catálogo, incrementada a cada escrita pelos sinais
+    de veiculos.signals (e por Carro.marcar_alterados nas escritas em lote).
+    Permite validar respostas de listagem sem consultar as próprias tabelas.
+    """
+
+    tabela = models.CharField(max_length=100, unique=True, verbose_name="Tabela")
+    versao = models.PositiveBigIntegerField(default=0, verbose_name="Versão")
+    atualizado_em = models.DateTimeField(
+        default=timezone.now, verbose_name="Atualizado em"
+    )
+
+    class Meta:
+        verbose_name = "Versão de Tabela"
+        verbose_name_plural = "Versões de Tabelas"
+
+    def __str__(self):
+        return f"{self.tabela} (v{self.versao})"
+
+    @classmethod
+    def incrementar(cls, modelo):
+        """
+        Incrementa a versão da tabela após o commit da transação em andamento (ou
+        imediatamente, fora de uma transação), o que também invalida as respostas
+        dela no cache de respostas (ver veiculos.cache_respostas). A linha da
+        versão, compartilhada por todas as escritas na tabela, não é travada pela
+        transação de quem escreve: as escritas não fazem fila nela até o commit, e
+        caminhos que travam as linhas em ordens diferentes (ex.: o carro antes da
+        versão, ou o contrário) não geram deadlocks no InnoDB. Incrementada só
+        depois do commit, uma versão nova nunca é lida junto com dados anteriores
+        à escrita.
+        """
+        tabela = modelo._meta.label_lower
+        transaction.on_commit(partial(cls._incrementar, tabela), robust=True)
+
+    @classmethod
+    def _incrementar(cls, tabela):
+        agora = timezone.now()
+        if not cls.objects.filter(tabela=tabela).update(
+            versao=models.F("versao") + 1, atualizado_em=agora
+        ):
+            cls.objects.get_or_create(
+                tabela=tabela, defaults={"versao": 1, "atualizado_em": agora}
+            )
+
+    @classmethod
+    def versoes(cls, *modelos):
+        """
+        Retorna {tabela: (versão, atualizado_em)} dos modelos informados.
+        """
+        return {
+            tabela: (versao, atualizado_em)
+            for tabela, versao, atualizado_em in cls._consulta_versoes(modelos)
+        }
+
+    @classmethod
+    async def aversoes(cls, *modelos):
+        """
+        Equivalente assíncrono de versoes.
+        """
+        return {
+            tabela: (versao, atualizado_em)
+            async for tabela, versao, atualizado_em in cls._consulta_versoes(modelos)
+        }
+
+    @classmethod
+    def _consulta_versoes(cls, modelos):
+        tabelas = [modelo._meta.label_lower for modelo in modelos]
+        return cls.objects.filter(tabela__in=tabelas).values_list(
+            "tabela", "versao", "atualizado_em"
+        )
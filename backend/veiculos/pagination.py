@@ -0,0 +1,308 @@
+import base64
+import json
+
+from django.core.paginator import InvalidPage, Page
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+"""
+Módulo: pagination
+------------------
+Paginações da API de veículos, selecionáveis por requisição:
+1. PaginacaoPorPagina: paginação por número de página (padrão), que aceita
+   `contagem=false` para dispensar o COUNT(*) da tabela.
+2. PaginacaoKeyset: paginação por cursor (keyset) sobre a ordenação declarada em
+   `ordenacao_keyset` no viewset, sem OFFSET e estável sob inserções concorrentes.
+3. PaginacaoVeiculos: escolhe entre as duas conforme os parâmetros da requisição
+   (`paginacao=cursor` ou presença de `cursor`).
+Cada paginação tem também apaginate_queryset, que lê a página com o ORM
+assíncrono (usado pelas leituras de veiculos.api_assincrona).
+"""
+
+
+class PaginacaoPorPagina(PageNumberPagination):
+    """
+    Paginação por número de página. Com `contagem=false`, busca uma linha a mais
+    que o tamanho da página para saber se existe próxima, sem executar o COUNT(*).
+    """
+
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    contagem_query_param = "contagem"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.sem_contagem = (
+            request.query_params.get(self.contagem_query_param, "").lower() == "false"
+        )
+        if not self.sem_contagem:
+            return super().paginate_queryset(queryset, request, view)
+
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        fatia = self._fatia_sem_contagem(request, page_size)
+        self.request = request
+        return self._pagina_sem_contagem(list(queryset[fatia]), page_size)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        Equivalente assíncrono de paginate_queryset. O COUNT(*) é feito por
+        `queryset.acount()`.
+        """
+        self.sem_contagem = (
+            request.query_params.get(self.contagem_query_param, "").lower() == "false"
+        )
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        if self.sem_contagem:
+            fatia = self._fatia_sem_contagem(request, page_size)
+            linhas = [linha async for linha in queryset[fatia]]
+            return self._pagina_sem_contagem(linhas, page_size)
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            numero = paginator.validate_number(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            )
+            raise NotFound(msg)
+
+        # Mesmos limites de Paginator.page, com a fatia lida de forma assíncrona
+        inicio = (numero - 1) * page_size
+        fim = inicio + page_size
+        if fim + paginator.orphans >= paginator.count:
+            fim = paginator.count
+        linhas = [linha async for linha in queryset[inicio:fim]]
+        self.page = Page(linhas, numero, paginator)
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return linhas
+
+    def _fatia_sem_contagem(self, request, page_size):
+        """
+        Faixa de linhas da página pedida, com uma linha a mais para saber se
+        existe próxima.
+        """
+        try:
+            self.numero_pagina = int(request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            self.numero_pagina = 0
+        if self.numero_pagina < 1:
+            raise NotFound(self.invalid_page_message)
+
+        inicio = (self.numero_pagina - 1) * page_size
+        return slice(inicio, inicio + page_size + 1)
+
+    def _pagina_sem_contagem(self, linhas, page_size):
+        self.tem_proxima = len(linhas) > page_size
+        self.display_page_controls = False
+        return linhas[:page_size]
+
+    def get_paginated_response(self, data):
+        if not self.sem_contagem:
+            return super().get_paginated_response(data)
+        return Response(
+            {
+                "count": None,
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_next_link(self):
+        if not self.sem_contagem:
+            return super().get_next_link()
+        if not self.tem_proxima:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.page_query_param, self.numero_pagina + 1)
+
+    def get_previous_link(self):
+        if not self.sem_contagem:
+            return super().get_previous_link()
+        if self.numero_pagina == 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.numero_pagina == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.numero_pagina - 1)
+
+
+class PaginacaoKeyset(BasePagination):
+    """
+    Paginação por cursor (keyset). O cursor guarda os valores da ordenação do último
+    item da página e a próxima página é buscada com WHERE (a, b, id) > (x, y, z),
+    aproveitando o índice da ordenação: o custo não cresce com a profundidade.
+    Outras ordenações (`ordering`, ou a relevância da busca por `q`) não são
+    aceitas com o cursor e retornam 400, em vez de serem trocadas pela do keyset.
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    invalid_cursor_message = "Cursor inválido."
+    ordenacao_invalida_message = (
+        "A paginação por cursor usa apenas a ordenação padrão ({ordenacao}). "
+        "Para ordenar por outros campos ou pela relevância da busca, use a "
+        "paginação por página."
+    )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self._consulta_pagina(queryset, request, view)
+        return self._pagina(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        queryset = self._consulta_pagina(queryset, request, view)
+        return self._pagina([linha async for linha in queryset])
+
+    def _consulta_pagina(self, queryset, request, view):
+        """
+        Consulta das linhas da página, a partir do cursor, com uma linha a mais
+        para saber se existe próxima.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.campos = [
+            (campo.lstrip("-"), campo.startswith("-"))
+            for campo in view.ordenacao_keyset
+        ]
+        self.modelo = queryset.model
+
+        # A ordenação aplicada (padrão do viewset ou dos filtros) e a pedida em
+        # `ordering` devem ser prefixos da ordenação do keyset
+        pedida = request.query_params.get(api_settings.ORDERING_PARAM, "")
+        ordenacoes = (
+            tuple(queryset.query.order_by),
+            tuple(campo.strip() for campo in pedida.split(",") if campo.strip()),
+        )
+        if any(
+            ordenacao != tuple(view.ordenacao_keyset[: len(ordenacao)])
+            for ordenacao in ordenacoes
+        ):
+            raise ValidationError(
+                {
+                    "ordering": self.ordenacao_invalida_message.format(
+                        ordenacao=", ".join(view.ordenacao_keyset)
+                    )
+                }
+            )
+
+        queryset = queryset.order_by(*view.ordenacao_keyset)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self._filtro_apos(self._decodificar(cursor)))
+        return queryset[: self.page_size + 1]
+
+    def _pagina(self, linhas):
+        self.tem_proxima = len(linhas) > self.page_size
+        self.pagina = linhas[: self.page_size]
+        return self.pagina
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+            if page_size > 0:
+                return min(page_size, self.max_page_size)
+        except (KeyError, ValueError):
+            pass
+        return api_settings.PAGE_SIZE
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_next_link(self):
+        if not self.tem_proxima:
+            return None
+        ultimo = self.pagina[-1]
+        # A página pode conter instâncias ou dicionários (listagens com .values())
+        if isinstance(ultimo, dict):
+            valores = [ultimo[campo] for campo, _ in self.campos]
+        else:
+            valores = [getattr(ultimo, campo) for campo, _ in self.campos]
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self._codificar(valores)
+        )
+
+    def _filtro_apos(self, valores):
+        """
+        Monta a comparação lexicográfica (a, b, id) > (x, y, z) respeitando o
+        sentido de cada campo. O limite sobre o primeiro campo é redundante, mas
+        permite ao banco usar o índice como faixa de busca.
+        """
+        condicao = Q()
+        for i, (campo, decrescente) in enumerate(self.campos):
+            termo = Q(**{f"{campo}__{'lt' if decrescente else 'gt'}": valores[i]})
+            for j, (campo_anterior, _) in enumerate(self.campos[:i]):
+                termo &= Q(**{campo_anterior: valores[j]})
+            condicao |= termo
+
+        primeiro, decrescente = self.campos[0]
+        limite = Q(**{f"{primeiro}__{'lte' if decrescente else 'gte'}": valores[0]})
+        return limite & condicao
+
+    def _codificar(self, valores):
+        valores = [
+            valor.isoformat() if hasattr(valor, "isoformat") else valor
+            for valor in valores
+        ]
+        return base64.urlsafe_b64encode(json.dumps(valores).encode()).decode()
+
+    def _decodificar(self, cursor):
+        try:
+            valores = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            if len(valores) != len(self.campos):
+                raise ValueError
+            return [
+                self.modelo._meta.get_field(campo).to_python(valor)
+                for (campo, _), valor in zip(self.campos, valores)
+            ]
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+
+class PaginacaoVeiculos(BasePagination):
+    """
+    Seleciona a paginação por requisição: keyset quando `paginacao=cursor` ou um
+    `cursor` é informado, e por número de página nos demais casos (UI administrativa).
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.paginacao = self.selecionar(request)
+        return self.paginacao.paginate_queryset(queryset, request, view)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.paginacao = self.selecionar(request)
+        return await self.paginacao.apaginate_queryset(queryset, request, view)
+
+    def selecionar(self, request):
+        params = request.query_params
+        if (
+            params.get("paginacao") == "cursor"
+            or PaginacaoKeyset.cursor_query_param in params
+        ):
+            return PaginacaoKeyset()
+        return PaginacaoPorPagina()
+
+    def get_paginated_response(self, data):
+        return self.paginacao.get_paginated_response(data)
+
+    def to_html(self):
+        return self.paginacao.to_html()
+
+    @property
+    def display_page_controls(self):
+        paginacao = getattr(self, "paginacao", None)
+        return getattr(paginacao, "display_page_controls", False)
@@ -1,8 +1,53 @@
 from rest_framework import serializers
+from core.metricas import SerializacaoMedidaMixin
+from .imagens import TAMANHOS_DERIVADAS
 from .models import Modelo, Carro, ImagemCarro
 
 
-class ModeloSerializer(serializers.ModelSerializer):
+class CamposDinamicosMixin:
+    """
+    Permite restringir os campos serializados com o argumento `campos` (parâmetro
+    `fields` da API, ex.: ?fields=id,cor). Campos inexistentes geram erro 400.
+    """
+
+    def __init__(self, *args, campos=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if campos is None:
+            return
+
+        legiveis = [nome for nome, campo in self.fields.items() if not campo.write_only]
+        invalidos = [nome for nome in campos if nome not in legiveis]
+        if invalidos:
+            raise serializers.ValidationError(
+                {
+                    "fields": [
+                        f"Campos inválidos: {', '.join(invalidos)}. "
+                        f"Disponíveis: {', '.join(legiveis)}."
+                    ]
+                }
+            )
+        for nome in legiveis:
+            if nome not in campos:
+                self.fields.pop(nome)
+
+
+class ImagemEnviadaField(serializers.ImageField):
+    """
+    ImageField que aproveita a validação feita durante o recebimento do arquivo
+    (veiculos.uploads.UploadImagensHandler): o cabeçalho já foi verificado e o
+    arquivo não é reaberto com o Pillow. Arquivos recebidos por outros handlers
+    passam pela validação completa do ImageField.
+    """
+
+    def to_internal_value(self, data):
+        if getattr(data, "imagem_validada", False):
+            return serializers.FileField.to_internal_value(self, data)
+        return super().to_internal_value(data)
+
+
+class ModeloSerializer(
+    CamposDinamicosMixin, SerializacaoMedidaMixin, serializers.ModelSerializer
+):
     """
     Serializador para o modelo Modelo.
 
@@ -16,27 +61,36 @@ class ModeloSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         rep = super().to_representation(instance)
-        if instance.id:
+        if instance.id and "id" in rep:
             rep["id"] = (
                 f"M{instance.id:04d}"  # Formata o ID de Modelo como M0001, M0002, etc.
             )
         return rep
 
 
-class ImagemCarroSerializer(serializers.ModelSerializer):
+class ImagemCarroSerializer(SerializacaoMedidaMixin, serializers.ModelSerializer):
     """
     Serializador para o modelo ImagemCarro.
 
     Converte instâncias de ImagemCarro em representações JSON, incluindo
-    a URL absoluta da imagem.
+    a URL absoluta da imagem e de suas versões redimensionadas.
     """
 
     url_imagem = serializers.SerializerMethodField()
+    urls_derivadas = serializers.SerializerMethodField()
 
     class Meta:
         model = ImagemCarro
-        fields = ["id", "imagem", "url_imagem", "e_principal", "ordem"]
-        read_only_fields = ("url_imagem",)
+        fields = [
+            "id",
+            "imagem",
+            "url_imagem",
+            "urls_derivadas",
+            "status_processamento",
+            "e_principal",
+            "ordem",
+        ]
+        read_only_fields = ("url_imagem", "urls_derivadas", "status_processamento")
 
     def get_url_imagem(self, obj):
         request = self.context.get("request")
@@ -44,8 +98,63 @@ class ImagemCarroSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(obj.imagem.url)
         return None
 
+    def get_urls_derivadas(self, obj):
+        """
+        URLs absolutas de cada versão (miniatura, card, completa). Enquanto uma
+        versão não existir (status_processamento pendente), aponta para o original.
+        """
+        request = self.context.get("request")
+        if not obj.imagem:
+            return None
+        return {
+            tamanho: request.build_absolute_uri(obj.url_derivada(tamanho))
+            for tamanho in TAMANHOS_DERIVADAS
+        }
 
-class CarroSerializer(serializers.ModelSerializer):
+
+class ImagemPrincipalUrlsMixin:
+    """
+    URLs da imagem principal, compartilhadas pelas representações de Carro.
+    """
+
+    def get_imagem_principal_url(self, obj):
+        """
+        Obtém a URL da imagem principal do veículo para compatibilidade com frontend.
+        Primeiro usa o ponteiro imagem_capa (carregado via select_related no
+        CarroViewSet), se não houver, usa o campo imagem_principal tradicional.
+        """
+        request = self.context.get("request")
+
+        imagem_principal = obj.imagem_capa
+
+        if imagem_principal and imagem_principal.imagem:
+            return request.build_absolute_uri(imagem_principal.imagem.url)
+
+        # Fallback para o campo imagem_principal original
+        if obj.imagem_principal and hasattr(obj.imagem_principal, "url"):
+            return request.build_absolute_uri(obj.imagem_principal.url)
+
+        return None
+
+    def get_imagem_principal_miniatura_url(self, obj):
+        """
+        Obtém a URL da miniatura da imagem principal, com o mesmo fallback de
+        get_imagem_principal_url para carros sem imagem na galeria.
+        """
+        request = self.context.get("request")
+
+        if obj.imagem_capa and obj.imagem_capa.imagem:
+            return request.build_absolute_uri(obj.imagem_capa.url_derivada("miniatura"))
+
+        return self.get_imagem_principal_url(obj)
+
+
+class CarroSerializer(
+    CamposDinamicosMixin,
+    ImagemPrincipalUrlsMixin,
+    SerializacaoMedidaMixin,
+    serializers.ModelSerializer,
+):
     """
     Serializador para o modelo Carro.
 
@@ -65,11 +174,13 @@ class CarroSerializer(serializers.ModelSerializer):
 
     # Para exibir a URL completa da imagem principal (compatibilidade com frontend)
     imagem_principal_url = serializers.SerializerMethodField()
+    # Miniatura da imagem principal, usada na listagem de veículos
+    imagem_principal_miniatura_url = serializers.SerializerMethodField()
 
     # Para gerenciar as imagens
     imagens = ImagemCarroSerializer(many=True, read_only=True)
     imagens_para_upload = serializers.ListField(
-        child=serializers.ImageField(
+        child=ImagemEnviadaField(
             max_length=100000, allow_empty_file=False, use_url=False
         ),
         write_only=True,
@@ -87,6 +198,7 @@ class CarroSerializer(serializers.ModelSerializer):
             "descricao_carro",
             "imagem_principal",
             "imagem_principal_url",
+            "imagem_principal_miniatura_url",
             "imagens",
             "imagens_para_upload",
             "data_cadastro",
@@ -94,32 +206,13 @@ class CarroSerializer(serializers.ModelSerializer):
         read_only_fields = (
             "data_cadastro",
             "imagem_principal_url",
+            "imagem_principal_miniatura_url",
             "imagens",
         )
 
-    def get_imagem_principal_url(self, obj):
-        """
-        Obtém a URL da imagem principal do veículo para compatibilidade com frontend.
-        Primeiro verifica se há uma imagem principal no modelo ImagemCarro,
-        se não encontrar, usa o campo imagem_principal tradicional.
-        """
-        request = self.context.get("request")
-
-        # Busca a imagem marcada como principal
-        imagem_principal = obj.imagens.filter(e_principal=True).first()
-
-        if imagem_principal and imagem_principal.imagem:
-            return request.build_absolute_uri(imagem_principal.imagem.url)
-
-        # Fallback para o campo imagem_principal original
-        if obj.imagem_principal and hasattr(obj.imagem_principal, "url"):
-            return request.build_absolute_uri(obj.imagem_principal.url)
-
-        return None
-
     def to_representation(self, instance):
         rep = super().to_representation(instance)
-        if instance.id:
+        if instance.id and "id" in rep:
             rep["id"] = f"{instance.id:04d}"  # Formata o ID como 0001, 0002, etc.
         return rep
 
@@ -138,21 +231,10 @@ class CarroSerializer(serializers.ModelSerializer):
                 carro=carro, imagem=imagem_principal, e_principal=True, ordem=0
             )
 
-        # Processa imagens adicionais
+        # Processa imagens adicionais (a primeira será a principal apenas se não
+        # houver imagem principal)
         if imagens_data:
-            for i, imagem in enumerate(imagens_data):
-                # A primeira imagem será a principal apenas se não houver imagem principal
-                e_principal = (
-                    i == 0
-                    and not imagem_principal
-                    and not ImagemCarro.objects.filter(
-                        carro=carro, e_principal=True
-                    ).exists()
-                )
-
-                ImagemCarro.objects.create(
-                    carro=carro, imagem=imagem, e_principal=e_principal, ordem=i + 1
-                )
+            carro.adicionar_imagens(imagens_data)
 
         return carro
 
@@ -166,10 +248,12 @@ class CarroSerializer(serializers.ModelSerializer):
         # Processa a imagem principal, se fornecida
         if imagem_principal:
             # Verifica se já existe uma imagem principal
-            imagem_principal_existente = carro.imagens.filter(e_principal=True).first()
+            imagem_principal_existente = carro.imagem_capa
 
             if imagem_principal_existente:
-                # Atualiza a imagem principal existente
+                # Atualiza a imagem principal existente (compartilhando a instância
+                # do carro para que o ponteiro atualizado reflita na resposta)
+                imagem_principal_existente.carro = carro
                 imagem_principal_existente.imagem = imagem_principal
                 imagem_principal_existente.save()
             else:
@@ -178,43 +262,94 @@ class CarroSerializer(serializers.ModelSerializer):
                     carro=carro, imagem=imagem_principal, e_principal=True, ordem=0
                 )
 
-            # Para compatibilidade com o frontend, também atualiza o campo imagem_principal
-            if instance.imagem_principal != imagem_principal:
-                instance.imagem_principal = imagem_principal
-                instance.save(update_fields=["imagem_principal"])
-
-        # Processa imagens adicionais
+        # Processa imagens adicionais, após a ordem atual da galeria
         if imagens_data:
-            # Obtém a próxima ordem disponível
-            ultima_ordem = (
-                carro.imagens.filter(e_principal=False)
-                .order_by("-ordem")
-                .values_list("ordem", flat=True)
-                .first()
-                or 0
-            )
+            carro.adicionar_imagens(imagens_data)
 
-            # Verifica se já existe uma imagem principal antes de processar novas
-            tem_imagem_principal = carro.imagens.filter(e_principal=True).exists()
+        return carro
 
-            # Adiciona as novas imagens
-            for i, imagem in enumerate(imagens_data):
-                # Se não houver imagem principal e esta for a primeira, marca como principal
-                e_principal = (
-                    i == 0 and not tem_imagem_principal and not imagem_principal
-                )
 
-                # Se esta imagem for marcada como principal, desmarca outras que possam estar assim
-                if e_principal:
-                    ImagemCarro.objects.filter(carro=carro, e_principal=True).update(
-                        e_principal=False
-                    )
+class ModeloResumoSerializer(ModeloSerializer):
+    """
+    Modelo sem a descrição, aninhado na listagem de carros.
+    """
 
-                ImagemCarro.objects.create(
-                    carro=carro,
-                    imagem=imagem,
-                    e_principal=e_principal,
-                    ordem=ultima_ordem + i + 1,
-                )
+    class Meta(ModeloSerializer.Meta):
+        fields = ["id", "nome_marca", "nome_modelo", "ano_modelo"]
 
-        return carro
+
+class CarroListaSerializer(
+    ImagemPrincipalUrlsMixin, SerializacaoMedidaMixin, serializers.ModelSerializer
+):
+    """
+    Representação compacta de Carro usada na listagem (grade de cards): sem a
+    descrição, sem a galeria de imagens e apenas com a miniatura da principal.
+    A representação completa fica no detalhe (CarroSerializer).
+    """
+
+    modelo = ModeloResumoSerializer(read_only=True)
+    imagem_principal_miniatura_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Carro
+        fields = [
+            "id",
+            "modelo",
+            "ano_fabricacao",
+            "cor",
+            "imagem_principal_miniatura_url",
+            "data_cadastro",
+        ]
+
+    def to_representation(self, instance):
+        rep = super().to_representation(instance)
+        if instance.id and "id" in rep:
+            rep["id"] = f"{instance.id:04d}"  # Mesmo formato do CarroSerializer
+        return rep
+
+
+class CarroLoteSerializer(serializers.ModelSerializer):
+    """
+    Item da gravação em lote de carros (ação lote do CarroViewSet): com id, o
+    carro existente é atualizado; sem id, um carro novo é criado. O modelo_id é
+    um inteiro, e a existência dos modelos é conferida em uma única consulta para
+    todo o lote (ver veiculos.gravacao_lote), e não por item como no
+    PrimaryKeyRelatedField do CarroSerializer.
+    """
+
+    id = serializers.IntegerField(min_value=1, required=False, allow_null=True)
+    modelo_id = serializers.IntegerField(min_value=1)
+
+    class Meta:
+        model = Carro
+        fields = ["id", "modelo_id", "ano_fabricacao", "cor", "descricao_carro"]
+
+
+class UploadImagensSerializer(serializers.Serializer):
+    """
+    Serializador de entrada do envio em lote de imagens de um veículo.
+    """
+
+    imagens = serializers.ListField(
+        child=ImagemEnviadaField(allow_empty_file=False, use_url=False),
+        allow_empty=False,
+    )
+
+
+class OrdemImagemSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    ordem = serializers.IntegerField(min_value=0, max_value=32767)
+
+
+class ReordenarImagensSerializer(serializers.Serializer):
+    """
+    Serializador de entrada da reordenação das imagens de um veículo.
+    """
+
+    imagens = OrdemImagemSerializer(many=True, allow_empty=False)
+
+    def validate_imagens(self, imagens):
+        ids = [item["id"] for item in imagens]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError("A lista contém imagens repetidas.")
+        return imagens
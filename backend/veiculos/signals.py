@@ -0,0 +1,68 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .arquivos import remover_apos_commit
+from .busca import indexar_carros
+from .models import Carro, ImagemCarro, Modelo, VersaoTabela
+
+
+@receiver(post_save, sender=Modelo)
+@receiver(post_save, sender=Carro)
+@receiver(post_save, sender=ImagemCarro)
+@receiver(post_delete, sender=Modelo)
+@receiver(post_delete, sender=Carro)
+@receiver(post_delete, sender=ImagemCarro)
+def incrementar_versao_tabela(sender, **kwargs):
+    """
+    Incrementa a versão da tabela a cada escrita no catálogo, invalidando os
+    validadores HTTP (ETag/Last-Modified) das listagens.
+    """
+    VersaoTabela.incrementar(sender)
+
+
+@receiver(post_delete, sender=ImagemCarro)
+def remover_arquivo_imagem(sender, instance, **kwargs):
+    """
+    Remove o arquivo e as versões derivadas da imagem excluída (inclusive em
+    cascata com o carro) após o commit.
+    """
+    remover_apos_commit(
+        instance.imagem.storage, instance.imagem.name, instance.derivadas
+    )
+
+
+@receiver(post_delete, sender=Carro)
+def remover_imagem_principal_legada(sender, instance, **kwargs):
+    """
+    Remove o arquivo do campo legado imagem_principal do carro excluído, caso não
+    seja também o de uma imagem da galeria (ver veiculos.arquivos). O campo
+    legado aponta para os arquivos da galeria (Carro._aplicar_imagem_capa), então
+    a remoção passa pelo storage dela, que só apaga o arquivo tomado e conferido
+    de novo contra as referências e os uploads que o reaproveitaram.
+    """
+    if instance.imagem_principal:
+        remover_apos_commit(
+            ImagemCarro._meta.get_field("imagem").storage,
+            instance.imagem_principal.name,
+        )
+
+
+@receiver(post_save, sender=Carro)
+def indexar_carro(sender, instance, update_fields=None, **kwargs):
+    """
+    Atualiza os termos da busca textual do carro salvo, exceto quando nenhum
+    campo indexado foi gravado (ex.: troca da imagem de capa).
+    """
+    if update_fields is None or {"modelo", "cor", "descricao_carro"} & update_fields:
+        indexar_carros(Carro.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Modelo)
+def indexar_carros_do_modelo(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Atualiza os termos dos carros do modelo salvo, que incluem a marca, o nome e
+    a descrição do modelo. Um modelo novo ainda não tem carros.
+    """
+    campos = {"nome_marca", "nome_modelo", "descricao_modelo"}
+    if not created and (update_fields is None or campos & update_fields):
+        indexar_carros(instance.carros_especificos.all())
@@ -1,3 +1,2377 @@
-from django.test import TestCase
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from urllib.parse import parse_qsl, urlsplit
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import F
+from django.test import TestCase, override_settings, tag
+from django.test.utils import CaptureQueriesContext
+from django.urls import include, path, reverse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from PIL import Image
+
+from core.banco.pool import PoolConexoes
+from core.metricas import percentil, registro
+from core.renderizadores import RenderizadorJSONRapido
+
+from .api_assincrona import rotas_assincronas
+from .api_urls import router
+from .api_views import CarroViewSet, ModeloViewSet
+from .busca import tokenizar
+from .cache_respostas import cache_respostas, estatisticas
+from .condicional import RespostaCondicionalMixin
+from .exportacao import ExportacaoCarros
+from .imagens import TAMANHOS_DERIVADAS, caminho_derivada, gerar_derivadas
+from .management.commands.importar_inventario import Command
+from .models import Modelo, Carro, ImagemCarro, TermoBusca, VersaoTabela
+from .uploads import UploadImagensHandler
+
+
+def criar_carros(modelo, quantidade, imagens_por_carro=3):
+    """
+    Cria `quantidade` carros do `modelo`, cada um com `imagens_por_carro` imagens.
+    Os arquivos não precisam existir em disco, apenas o caminho é gravado.
+    """
+    carros = []
+    for i in range(quantidade):
+        carro = Carro.objects.create(
+            modelo=modelo, ano_fabricacao=2020 + i % 5, cor="Prata"
+        )
+        for ordem in range(imagens_por_carro):
+            ImagemCarro.objects.create(
+                carro=carro,
+                imagem=f"imagens_carros/{carro.id}/foto_{ordem}.jpg",
+                e_principal=ordem == 0,
+                ordem=ordem,
+            )
+        carros.append(carro)
+    return carros
+
+
+def gerar_imagem(nome="foto.jpg", tamanho=(64, 48), cor="red"):
+    """Gera um arquivo JPEG em memória para simular um upload."""
+    conteudo = io.BytesIO()
+    Image.new("RGB", tamanho, cor).save(conteudo, "JPEG")
+    return SimpleUploadedFile(nome, conteudo.getvalue(), content_type="image/jpeg")
+
+
+class MediaTemporariaMixin:
+    """Direciona os uploads dos testes para um MEDIA_ROOT temporário."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        configuracao = override_settings(MEDIA_ROOT=media_root)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+
+class CarroListQueryCountTests(TestCase):
+    """
+    Garante que a listagem de carros não executa consultas por linha (N+1).
+    """
+
+    def setUp(self):
+        cache_respostas().clear()
+        self.client = APIClient()
+        self.modelo = Modelo.objects.create(
+            nome_marca="Fiat", nome_modelo="Uno", ano_modelo=2020
+        )
+        self.url = reverse("carro-list")
+
+    def test_numero_de_consultas_constante_independente_do_tamanho_da_pagina(self):
+        # Versões das tabelas (ETag) + COUNT da paginação + carros (com join em
+        # modelo e na imagem principal); a listagem compacta não carrega a galeria
+        criar_carros(self.modelo, 1)
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data["results"]), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            criar_carros(self.modelo, 9)
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data["results"]), 10)
+
+    def test_galeria_pedida_em_fields_carregada_com_prefetch(self):
+        criar_carros(self.modelo, 10)
+        # Mais uma consulta, para as imagens de toda a página
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url, {"fields": "id,imagens"})
+        self.assertEqual(len(response.data["results"]), 10)
+
+    def test_imagem_principal_resolvida_a_partir_do_prefetch(self):
+        (carro,) = criar_carros(self.modelo, 1)
+        response = self.client.get(
+            self.url, {"fields": "id,imagem_principal_url,imagens"}
+        )
+
+        item = response.data["results"][0]
+        self.assertTrue(
+            item["imagem_principal_url"].endswith(
+                f"/media/imagens_carros/{carro.id}/foto_0.jpg"
+            )
+        )
+        self.assertEqual([img["ordem"] for img in item["imagens"]], [0, 1, 2])
+
+
+class ImagemPrincipalTests(TestCase):
+    """
+    Garante a consistência do ponteiro imagem_capa e da imagem principal única.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        modelo = Modelo.objects.create(
+            nome_marca="Fiat", nome_modelo="Uno", ano_modelo=2020
+        )
+        (self.carro,) = criar_carros(modelo, 1)
+        self.imagens = list(self.carro.imagens.order_by("ordem"))
+
+    def test_imagem_capa_preenchida_ao_criar_imagem_principal(self):
+        self.carro.refresh_from_db()
+        self.assertEqual(self.carro.imagem_capa_id, self.imagens[0].id)
+        self.assertEqual(self.carro.imagem_principal.name, self.imagens[0].imagem.name)
+
+    def test_set_imagem_principal_mantem_uma_unica_principal(self):
+        url = reverse("carro-set-imagem-principal", args=[self.carro.id])
+        response = self.client.post(
+            url, {"imagem_id": self.imagens[2].id}, format="json"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.carro.refresh_from_db()
+        self.assertEqual(self.carro.imagem_capa_id, self.imagens[2].id)
+        self.assertEqual(
+            list(
+                self.carro.imagens.filter(e_principal=True).values_list("id", flat=True)
+            ),
+            [self.imagens[2].id],
+        )
+
+    def test_excluir_imagem_principal_limpa_ponteiro(self):
+        url = reverse("carro-delete-imagem", args=[self.carro.id])
+        response = self.client.delete(
+            url, {"imagem_id": self.imagens[0].id}, format="json"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.carro.refresh_from_db()
+        self.assertIsNone(self.carro.imagem_capa_id)
+        self.assertFalse(self.carro.imagem_principal)
+
+    def test_banco_rejeita_segunda_imagem_principal(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            ImagemCarro.objects.filter(id=self.imagens[1].id).update(e_principal=True)
+
+    def test_leitura_da_imagem_principal_sem_consultas(self):
+        carro = Carro.objects.select_related("imagem_capa").get(id=self.carro.id)
+        with self.assertNumQueries(0):
+            self.assertEqual(carro.imagem_capa.imagem.name, self.imagens[0].imagem.name)
+
+    def test_full_clean_aceita_imagem_principal(self):
+        # A troca da principal é feita pelo save(), então a validação não a recusa
+        self.imagens[0].full_clean()
+        self.imagens[1].e_principal = True
+        self.imagens[1].full_clean()
+
+    def test_admin_marca_outra_imagem_como_principal(self):
+        usuario = User.objects.create_superuser("admin", "admin@exemplo.com", "senha")
+        self.client.force_login(usuario)
+        imagem = self.imagens[1]
+        response = self.client.post(
+            reverse("admin:veiculos_imagemcarro_change", args=[imagem.id]),
+            {"carro": self.carro.id, "e_principal": "on", "ordem": imagem.ordem},
+        )
+
+        self.assertEqual(response.status_code, 302)
+        self.carro.refresh_from_db()
+        self.assertEqual(self.carro.imagem_capa_id, imagem.id)
+        self.assertEqual(
+            list(
+                self.carro.imagens.filter(e_principal=True).values_list("id", flat=True)
+            ),
+            [imagem.id],
+        )
+
+
+class ImagensDerivadasTests(MediaTemporariaMixin, TestCase):
+    """
+    Testa a geração das versões redimensionadas das imagens no upload.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.modelo = Modelo.objects.create(
+            nome_marca="Fiat", nome_modelo="Uno", ano_modelo=2020
+        )
+
+    def test_upload_enfileira_e_worker_gera_versoes_derivadas(self):
+        response = self.client.post(
+            reverse("carro-list"),
+            {
+                "modelo_id": self.modelo.id,
+                "ano_fabricacao": 2021,
+                "cor": "Azul",
+                "imagens_para_upload": [gerar_imagem(tamanho=(2400, 1600))],
+            },
+            format="multipart",
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            response.data["imagens"][0]["status_processamento"], "pendente"
+        )
+
+        call_command(
+            "processar_imagens", processos=0, uma_vez=True, stdout=io.StringIO()
+        )
+
+        imagem = ImagemCarro.objects.get()
+        self.assertEqual(imagem.status_processamento, "concluido")
+        self.assertEqual(imagem.derivadas["origem"], imagem.imagem.name)
+        for tamanho, dimensao in TAMANHOS_DERIVADAS.items():
+            with default_storage.open(imagem.derivadas[tamanho]) as arquivo:
+                self.assertEqual(max(Image.open(arquivo).size), dimensao)
+
+        response = self.client.get(reverse("carro-detail", args=[imagem.carro_id]))
+        urls = response.data["imagens"][0]["urls_derivadas"]
+        self.assertIn("/derivadas/", urls["miniatura"])
+        self.assertEqual(
+            response.data["imagem_principal_miniatura_url"], urls["miniatura"]
+        )
+
+    def test_imagem_sem_derivadas_usa_url_original(self):
+        (carro,) = criar_carros(self.modelo, 1, imagens_por_carro=1)
+        imagem = carro.imagens.get()
+
+        self.assertEqual(imagem.url_derivada("miniatura"), imagem.imagem.url)
+
+    def test_troca_do_arquivo_devolve_imagem_para_a_fila(self):
+        (carro,) = criar_carros(self.modelo, 1, imagens_por_carro=1)
+        imagem = carro.imagens.get()
+        ImagemCarro.objects.filter(pk=imagem.pk).update(
+            status_processamento="concluido",
+            derivadas={"origem": imagem.imagem.name},
+        )
+        imagem.refresh_from_db()
+
+        imagem.imagem = gerar_imagem("nova.jpg")
+        imagem.save()
+
+        imagem.refresh_from_db()
+        self.assertEqual(imagem.status_processamento, "pendente")
+
+    def test_worker_remove_metadados_do_original(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientação: girar 90 graus
+        exif[0x8825] = {1: "S", 2: (23.0, 33.0, 0.0)}  # GPS
+        conteudo = io.BytesIO()
+        Image.new("RGB", (60, 40), "red").save(
+            conteudo, "JPEG", exif=exif, comment=b"Camera"
+        )
+        self.client.post(
+            reverse("carro-list"),
+            {
+                "modelo_id": self.modelo.id,
+                "ano_fabricacao": 2021,
+                "cor": "Azul",
+                "imagens_para_upload": [
+                    SimpleUploadedFile("foto.jpg", conteudo.getvalue())
+                ],
+            },
+            format="multipart",
+        )
+
+        call_command(
+            "processar_imagens", processos=0, uma_vez=True, stdout=io.StringIO()
+        )
+
+        imagem = ImagemCarro.objects.get()
+        self.assertEqual(imagem.status_processamento, "concluido")
+        with imagem.imagem.open("rb") as arquivo:
+            original = Image.open(arquivo)
+            self.assertEqual(original.format, "JPEG")
+            self.assertEqual(original.size, (40, 60))  # Rotação aplicada
+            self.assertFalse(original.getexif())
+            self.assertNotIn("comment", original.info)
+
+    def test_worker_marca_erro_para_arquivo_invalido(self):
+        criar_carros(self.modelo, 1, imagens_por_carro=1)  # Arquivo inexistente
+
+        call_command(
+            "processar_imagens",
+            processos=0,
+            uma_vez=True,
+            stdout=io.StringIO(),
+            stderr=io.StringIO(),
+        )
+
+        self.assertEqual(ImagemCarro.objects.get().status_processamento, "erro")
+
+
+class UploadImagensTests(MediaTemporariaMixin, TestCase):
+    """
+    Testa o envio em lote de imagens (carros/{id}/upload_imagens/).
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        modelo = Modelo.objects.create(
+            nome_marca="Fiat", nome_modelo="Uno", ano_modelo=2020
+        )
+        self.carro = Carro.objects.create(
+            modelo=modelo, ano_fabricacao=2020, cor="Prata"
+        )
+        self.url = reverse("carro-upload-imagens", args=[self.carro.id])
+
+    def enviar(self, quantidade):
+        arquivos = [gerar_imagem(f"foto_{i}.jpg") for i in range(quantidade)]
+        return self.client.post(self.url, {"imagens": arquivos}, format="multipart")
+
+    def test_primeira_imagem_vira_principal_e_ordem_continua(self):
+        response = self.enviar(3)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([img["ordem"] for img in response.data], [1, 2, 3])
+        self.assertEqual(
+            [img["e_principal"] for img in response.data], [True, False, False]
+        )
+        self.carro.refresh_from_db()
+        self.assertEqual(self.carro.imagem_capa_id, response.data[0]["id"])
+
+        response = self.enviar(2)
+        self.assertEqual([img["ordem"] for img in response.data], [4, 5])
+        self.assertFalse(any(img["e_principal"] for img in response.data))
+
+    def test_numero_de_consultas_independe_da_quantidade_de_imagens(self):
+        self.enviar(1)  # Garante que o carro já tenha imagem principal
+
+        with CaptureQueriesContext(connection) as poucas:
+            self.enviar(2)
+        with CaptureQueriesContext(connection) as muitas:
+            response = self.enviar(12)
+
+        self.assertEqual(len(response.data), 12)
+        self.assertEqual(len(poucas), len(muitas))
+
+    def test_arquivo_invalido_nao_cria_imagens(self):
+        invalido = SimpleUploadedFile("texto.jpg", b"nao e imagem", "image/jpeg")
+        response = self.client.post(
+            self.url, {"imagens": [gerar_imagem(), invalido]}, format="multipart"
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ImagemCarro.objects.exists())
+
+
+class ReordenarImagensTests(TestCase):
+    """
+    Testa a reordenação em lote das imagens (carros/{id}/reordenar_imagens/).
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.modelo = Modelo.objects.create(
+            nome_marca="Fiat", nome_modelo="Uno", ano_modelo=2020
+        )
+
+    def reordenar(self, carro, itens):
+        url = reverse("carro-reordenar-imagens", args=[carro.id])
+        return self.client.post(url, {"imagens": itens}, format="json")
+
+    def test_reordena_e_normaliza_para_sequencia_densa(self):
+        (carro,) = criar_carros(self.modelo, 1, imagens_por_carro=4)
+        ids = list(carro.imagens.order_by("ordem").values_list("id", flat=True))
+
+        response = self.reordenar(
+            carro, [{"id": ids[3], "ordem": 10}, {"id": ids[1], "ordem": 20}]
+        )
+
+        self.assertEqual(response.status_code, 200)
+        esperado = [ids[3], ids[1], ids[0], ids[2]]
+        self.assertEqual([item["id"] for item in response.data["imagens"]], esperado)
+        self.assertEqual(
+            list(carro.imagens.order_by("ordem").values_list("id", "ordem")),
+            [(imagem_id, ordem) for ordem, imagem_id in enumerate(esperado, start=1)],
+        )
+
+    def test_rejeita_imagem_de_outro_carro_sem_alterar_nada(self):
+        carro, outro = criar_carros(self.modelo, 2, imagens_por_carro=2)
+        antes = list(carro.imagens.values_list("id", "ordem"))
+        estranha = outro.imagens.first().id
+
+        response = self.reordenar(
+            carro, [{"id": antes[0][0], "ordem": 5}, {"id": estranha, "ordem": 1}]
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["imagens_invalidas"], [estranha])
+        self.assertEqual(list(carro.imagens.values_list("id", "ordem")), antes)
+
+    def test_rejeita_imagens_repetidas(self):
+        (carro,) = criar_carros(self.modelo, 1, imagens_por_carro=2)
+        imagem_id = carro.imagens.first().id
+
+        response = self.reordenar(
+            carro, [{"id": imagem_id, "ordem": 1}, {"id": imagem_id, "ordem": 2}]
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejeita_ordem_fora_do_limite_da_coluna(self):
+        (carro,) = criar_carros(self.modelo, 1, imagens_por_carro=1)
+        imagem = carro.imagens.get()
+
+        response = self.reordenar(carro, [{"id": imagem.id, "ordem": 32768}])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("imagens", response.data)
+        self.assertEqual(carro.imagens.get().ordem, imagem.ordem)
+
+    def test_numero_de_consultas_independe_da_quantidade_de_imagens(self):
+        poucas, muitas = [
+            criar_carros(self.modelo, 1, imagens_por_carro=quantidade)[0]
+            for quantidade in (3, 30)
+        ]
+
+        contagens = []
+        for carro in (poucas, muitas):
+            # Inverte a galeria inteira, alterando a ordem de todas as imagens
+            ids = list(carro.imagens.order_by("ordem").values_list("id", flat=True))
+            itens = [
+                {"id": imagem_id, "ordem": len(ids) - i}
+                for i, imagem_id in enumerate(ids)
+            ]
+            with CaptureQueriesContext(connection) as consultas:
+                response = self.reordenar(carro, itens)
+            self.assertEqual(response.status_code, 200)
+            contagens.append(len(consultas))
+
+        self.assertEqual(contagens[0], contagens[1])
+
+
+class PaginacaoTests(TestCase):
+    """
+    Testa a paginação por cursor (keyset) e a paginação por página sem COUNT(*).
+    """
+
+    def setUp(self):
+        cache_respostas().clear()
+        self.client = APIClient()
+        self.modelo = Modelo.objects.create(
+            nome_marca="Fiat", nome_modelo="Uno", ano_modelo=2020
+        )
+        self.carros = criar_carros(self.modelo, 25, imagens_por_carro=1)
+        self.url = reverse("carro-list")
+
+    def percorrer(self, url, params=None):
+        ids = []
+        while url:
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            ids += [item["id"] for item in response.data["results"]]
+            url, params = response.data["next"], None
+        return ids
+
+    def test_cursor_percorre_todos_os_carros_na_ordem_padrao(self):
+        ids = self.percorrer(self.url, {"paginacao": "cursor"})
+
+        esperado = [f"{carro.id:04d}" for carro in reversed(self.carros)]
+        self.assertEqual(ids, esperado)
+
+    def test_cursor_estavel_com_insercoes_concorrentes(self):
+        response = self.client.get(self.url, {"paginacao": "cursor"})
+        vistos = [item["id"] for item in response.data["results"]]
+
+        # Carros novos entram no início da ordenação e não deslocam as próximas páginas
+        criar_carros(self.modelo, 5, imagens_por_carro=1)
+        vistos += self.percorrer(response.data["next"])
+
+        esperado = [f"{carro.id:04d}" for carro in reversed(self.carros)]
+        self.assertEqual(vistos, esperado)
+
+    def test_cursor_sem_count_e_com_consultas_constantes(self):
+        response = self.client.get(self.url, {"paginacao": "cursor"})
+        proxima = response.data["next"]
+
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(proxima)
+
+        # Versões das tabelas (ETag) + carros
+        self.assertEqual(len(consultas), 2)
+        self.assertFalse(any("COUNT(" in q["sql"] for q in consultas.captured_queries))
+        self.assertNotIn("count", response.data)
+
+    def test_cursor_de_modelos_ordenado_por_marca_e_nome(self):
+        for nome in ["Palio", "Argo", "Mobi"]:
+            Modelo.objects.create(nome_marca="Fiat", nome_modelo=nome, ano_modelo=2020)
+        Modelo.objects.create(nome_marca="Audi", nome_modelo="A3", ano_modelo=2021)
+
+        ids = self.percorrer(
+            reverse("modelo-list"), {"paginacao": "cursor", "page_size": 2}
+        )
+
+        esperado = [
+            f"M{pk:04d}"
+            for pk in Modelo.objects.order_by(
+                "nome_marca", "nome_modelo", "id"
+            ).values_list("id", flat=True)
+        ]
+        self.assertEqual(ids, esperado)
+
+    def test_cursor_rejeita_outras_ordenacoes(self):
+        for params in (
+            {"ordering": "-ano_fabricacao"},
+            {"ordering": "-cor"},  # Campo não ordenável, ignorado pelo filtro
+            {"q": "prata", "ordering": "-cor"},
+            {"q": "prata"},  # Ordenada pela relevância
+        ):
+            response = self.client.get(self.url, {"paginacao": "cursor", **params})
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn("ordering", response.data)
+
+        # A ordenação padrão, explícita, é a do keyset
+        response = self.client.get(
+            self.url, {"paginacao": "cursor", "ordering": "-data_cadastro"}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_cursor_invalido_retorna_404(self):
+        response = self.client.get(self.url, {"cursor": "invalido"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_paginacao_por_pagina_sem_contagem(self):
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get(self.url, {"contagem": "false", "page": 3})
+
+        self.assertFalse(any("COUNT(" in q["sql"] for q in consultas.captured_queries))
+        self.assertIsNone(response.data["count"])
+        self.assertIsNone(response.data["next"])
+        self.assertEqual(len(response.data["results"]), 5)
+        self.assertIn("page=2", response.data["previous"])
+
+
+class RespostaCondicionalTests(TestCase):
+    """
+    Testa o ETag/Last-Modified das listagens e do detalhe de carros.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.modelo = Modelo.objects.create(
+            nome_marca="Fiat", nome_modelo="Uno", ano_modelo=2020
+        )
+        self.carros = criar_carros(self.modelo, 3)
+        self.url = reverse("carro-list")
+
+    def etag(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Last-Modified", response)
+        self.assertIn("no-cache", response["Cache-Control"])
+        return response["ETag"]
+
+    def test_listagem_inalterada_responde_304_sem_serializar(self):
+        etag = self.etag(self.url)
+
+        # Sem o cache de respostas, apenas a leitura das versões das tabelas
+        cache_respostas().clear()
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_etag_da_listagem_muda_a_cada_escrita(self):
+        carro = self.carros[0]
+        escritas = [
+            lambda: self.modelo.save(),
+            lambda: self.client.post(
+                reverse("carro-reordenar-imagens", args=[carro.id]),
+                {"imagens": [{"id": carro.imagens.last().id, "ordem": 0}]},
+                format="json",
+            ),
+            lambda: ImagemCarro.objects.create(
+                carro=carro, imagem=f"imagens_carros/{carro.id}/nova.jpg", ordem=9
+            ),
+            lambda: self.carros[-1].delete(),
+        ]
+
+        etags = [self.etag(self.url)]
+        for escrever in escritas:
+            with self.captureOnCommitCallbacks(execute=True):
+                escrever()
+            etags.append(self.etag(self.url))
+        self.assertEqual(len(set(etags)), len(etags))
+
+    def test_detalhe_usa_a_data_do_carro_e_do_modelo(self):
+        url = reverse("carro-detail", args=[self.carros[0].id])
+        etag = self.etag(url)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        # Alterar outro carro não invalida este detalhe; alterar o modelo, sim
+        with self.captureOnCommitCallbacks(execute=True):
+            self.carros[1].save()
+        self.assertEqual(self.etag(url), etag)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.modelo.save()
+        self.assertNotEqual(self.etag(url), etag)
+
+    def test_detalhe_inexistente_responde_404(self):
+        response = self.client.get(reverse("carro-detail", args=[9999]))
+        self.assertEqual(response.status_code, 404)
+
+
+class CacheRespostasTests(TestCase):
+    """
+    Testa o cache de respostas das listagens e sua invalidação pelas escritas.
+    """
+
+    def setUp(self):
+        cache_respostas().clear()
+        registro.zerar()
+        self.client = APIClient()
+        self.modelo = Modelo.objects.create(
+            nome_marca="Fiat", nome_modelo="Uno", ano_modelo=2020
+        )
+        self.carro = criar_carros(self.modelo, 2)[0]
+        self.url = reverse("carro-list")
+
+    def test_acerto_servido_com_uma_consulta_as_versoes(self):
+        primeira = self.client.get(self.url)
+        self.assertEqual(primeira["X-Cache"], "MISS")
+
+        with self.assertNumQueries(1):
+            segunda = self.client.get(self.url)
+        self.assertEqual(segunda["X-Cache"], "HIT")
+        self.assertEqual(segunda.content, primeira.content)
+        self.assertEqual(segunda["ETag"], primeira["ETag"])
+        self.assertEqual(segunda["Vary"], primeira["Vary"])
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=primeira["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+        self.assertEqual(estatisticas()["acertos"], 2)
+        self.assertEqual(estatisticas()["falhas"], 1)
+
+    def test_versao_incrementada_fora_da_transacao_da_escrita(self):
+        versao = VersaoTabela.versoes(Carro).get("veiculos.carro", (0, None))[0]
+        with self.captureOnCommitCallbacks() as callbacks:
+            with CaptureQueriesContext(connection) as consultas:
+                self.carro.cor = "Azul"
+                self.carro.save()
+        # A linha da versão não é travada pela transação da escrita
+        self.assertFalse([c for c in consultas if "veiculos_versaotabela" in c["sql"]])
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(VersaoTabela.versoes(Carro)["veiculos.carro"][0], versao + 1)
+
+    def test_esquema_e_parametros_do_tipo_separam_as_entradas(self):
+        http = self.client.get(self.url)
+        https = self.client.get(self.url, secure=True)
+        self.assertEqual(https["X-Cache"], "MISS")
+        self.assertIn(b"http://testserver/", http.content)
+        self.assertIn(b"https://testserver/", https.content)
+        self.assertNotIn(b"http://testserver/", https.content)
+
+        indentada = self.client.get(self.url, HTTP_ACCEPT="application/json; indent=4")
+        self.assertEqual(indentada["X-Cache"], "MISS")
+        self.assertNotEqual(indentada.content, http.content)
+
+    def test_parametros_normalizados_compartilham_a_entrada(self):
+        self.client.get(self.url + "?cor=Prata&ordering=-ano_fabricacao")
+        response = self.client.get(self.url + "?ordering=-ano_fabricacao&cor=Prata")
+        self.assertEqual(response["X-Cache"], "HIT")
+
+        response = self.client.get(self.url + "?cor=Preto&ordering=-ano_fabricacao")
+        self.assertEqual(response["X-Cache"], "MISS")
+
+    def test_escritas_invalidam_a_listagem(self):
+        imagens = list(self.carro.imagens.order_by("ordem"))
+        escritas = [
+            lambda: self.client.patch(
+                reverse("modelo-detail", args=[self.modelo.id]),
+                {"descricao_modelo": "Hatch"},
+                format="json",
+            ),
+            lambda: self.client.post(
+                reverse("carro-reordenar-imagens", args=[self.carro.id]),
+                {"imagens": [{"id": imagens[-1].id, "ordem": 0}]},
+                format="json",
+            ),
+            lambda: self.client.post(
+                reverse("carro-set-imagem-principal", args=[self.carro.id]),
+                {"imagem_id": imagens[1].id},
+                format="json",
+            ),
+            lambda: self.client.delete(
+                reverse("carro-delete-imagem", args=[self.carro.id]),
+                {"imagem_id": imagens[2].id},
+                format="json",
+            ),
+            lambda: self.client.patch(
+                reverse("carro-detail", args=[self.carro.id]),
+                {"cor": "Azul"},
+                format="json",
+            ),
+        ]
+
+        for escrever in escritas:
+            self.client.get(self.url)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.assertLess(escrever().status_code, 300)
+            response = self.client.get(self.url)
+            self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["results"][1]["cor"], "Azul")
+
+    def test_escrita_em_carro_nao_invalida_modelos(self):
+        url = reverse("modelo-list")
+        self.client.get(url)
+        self.carro.save()
+        self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+
+    def test_acerto_repete_o_vary_da_resposta_gravada(self):
+        listar = RespostaCondicionalMixin.list
+
+        def listar_com_vary(viewset, request, *args, **kwargs):
+            resposta = listar(viewset, request, *args, **kwargs)
+            patch_vary_headers(resposta, ["Accept-Language"])
+            return resposta
+
+        with mock.patch.object(RespostaCondicionalMixin, "list", listar_com_vary):
+            primeira = self.client.get(self.url)
+            segunda = self.client.get(self.url)
+        self.assertEqual(segunda["X-Cache"], "HIT")
+        self.assertIn("Accept-Language", segunda["Vary"])
+        self.assertEqual(segunda["Vary"], primeira["Vary"])
+
+    def test_escrita_de_outro_processo_invalida_a_listagem(self):
+        # Ex.: worker de imagens ou importação: só a versão no banco é alterada
+        self.client.get(self.url)
+        VersaoTabela.objects.filter(tabela="veiculos.carro").update(
+            versao=F("versao") + 1
+        )
+        self.assertEqual(self.client.get(self.url)["X-Cache"], "MISS")
+
+
+class PoolConexoesTests(unittest.TestCase):
+    """
+    Testa o pool de conexões em processo (core.banco.pool) com conexões SQLite.
+    """
+
+    def conectar(self):
+        return sqlite3.connect(":memory:", check_same_thread=False)
+
+    def test_reaproveita_conexao_devolvida(self):
+        pool = PoolConexoes(self.conectar, tamanho=2)
+        conexao = pool.obter()
+        pool.devolver(conexao)
+
+        self.assertIs(pool.obter(), conexao)
+        self.assertEqual(pool.criadas, 1)
+
+    def test_falha_quando_todas_estao_em_uso(self):
+        pool = PoolConexoes(self.conectar, tamanho=1, espera=0.01)
+        pool.obter()
+        with self.assertRaises(OperationalError):
+            pool.obter()
+
+    def test_descarta_conexao_que_falha_na_verificacao(self):
+        def verificar(conexao):
+            conexao.execute("SELECT 1")
+
+        pool = PoolConexoes(self.conectar, tamanho=1, verificar=verificar)
+        conexao = pool.obter()
+        pool.devolver(conexao)
+        conexao.close()  # Simula o servidor encerrando a conexão ociosa
+
+        nova = pool.obter()
+        self.assertIsNot(nova, conexao)
+        self.assertEqual(pool.criadas, 2)
+
+    def test_transacao_pendente_desfeita_ao_devolver(self):
+        pool = PoolConexoes(self.conectar, tamanho=1)
+        conexao = pool.obter()
+        conexao.execute("CREATE TABLE t (x)")
+        conexao.commit()
+        conexao.execute("INSERT INTO t VALUES (1)")
+        pool.devolver(conexao)
+
+        conexao = pool.obter()
+        self.assertEqual(conexao.execute("SELECT COUNT(*) FROM t").fetchone(), (0,))
+
+
+@override_settings(METRICAS_AMOSTRAGEM=1.0, METRICAS_TOKEN="segredo")
+class MetricasTests(TestCase):
+    """
+    Testa o middleware de métricas (core.metricas) nos endpoints da API.
+    """
+
+    def setUp(self):
+        cache_respostas().clear()
+        registro.zerar()
+        self.client = APIClient()
+        self.modelo = Modelo.objects.create(
+            nome_marca="Fiat", nome_modelo="Uno", ano_modelo=2020
+        )
+        self.carro = criar_carros(self.modelo, 5)[0]
+
+    def relatorio(self):
+        response = self.client.get("/metricas/", HTTP_AUTHORIZATION="Bearer segredo")
+        self.assertEqual(response.status_code, 200)
+        return response.json()["endpoints"]
+
+    def test_server_timing_e_metricas_por_acao(self):
+        response = self.client.get(reverse("carro-list"))
+        self.assertRegex(
+            response["Server-Timing"],
+            r'^sql;dur=[\d.]+;desc="3 consultas", serializacao;dur=[\d.]+, total',
+        )
+
+        imagem = self.carro.imagens.last()
+        self.client.post(
+            reverse("carro-set-imagem-principal", args=[self.carro.id]),
+            {"imagem_id": imagem.id},
+            format="json",
+        )
+
+        endpoints = self.relatorio()
+        self.assertEqual(endpoints["CarroViewSet.list"]["requisicoes"], 1)
+        self.assertEqual(endpoints["CarroViewSet.list"]["consultas"]["p50"], 3)
+        self.assertIn("CarroViewSet.set_imagem_principal", endpoints)
+
+    def test_listagem_nao_consulta_durante_a_serializacao(self):
+        # Consultas durante a serialização indicam N+1 no CarroSerializer
+        self.client.get(reverse("carro-list"))
+        self.client.get(reverse("carro-detail", args=[self.carro.id]))
+
+        endpoints = self.relatorio()
+        for endpoint in ("CarroViewSet.list", "CarroViewSet.retrieve"):
+            self.assertEqual(endpoints[endpoint]["consultas_serializacao"]["max"], 0)
+            self.assertGreater(endpoints[endpoint]["tempo_serializacao_ms"]["max"], 0)
+
+    @override_settings(METRICAS_AMOSTRAGEM=0)
+    def test_requisicao_fora_da_amostragem_nao_e_medida(self):
+        response = self.client.get(reverse("carro-list"))
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(registro.relatorio(), {})
+
+    def test_relatorio_exige_token_ou_staff(self):
+        self.assertEqual(self.client.get("/metricas/").status_code, 403)
+        response = self.client.get("/metricas/", HTTP_AUTHORIZATION="Bearer errado")
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(METRICAS_AMOSTRAGEM=0)
+    def test_relatorio_traz_os_contadores_do_cache_de_respostas(self):
+        # Contados em todas as requisições, mesmo fora da amostragem
+        self.client.get(reverse("carro-list"))
+        self.client.get(reverse("carro-list"))
+
+        response = self.client.get("/metricas/", HTTP_AUTHORIZATION="Bearer segredo")
+        contadores = response.json()["contadores"]
+        self.assertEqual(contadores["cache_respostas.acertos"], 1)
+        self.assertEqual(contadores["cache_respostas.falhas"], 1)
+
+    def test_percentil_pelo_posto_mais_proximo(self):
+        valores = list(range(1, 101))
+        self.assertEqual(percentil(valores, 50), 50)
+        self.assertEqual(percentil(valores, 99), 99)
+        self.assertEqual(percentil([7], 95), 7)
+
+
+class BenchmarkTests(MediaTemporariaMixin, TestCase):
+    """
+    Testa a geração do catálogo sintético e o relatório do benchmark da API.
+    """
+
+    def test_catalogo_sintetico_com_imagem_principal(self):
+        call_command(
+            "semear_catalogo", modelos=3, carros=7, lote=3, stdout=io.StringIO()
+        )
+
+        self.assertEqual(Modelo.objects.count(), 3)
+        self.assertEqual(Carro.objects.count(), 7)
+        self.assertEqual(ImagemCarro.objects.count(), 21)
+        for carro in Carro.objects.select_related("imagem_capa"):
+            self.assertTrue(carro.imagem_capa.e_principal)
+            self.assertEqual(carro.imagem_capa.carro_id, carro.id)
+
+    def test_benchmark_emite_json_e_desfaz_as_escritas(self):
+        call_command(
+            "semear_catalogo", modelos=2, carros=5, lote=5, stdout=io.StringIO()
+        )
+        saida = os.path.join(tempfile.mkdtemp(), "benchmark.json")
+        self.addCleanup(shutil.rmtree, os.path.dirname(saida))
+
+        call_command("benchmark_api", iteracoes=2, aquecimento=0, saida=saida)
+
+        with open(saida, encoding="utf-8") as arquivo:
+            resultado = json.load(arquivo)
+        listagem = resultado["cenarios"]["listagem"]
+        self.assertEqual(set(listagem["latencia_ms"]), {"p50", "p95", "p99"})
+        self.assertEqual(listagem["consultas"]["max"], 3)
+        self.assertIn("reordenacao", resultado["cenarios"])
+        self.assertEqual(Carro.objects.count(), 5)
+
+
+class CamposListagemTests(TestCase):
+    """
+    Testa a representação compacta da listagem e o parâmetro `fields`.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.modelo = Modelo.objects.create(
+            nome_marca="Fiat",
+            nome_modelo="Uno",
+            ano_modelo=2020,
+            descricao_modelo="Hatch compacto",
+        )
+        self.carro = criar_carros(self.modelo, 2)[0]
+
+    def test_listagem_compacta_e_detalhe_completo(self):
+        item = self.client.get(reverse("carro-list")).data["results"][0]
+        self.assertEqual(
+            set(item),
+            {
+                "id",
+                "modelo",
+                "ano_fabricacao",
+                "cor",
+                "imagem_principal_miniatura_url",
+                "data_cadastro",
+            },
+        )
+        self.assertEqual(
+            set(item["modelo"]), {"id", "nome_marca", "nome_modelo", "ano_modelo"}
+        )
+        self.assertTrue(item["imagem_principal_miniatura_url"].endswith("foto_0.jpg"))
+
+        detalhe = self.client.get(reverse("carro-detail", args=[self.carro.id])).data
+        self.assertIn("descricao_carro", detalhe)
+        self.assertEqual(detalhe["modelo"]["descricao_modelo"], "Hatch compacto")
+        self.assertEqual(len(detalhe["imagens"]), 3)
+
+    def test_fields_restringe_listagem_e_detalhe(self):
+        response = self.client.get(reverse("carro-list"), {"fields": "id, cor"})
+        self.assertEqual(set(response.data["results"][0]), {"id", "cor"})
+
+        response = self.client.get(
+            reverse("carro-detail", args=[self.carro.id]),
+            {"fields": "descricao_carro"},
+        )
+        self.assertEqual(set(response.data), {"descricao_carro"})
+
+        response = self.client.get(reverse("modelo-list"), {"fields": "id,nome_marca"})
+        self.assertEqual(
+            response.data["results"],
+            [{"id": f"M{self.modelo.id:04d}", "nome_marca": "Fiat"}],
+        )
+
+    def test_campo_invalido_responde_400(self):
+        response = self.client.get(reverse("carro-list"), {"fields": "id,senha"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("senha", response.data["fields"][0])
+
+    def test_fields_ignorado_nas_escritas(self):
+        response = self.client.patch(
+            reverse("carro-detail", args=[self.carro.id]) + "?fields=id",
+            {"cor": "Azul"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["cor"], "Azul")
+        self.assertIn("imagens", response.data)
+
+
+class RemocaoArquivosTests(MediaTemporariaMixin, TestCase):
+    """
+    Testa a remoção dos arquivos de imagens excluídas ou substituídas e o comando
+    limpar_media.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.modelo = Modelo.objects.create(
+            nome_marca="Fiat", nome_modelo="Uno", ano_modelo=2020
+        )
+        self.carro = Carro.objects.create(
+            modelo=self.modelo, ano_fabricacao=2020, cor="Prata"
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.imagens = self.carro.adicionar_imagens(
+                [
+                    gerar_imagem(f"foto_{i}.jpg", cor=cor)
+                    for i, cor in enumerate(["red", "blue"])
+                ]
+            )
+
+    def existe(self, nome):
+        return default_storage.exists(nome)
+
+    def test_delete_imagem_remove_arquivo_e_derivadas_apos_commit(self):
+        imagem = self.imagens[1]
+        nome = imagem.imagem.name
+        derivada = caminho_derivada(nome, "miniatura")
+        default_storage.save(derivada, io.BytesIO(b"x"))
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            response = self.client.delete(
+                reverse("carro-delete-imagem", args=[self.carro.id]),
+                {"imagem_id": imagem.id},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200)
+        # Antes do commit o arquivo continua no storage
+        self.assertTrue(self.existe(nome))
+
+        for callback in callbacks:
+            callback()
+        self.assertFalse(self.existe(nome))
+        self.assertFalse(self.existe(derivada))
+        self.assertTrue(self.existe(self.imagens[0].imagem.name))
+
+    def test_exclusao_do_carro_remove_arquivos_da_galeria(self):
+        nomes = [imagem.imagem.name for imagem in self.imagens]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(reverse("carro-detail", args=[self.carro.id]))
+
+        self.assertEqual(response.status_code, 204)
+        for nome in nomes:
+            self.assertFalse(self.existe(nome))
+
+    def test_arquivo_compartilhado_nao_e_removido(self):
+        nome = self.imagens[1].imagem.name
+        outro = Carro.objects.create(
+            modelo=self.modelo, ano_fabricacao=2021, cor="Azul"
+        )
+        ImagemCarro.objects.create(carro=outro, imagem=nome, ordem=1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.imagens[1].delete()
+
+        self.assertTrue(self.existe(nome))
+
+    def test_substituicao_remove_arquivo_anterior(self):
+        imagem = ImagemCarro.objects.get(pk=self.imagens[0].pk)
+        anterior = imagem.imagem.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            imagem.imagem = gerar_imagem("nova.jpg", cor="green")
+            imagem.save()
+
+        self.assertFalse(self.existe(anterior))
+        self.assertTrue(self.existe(imagem.imagem.name))
+
+    def test_limpar_media_relata_e_remove_orfaos(self):
+        referenciada = self.imagens[0].imagem.name
+        diretorio = os.path.dirname(referenciada)
+        orfaos = [
+            default_storage.save(f"{diretorio}/abandonada.jpg", io.BytesIO(b"x")),
+            default_storage.save(
+                "imagens_carros/temp_carro_id/foto.jpg", io.BytesIO(b"x")
+            ),
+            default_storage.save(
+                caminho_derivada(f"{diretorio}/abandonada.jpg", "miniatura"),
+                io.BytesIO(b"x"),
+            ),
+        ]
+        derivada_valida = default_storage.save(
+            caminho_derivada(referenciada, "card"), io.BytesIO(b"x")
+        )
+
+        saida = io.StringIO()
+        call_command("limpar_media", idade_minima=0, stdout=saida)
+        self.assertIn("3 órfão(s) encontrado(s)", saida.getvalue())
+        self.assertTrue(all(self.existe(nome) for nome in orfaos))
+
+        # Arquivos recentes (uploads em andamento) são preservados
+        call_command("limpar_media", remover=True, stdout=saida)
+        self.assertTrue(all(self.existe(nome) for nome in orfaos))
+
+        call_command("limpar_media", remover=True, idade_minima=0, stdout=saida)
+        self.assertFalse(any(self.existe(nome) for nome in orfaos))
+        self.assertTrue(self.existe(referenciada))
+        self.assertTrue(self.existe(self.imagens[1].imagem.name))
+        self.assertTrue(self.existe(derivada_valida))
+
+
+class DeduplicacaoImagensTests(MediaTemporariaMixin, TestCase):
+    """
+    Testa o storage endereçado por conteúdo das imagens (arquivos compartilhados).
+    """
+
+    def setUp(self):
+        super().setUp()
+        modelo = Modelo.objects.create(
+            nome_marca="Fiat", nome_modelo="Uno", ano_modelo=2020
+        )
+        self.carros = [
+            Carro.objects.create(modelo=modelo, ano_fabricacao=2020, cor="Prata")
+            for _ in range(2)
+        ]
+
+    def adicionar(self, carro, *cores):
+        with self.captureOnCommitCallbacks(execute=True):
+            return carro.adicionar_imagens(
+                [gerar_imagem(f"foto_{cor}.jpg", cor=cor) for cor in cores]
+            )
+
+    def test_arquivos_identicos_sao_gravados_uma_vez(self):
+        (primeira,) = self.adicionar(self.carros[0], "red")
+        segunda, terceira = self.adicionar(self.carros[1], "red", "blue")
+
+        self.assertEqual(primeira.imagem.name, segunda.imagem.name)
+        self.assertNotEqual(primeira.imagem.name, terceira.imagem.name)
+        conteudo = default_storage.open(primeira.imagem.name).read()
+        self.assertEqual(
+            os.path.basename(primeira.imagem.name),
+            hashlib.sha256(conteudo).hexdigest() + ".jpg",
+        )
+        arquivos = [
+            nome
+            for _, _, nomes in os.walk(default_storage.path("imagens_carros"))
+            for nome in nomes
+        ]
+        self.assertEqual(len(arquivos), 2)
+
+    def test_upload_em_arquivo_temporario_e_movido(self):
+        conteudo = gerar_imagem(cor="green").read()
+        upload = TemporaryUploadedFile("grande.JPG", "image/jpeg", len(conteudo), None)
+        upload.write(conteudo)
+        upload.seek(0)
+
+        nome = ImagemCarro._meta.get_field("imagem").storage.save("x.JPG", upload)
+        upload.close()
+
+        self.assertEqual(
+            nome.rsplit("/", 1)[1], hashlib.sha256(conteudo).hexdigest() + ".jpg"
+        )
+        self.assertEqual(default_storage.open(nome).read(), conteudo)
+
+    def test_extensao_pelo_formato_da_imagem(self):
+        storage = ImagemCarro._meta.get_field("imagem").storage
+        png = io.BytesIO()
+        Image.new("RGB", (8, 8), "blue").save(png, "PNG")
+        nome = storage.save("foto.jpg", SimpleUploadedFile("foto.jpg", png.getvalue()))
+        self.assertTrue(nome.endswith(".png"))
+
+        # A extensão enviada pelo cliente não entra no nome (limite da coluna)
+        (imagem,) = self.carros[0].adicionar_imagens(
+            [gerar_imagem("foto." + "x" * 150)]
+        )
+        self.assertTrue(imagem.imagem.name.endswith(".jpg"))
+        self.assertLessEqual(
+            len(imagem.imagem.name), ImagemCarro._meta.get_field("imagem").max_length
+        )
+
+    def test_reaproveitamento_protegido_ate_o_commit(self):
+        (primeira,) = self.adicionar(self.carros[0], "red")
+        nome = primeira.imagem.name
+        storage = primeira.imagem.storage
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            (segunda,) = self.carros[1].adicionar_imagens([gerar_imagem(cor="red")])
+            self.assertEqual(segunda.imagem.name, nome)
+            # Uma remoção concorrente, que ainda não vê o registro novo, não apaga
+            # o arquivo reservado pelo upload
+            self.assertFalse(storage.apagar_se_ocioso(nome, lambda: False))
+            self.assertTrue(storage.exists(nome))
+            # Se o arquivo sumir mesmo assim, a reserva o recria no commit
+            os.remove(storage.path(nome))
+        for callback in callbacks:
+            callback()
+
+        conteudo = storage.open(nome).read()
+        self.assertEqual(
+            os.path.basename(nome), hashlib.sha256(conteudo).hexdigest() + ".jpg"
+        )
+        self.assertEqual(storage.reservas_pendentes(storage.path(nome)), [])
+        self.assertTrue(storage.apagar_se_ocioso(nome, lambda: False))
+        self.assertFalse(storage.exists(nome))
+
+    def test_arquivo_do_campo_legado_protegido_ate_o_commit(self):
+        (primeira,) = self.adicionar(self.carros[0], "red")
+        nome = primeira.imagem.name
+        self.carros[0].refresh_from_db()
+        self.assertEqual(self.carros[0].imagem_principal.name, nome)
+
+        # Upload concorrente que reaproveita o arquivo, ainda sem commit
+        with self.captureOnCommitCallbacks():
+            storage = primeira.imagem.storage
+            self.assertEqual(storage.save("foto.jpg", gerar_imagem(cor="red")), nome)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.carros[0].delete()
+        self.assertTrue(default_storage.exists(nome))
+
+    def test_arquivo_removido_apenas_sem_referencias(self):
+        (primeira,) = self.adicionar(self.carros[0], "red")
+        self.adicionar(self.carros[1], "red")
+        nome = primeira.imagem.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.carros[0].delete()
+        self.assertTrue(default_storage.exists(nome))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.carros[1].delete()
+        self.assertFalse(default_storage.exists(nome))
+
+    def test_versoes_derivadas_reaproveitadas(self):
+        self.adicionar(self.carros[0], "red")
+        self.adicionar(self.carros[1], "red")
+        with mock.patch(
+            "veiculos.management.commands.processar_imagens.gerar_derivadas",
+            wraps=gerar_derivadas,
+        ) as gerar:
+            call_command(
+                "processar_imagens", processos=0, uma_vez=True, stdout=io.StringIO()
+            )
+        self.assertEqual(gerar.call_count, 1)
+        self.assertEqual(
+            set(ImagemCarro.objects.values_list("status_processamento", flat=True)),
+            {"concluido"},
+        )
+
+        # Um novo upload do mesmo arquivo já nasce processado
+        (nova,) = self.adicionar(self.carros[0], "red")
+        self.assertEqual(nova.status_processamento, "concluido")
+        self.assertEqual(nova.derivadas["origem"], nova.imagem.name)
+
+
+class ListagemRapidaTests(TestCase):
+    """
+    Testa a paridade, byte a byte, da listagem lida com .values() e renderizada
+    pelo orjson com a dos serializers renderizada pelo JSONRenderer do DRF.
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        fiat = Modelo.objects.create(
+            nome_marca="Fiat",
+            nome_modelo="Uno\u2028Mille",
+            ano_modelo=2020,
+            descricao_modelo='Hatch "compacto" é econômico',
+        )
+        citroen = Modelo.objects.create(
+            nome_marca="Citroën", nome_modelo="C3", ano_modelo=2022
+        )
+        carros = criar_carros(fiat, 3) + criar_carros(citroen, 2, imagens_por_carro=0)
+
+        # Capa com miniatura gerada, capa pendente, só a imagem_principal antiga
+        # e carro sem imagem alguma
+        capa = carros[0].imagens.get(e_principal=True)
+        ImagemCarro.objects.filter(id=capa.id).update(
+            derivadas={
+                "origem": capa.imagem.name,
+                "miniatura": "imagens_carros/1/derivadas/foto_0_miniatura.webp",
+            }
+        )
+        Carro.objects.filter(id=carros[3].id).update(
+            imagem_principal="imagens_carros/antiga.jpg", cor="Azul"
+        )
+
+    def obter(self, url, params, rapida):
+        cache_respostas().clear()
+        if rapida:
+            return self.client.get(url, params)
+        with mock.patch.object(
+            CarroViewSet, "representacao_valores", None
+        ), mock.patch.object(
+            ModeloViewSet, "representacao_valores", None
+        ), mock.patch.object(
+            CarroViewSet, "renderer_classes", [JSONRenderer]
+        ), mock.patch.object(
+            ModeloViewSet, "renderer_classes", [JSONRenderer]
+        ):
+            return self.client.get(url, params)
+
+    def assertParidade(self, url, params):
+        rapida = self.obter(url, params, rapida=True)
+        serializer = self.obter(url, params, rapida=False)
+        self.assertEqual(rapida.status_code, 200)
+        self.assertEqual(rapida.content, serializer.content)
+        return json.loads(rapida.content)
+
+    def test_listagens_identicas_as_dos_serializers(self):
+        for url, params in [
+            (reverse("carro-list"), {}),
+            (reverse("carro-list"), {"page_size": 100}),
+            (reverse("carro-list"), {"page": 2, "page_size": 2}),
+            (reverse("carro-list"), {"contagem": "false"}),
+            (reverse("carro-list"), {"cor": "Azul"}),
+            (reverse("carro-list"), {"search": "Citroën"}),
+            (reverse("carro-list"), {"ordering": "-modelo__nome_marca"}),
+            (reverse("modelo-list"), {}),
+            (reverse("modelo-list"), {"paginacao": "cursor", "page_size": 1}),
+        ]:
+            with self.subTest(url=url, params=params):
+                self.assertParidade(url, params)
+
+    def test_paginacao_por_cursor_identica(self):
+        params = {"paginacao": "cursor", "page_size": 2}
+        paginas = 0
+        while params:
+            dados = self.assertParidade(reverse("carro-list"), params)
+            paginas += 1
+            params = (
+                dict(parse_qsl(urlsplit(dados["next"]).query))
+                if dados["next"]
+                else None
+            )
+        self.assertEqual(paginas, 3)
+
+    def test_urls_da_miniatura(self):
+        dados = self.assertParidade(reverse("carro-list"), {"page_size": 100})
+        urls = [item["imagem_principal_miniatura_url"] for item in dados["results"]]
+        self.assertEqual(urls.count(None), 1)
+        self.assertTrue(
+            any(url and url.endswith("foto_0_miniatura.webp") for url in urls)
+        )
+        self.assertTrue(any(url and url.endswith("antiga.jpg") for url in urls))
+        self.assertIn(b"\\u2028", self.obter(reverse("modelo-list"), {}, True).content)
+
+    def test_contagem_sem_joins(self):
+        with CaptureQueriesContext(connection) as consultas:
+            self.obter(reverse("carro-list"), {}, rapida=True)
+        contagem = [c["sql"] for c in consultas if "COUNT(" in c["sql"]]
+        self.assertEqual(len(contagem), 1)
+        self.assertNotIn("JOIN", contagem[0])
+
+    def test_fields_usa_o_serializer(self):
+        with mock.patch(
+            "veiculos.listagem_rapida.RepresentacaoCarroLista.representar"
+        ) as representar:
+            response = self.client.get(reverse("carro-list"), {"fields": "id,cor"})
+        self.assertEqual(response.status_code, 200)
+        representar.assert_not_called()
+
+    def test_renderizador_identico_ao_jsonrenderer(self):
+        dados = {
+            "texto": 'ação\u2028\u2029 "aspas" \\ \n\t\x01',
+            "data": timezone.now(),
+            "decimal": Decimal("10.50"),
+            "traduzivel": gettext_lazy("Cor"),
+            1: [None, True, False, 0, -7, (1, 2)],
+            "emoji": "🚗",
+        }
+        self.assertEqual(
+            RenderizadorJSONRapido().render(dados), JSONRenderer().render(dados)
+        )
+        self.assertEqual(
+            RenderizadorJSONRapido().render(dados, "application/json; indent=2"),
+            JSONRenderer().render(dados, "application/json; indent=2"),
+        )
+        self.assertEqual(RenderizadorJSONRapido().render(None), b"")
+
+
+class UploadStreamingTests(MediaTemporariaMixin, TestCase):
+    """
+    Testa o recebimento das imagens em disco, com os limites de tamanho e de
+    dimensões verificados durante a leitura do corpo (veiculos.uploads).
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        modelo = Modelo.objects.create(
+            nome_marca="Fiat", nome_modelo="Uno", ano_modelo=2020
+        )
+        self.carro = Carro.objects.create(
+            modelo=modelo, ano_fabricacao=2020, cor="Prata"
+        )
+        self.url = reverse("carro-upload-imagens", args=[self.carro.id])
+
+    def enviar(self, *arquivos):
+        return self.client.post(
+            self.url, {"imagens": list(arquivos)}, format="multipart"
+        )
+
+    def test_arquivos_gravados_em_disco_e_validados_pelo_cabecalho(self):
+        recebidos = []
+
+        def adicionar_imagens(carro, arquivos):
+            recebidos.extend(arquivos)
+            return []
+
+        # Blocos pequenos: o cabeçalho da imagem é lido ao longo de vários blocos
+        with mock.patch.object(
+            UploadImagensHandler, "chunk_size", 64
+        ), mock.patch.object(
+            Carro, "adicionar_imagens", autospec=True, side_effect=adicionar_imagens
+        ):
+            response = self.enviar(
+                gerar_imagem("a.jpg"), gerar_imagem("b.jpg", tamanho=(30, 20))
+            )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(recebidos), 2)
+        for arquivo in recebidos:
+            self.assertIsInstance(arquivo, TemporaryUploadedFile)
+            self.assertTrue(arquivo.imagem_validada)
+            self.assertEqual(arquivo.formato_imagem, "JPEG")
+        self.assertEqual([a.dimensoes for a in recebidos], [(64, 48), (30, 20)])
+
+    def test_envio_completo_cria_imagens(self):
+        response = self.enviar(
+            gerar_imagem("a.jpg", cor="red"), gerar_imagem("b.jpg", cor="blue")
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.carro.imagens.count(), 2)
+        for imagem in self.carro.imagens.all():
+            self.assertTrue(imagem.imagem.storage.exists(imagem.imagem.name))
+
+    @override_settings(UPLOAD_IMAGENS_MAX_BYTES_REQUISICAO=1024)
+    def test_requisicao_grande_recusada_antes_de_ler_o_corpo(self):
+        with mock.patch.object(UploadImagensHandler, "receive_data_chunk") as receber:
+            response = self.enviar(gerar_imagem(tamanho=(256, 256)))
+
+        self.assertEqual(response.status_code, 413)
+        receber.assert_not_called()
+        self.assertFalse(ImagemCarro.objects.exists())
+
+    @override_settings(UPLOAD_IMAGENS_MAX_BYTES_ARQUIVO=1024)
+    def test_arquivo_acima_do_limite(self):
+        response = self.enviar(gerar_imagem("grande.jpg", tamanho=(256, 256)))
+
+        self.assertEqual(response.status_code, 413)
+        self.assertIn("grande.jpg", response.data["detail"])
+        self.assertFalse(ImagemCarro.objects.exists())
+
+    @override_settings(UPLOAD_IMAGENS_MAX_PIXELS=1000)
+    def test_imagem_com_dimensoes_acima_do_limite(self):
+        response = self.enviar(gerar_imagem("enorme.jpg"))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("megapixels", response.data["imagens"][0])
+        self.assertFalse(ImagemCarro.objects.exists())
+
+    def test_cabecalho_invalido(self):
+        invalido = SimpleUploadedFile("texto.jpg", b"nao e imagem" * 100, "image/jpeg")
+        response = self.enviar(gerar_imagem(), invalido)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("texto.jpg", response.data["imagens"][0])
+        self.assertFalse(ImagemCarro.objects.exists())
+
+    def test_criacao_do_carro_com_imagens(self):
+        response = self.client.post(
+            reverse("carro-list"),
+            {
+                "modelo_id": self.carro.modelo_id,
+                "ano_fabricacao": 2021,
+                "cor": "Azul",
+                "imagens_para_upload": [gerar_imagem()],
+            },
+            format="multipart",
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data["imagens"]), 1)
+
+
+# URLs das leituras assíncronas (core.asgi liga API_LEITURAS_ASSINCRONAS)
+urlpatterns = [path("api/v1/", include(rotas_assincronas(router) + router.urls))]
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class LeiturasAssincronasTests(TestCase):
+    """
+    Testa as leituras assíncronas (veiculos.api_assincrona): mesma resposta das
+    views síncronas, sem passar pelos métodos list/retrieve do DRF.
+    """
+
+    CABECALHOS = ("Content-Type", "ETag", "Last-Modified", "Cache-Control", "Allow")
+
+    def setUp(self):
+        fiat = Modelo.objects.create(
+            nome_marca="Fiat", nome_modelo="Uno", ano_modelo=2020
+        )
+        vw = Modelo.objects.create(nome_marca="VW", nome_modelo="Gol", ano_modelo=2021)
+        self.carros = criar_carros(fiat, 4) + criar_carros(vw, 3, imagens_por_carro=1)
+        Carro.objects.filter(id=self.carros[0].id).update(cor="Azul")
+
+    def obter_sincrona(self, url, params=None):
+        cache_respostas().clear()
+        with override_settings(ROOT_URLCONF="core.urls"):
+            return self.client.get(url, params or {})
+
+    async def obter_assincrona(self, url, params=None, limpar_cache=True):
+        if limpar_cache:
+            await cache_respostas().aclear()
+        with mock.patch.object(
+            CarroViewSet, "list", side_effect=AssertionError
+        ), mock.patch.object(
+            CarroViewSet, "retrieve", side_effect=AssertionError
+        ), mock.patch.object(
+            ModeloViewSet, "list", side_effect=AssertionError
+        ):
+            return await self.async_client.get(url, params or {})
+
+    async def assertRespostasIguais(self, url, params=None):
+        sincrona = await sync_to_async(self.obter_sincrona)(url, params)
+        assincrona = await self.obter_assincrona(url, params)
+        self.assertEqual(assincrona.status_code, sincrona.status_code)
+        self.assertEqual(assincrona.content, sincrona.content)
+        for cabecalho in self.CABECALHOS:
+            self.assertEqual(
+                assincrona.get(cabecalho), sincrona.get(cabecalho), cabecalho
+            )
+        # Sem autenticação (a sessão não é lida), a resposta não varia por Cookie
+        self.assertIn("Accept", assincrona["Vary"])
+        return assincrona
+
+    async def test_acerto_do_cache_repete_o_vary(self):
+        url = reverse("carro-list")
+        primeira = await self.obter_assincrona(url)
+        segunda = await self.obter_assincrona(url, limpar_cache=False)
+        self.assertEqual(segunda["X-Cache"], "HIT")
+        self.assertEqual(segunda["Vary"], primeira["Vary"])
+
+    async def test_listagens_iguais_as_sincronas(self):
+        carros = reverse("carro-list")
+        for params in [
+            {},
+            {"page_size": 3, "page": 2},
+            {"page_size": 3, "contagem": "false"},
+            {"paginacao": "cursor", "page_size": 2},
+            {"cor": "Azul"},
+            {"search": "gol", "ordering": "ano_fabricacao"},
+            {"q": "uno azul"},
+            {"fields": "id,cor,imagens"},
+        ]:
+            with self.subTest(params=params):
+                await self.assertRespostasIguais(carros, params)
+        await self.assertRespostasIguais(reverse("modelo-list"))
+
+        resposta = await self.assertRespostasIguais(
+            carros, {"paginacao": "cursor", "page_size": 2}
+        )
+        cursor = dict(parse_qsl(urlsplit(resposta.json()["next"]).query))
+        await self.assertRespostasIguais(carros, cursor)
+
+    async def test_detalhe_igual_ao_sincrono(self):
+        await self.assertRespostasIguais(
+            reverse("carro-detail", args=[self.carros[0].id])
+        )
+        await self.assertRespostasIguais(reverse("carro-detail", args=[99999]))
+        await self.assertRespostasIguais(reverse("carro-detail", args=["abc"]))
+        await self.assertRespostasIguais(reverse("carro-list"), {"page": 99})
+
+    async def test_get_condicional_e_cache(self):
+        url = reverse("carro-detail", args=[self.carros[0].id])
+        primeira = await self.obter_assincrona(url)
+        self.assertEqual(primeira["X-Cache"], "MISS")
+
+        segunda = await self.obter_assincrona(url, limpar_cache=False)
+        self.assertEqual(segunda["X-Cache"], "HIT")
+        self.assertEqual(segunda.content, primeira.content)
+
+        await cache_respostas().aclear()
+        nao_modificada = await self.async_client.get(
+            url, headers={"if-none-match": primeira["ETag"]}
+        )
+        self.assertEqual(nao_modificada.status_code, 304)
+
+    async def test_api_navegavel_e_escritas_pela_view_sincrona(self):
+        resposta = await self.async_client.get(reverse("carro-list"), {"format": "api"})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertIn("text/html", resposta["Content-Type"])
+
+        modelo = await Modelo.objects.afirst()
+        resposta = await self.async_client.post(
+            reverse("carro-list"),
+            {"modelo_id": modelo.id, "ano_fabricacao": 2024, "cor": "Verde"},
+            content_type="application/json",
+        )
+        self.assertEqual(resposta.status_code, 201)
+        self.assertTrue(await Carro.objects.filter(cor="Verde").aexists())
+
+    @override_settings(METRICAS_AMOSTRAGEM=1.0)
+    async def test_metricas_no_modo_assincrono(self):
+        registro.zerar()
+        resposta = await self.obter_assincrona(reverse("carro-list"))
+
+        self.assertIn("sql;dur=", resposta["Server-Timing"])
+        medicoes = registro.relatorio()["CarroViewSet.list"]
+        self.assertEqual(medicoes["requisicoes"], 1)
+        self.assertGreater(medicoes["consultas"]["max"], 0)
+
+
+class ImportacaoInventarioTests(TestCase):
+    """
+    Testa o comando importar_inventario: resolução dos modelos pela chave
+    natural, upsert dos carros pelo id, linhas recusadas e checkpoint.
+    """
+
+    def setUp(self):
+        self.diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.diretorio)
+        self.modelo = Modelo.objects.create(
+            nome_marca="Fiat", nome_modelo="Uno", ano_modelo=2020
+        )
+
+    def gravar(self, nome, conteudo):
+        caminho = os.path.join(self.diretorio, nome)
+        with open(caminho, "w", encoding="utf-8") as arquivo:
+            arquivo.write(conteudo)
+        return caminho
+
+    def importar(self, caminho, **opcoes):
+        saida, erros = io.StringIO(), io.StringIO()
+        call_command(
+            "importar_inventario", caminho, stdout=saida, stderr=erros, **opcoes
+        )
+        return saida.getvalue(), erros.getvalue()
+
+    def test_csv_cria_modelos_e_carros_em_lotes(self):
+        linhas = ["nome_marca,nome_modelo,ano_modelo,ano_fabricacao,cor"]
+        linhas += [f"Fiat,Uno,2020,{2000 + i},Prata" for i in range(30)]
+        linhas += [f"Ford,Ka,2019,{2000 + i},Azul" for i in range(30)]
+        caminho = self.gravar("inventario.csv", "\n".join(linhas))
+
+        with CaptureQueriesContext(connection) as consultas:
+            saida, _ = self.importar(caminho, lote=20)
+
+        self.assertEqual(Modelo.objects.count(), 2)
+        self.assertEqual(self.modelo.carros_especificos.count(), 30)
+        self.assertEqual(Carro.objects.filter(modelo__nome_modelo="Ka").count(), 30)
+        # Número de consultas por lote, não por linha
+        self.assertLess(len(consultas), 40)
+        self.assertIn("60 registros", saida)
+        self.assertFalse(os.path.exists(f"{caminho}.checkpoint"))
+
+    def test_jsonl_atualiza_carro_pelo_id(self):
+        carro = Carro.objects.create(
+            modelo=self.modelo, ano_fabricacao=2020, cor="Preto"
+        )
+        registros = [
+            {
+                "id": carro.id,
+                "nome_marca": "Fiat",
+                "nome_modelo": "Uno",
+                "ano_modelo": 2020,
+                "descricao_modelo": "Compacto",
+                "ano_fabricacao": 2021,
+                "cor": "Branco",
+            },
+            {"nome_marca": "Jeep", "nome_modelo": "Renegade", "ano_modelo": 2022},
+        ]
+        caminho = self.gravar(
+            "inventario.jsonl", "\n".join(json.dumps(r) for r in registros)
+        )
+
+        self.importar(caminho)
+
+        carro.refresh_from_db()
+        self.assertEqual((carro.ano_fabricacao, carro.cor), (2021, "Branco"))
+        self.assertEqual(Carro.objects.count(), 1)
+        self.modelo.refresh_from_db()
+        self.assertEqual(self.modelo.descricao_modelo, "Compacto")
+        self.assertTrue(Modelo.objects.filter(nome_modelo="Renegade").exists())
+
+    def test_id_inexistente_recusado_sem_criar_carro(self):
+        carro = Carro.objects.create(
+            modelo=self.modelo, ano_fabricacao=2020, cor="Preto"
+        )
+        caminho = self.gravar(
+            "inventario.csv",
+            "id,nome_marca,nome_modelo,ano_modelo,ano_fabricacao,cor\n"
+            f"{carro.id + 100},Fiat,Uno,2020,2021,Prata\n"
+            f"{carro.id},Fiat,Uno,2020,2022,Azul\n",
+        )
+
+        saida, erros = self.importar(caminho)
+
+        self.assertIn("carro não encontrado", erros)
+        self.assertIn("1 linha(s) recusada(s)", saida)
+        self.assertEqual(
+            list(Carro.objects.values_list("id", "cor")), [(carro.id, "Azul")]
+        )
+
+    def test_linhas_invalidas_sao_recusadas(self):
+        caminho = self.gravar(
+            "inventario.csv",
+            "nome_marca,nome_modelo,ano_modelo,ano_fabricacao,cor\n"
+            "Fiat,Uno,2020,dois mil,Prata\n"
+            "Fiat,,2020,2020,Prata\n"
+            "Fiat,Uno,2020,2020,Prata\n",
+        )
+        rejeitados = os.path.join(self.diretorio, "rejeitados.jsonl")
+
+        saida, _ = self.importar(caminho, rejeitados=rejeitados)
+
+        self.assertEqual(Carro.objects.count(), 1)
+        self.assertIn("2 linha(s) recusada(s)", saida)
+        with open(rejeitados, encoding="utf-8") as arquivo:
+            recusas = [json.loads(linha) for linha in arquivo]
+        self.assertEqual([recusa["linha"] for recusa in recusas], [2, 3])
+        self.assertIn("ano_fabricacao", recusas[0]["motivo"])
+
+    def test_retoma_do_checkpoint(self):
+        linhas = ["nome_marca,nome_modelo,ano_modelo,ano_fabricacao,cor"]
+        linhas += [f"Fiat,Uno,2020,{2000 + i},Prata" for i in range(10)]
+        caminho = self.gravar("inventario.csv", "\n".join(linhas))
+
+        # Interrompe a importação depois do segundo lote
+        gravar_lote = Command.gravar_lote
+        lotes = []
+
+        def interromper(comando, lote):
+            if len(lotes) == 2:
+                raise KeyboardInterrupt
+            lotes.append(lote)
+            gravar_lote(comando, lote)
+
+        with mock.patch.object(Command, "gravar_lote", interromper):
+            with self.assertRaises(KeyboardInterrupt):
+                self.importar(caminho, lote=3)
+        self.assertEqual(Carro.objects.count(), 6)
+
+        saida, _ = self.importar(caminho, lote=3)
+
+        self.assertIn("Retomando após 6 registro(s)", saida)
+        self.assertEqual(Carro.objects.count(), 10)
+        self.assertEqual(
+            sorted(Carro.objects.values_list("ano_fabricacao", flat=True)),
+            list(range(2000, 2010)),
+        )
+
+        # O checkpoint de outra versão do arquivo não é usado
+        with open(f"{caminho}.checkpoint", "w", encoding="utf-8") as arquivo:
+            json.dump({"origem": None, "situacao": {}}, arquivo)
+        with self.assertRaises(CommandError):
+            self.importar(caminho)
+
+    def test_indice_da_busca_atualizado_ao_final(self):
+        linhas = ["nome_marca,nome_modelo,ano_modelo,ano_fabricacao,cor"]
+        linhas += [f"Fiat,Uno,2020,{2000 + i},Prata" for i in range(10)]
+        caminho = self.gravar("inventario.csv", "\n".join(linhas))
+
+        # Interrompida depois do primeiro lote, a importação retomada sem a opção
+        # ainda atualiza o índice ao final, inclusive dos carros do primeiro lote
+        gravar_lote = Command.gravar_lote
+
+        def interromper(comando, lote):
+            if Carro.objects.exists():
+                raise KeyboardInterrupt
+            gravar_lote(comando, lote)
+
+        with mock.patch.object(Command, "gravar_lote", interromper):
+            with self.assertRaises(KeyboardInterrupt):
+                self.importar(caminho, lote=4, indice_ao_final=True)
+        self.assertEqual(Carro.objects.count(), 4)
+        self.assertFalse(TermoBusca.objects.exists())
+
+        with mock.patch(
+            "veiculos.management.commands.importar_inventario.indexar_carros"
+        ) as indexar_por_lote:
+            saida, _ = self.importar(caminho, lote=4)
+
+        indexar_por_lote.assert_not_called()
+        self.assertIn("Índice da busca atualizado", saida)
+        self.assertEqual(
+            TermoBusca.objects.filter(termo="prata").count(), Carro.objects.count()
+        )
+        self.assertEqual(Carro.objects.count(), 10)
+
+
+class ExportacaoTests(TestCase):
+    """
+    Testa a exportação do catálogo em streaming (CSV e JSON lines).
+    """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.modelo = Modelo.objects.create(
+            nome_marca="Fiat", nome_modelo="Uno", ano_modelo=2020
+        )
+        self.carros = criar_carros(self.modelo, 5, imagens_por_carro=2)
+        self.carros[0].cor = "Azul"
+        self.carros[0].save()
+        self.url = reverse("carro-exportar")
+
+    def conteudo(self, resposta):
+        self.assertTrue(resposta.streaming)
+        return b"".join(resposta.streaming_content)
+
+    def test_csv_com_todos_os_carros_e_imagens(self):
+        resposta = self.client.get(self.url, HTTP_ACCEPT="text/csv")
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta["Content-Type"], "text/csv; charset=utf-8")
+        self.assertIn("carros.csv", resposta["Content-Disposition"])
+        linhas = list(csv.DictReader(io.StringIO(self.conteudo(resposta).decode())))
+        self.assertEqual(len(linhas), 5)
+        primeira = next(
+            linha for linha in linhas if linha["id"] == str(self.carros[0].id)
+        )
+        self.assertEqual(primeira["nome_modelo"], "Uno")
+        imagens = primeira["imagens"].split(" ")
+        self.assertEqual(len(imagens), 2)
+        self.assertEqual(
+            imagens[0],
+            "http://testserver" + self.carros[0].imagens.first().imagem.url,
+        )
+
+    def test_jsonl_com_filtros_da_listagem(self):
+        resposta = self.client.get(self.url, {"formato": "jsonl", "cor": "Azul"})
+
+        registros = [
+            json.loads(linha) for linha in self.conteudo(resposta).splitlines()
+        ]
+        self.assertEqual(
+            [registro["id"] for registro in registros], [self.carros[0].id]
+        )
+        self.assertEqual(registros[0]["cor"], "Azul")
+        self.assertEqual(len(registros[0]["imagens"]), 2)
+
+    def test_consultas_por_lote(self):
+        with mock.patch.object(ExportacaoCarros, "tamanho_lote", 2):
+            with CaptureQueriesContext(connection) as consultas:
+                resposta = self.client.get(self.url, {"formato": "jsonl"})
+                self.assertEqual(len(self.conteudo(resposta).splitlines()), 5)
+
+        # Uma consulta das imagens para cada lote de 2 carros, além da dos carros
+        imagens = [c for c in consultas if "veiculos_imagemcarro" in c["sql"]]
+        self.assertEqual(len(imagens), 3)
+
+    def test_lotes_lidos_por_keyset(self):
+        with mock.patch.object(ExportacaoCarros, "tamanho_lote", 2):
+            with CaptureQueriesContext(connection) as consultas:
+                resposta = self.client.get(self.url, {"formato": "jsonl"})
+                registros = self.conteudo(resposta).splitlines()
+
+        self.assertEqual(
+            [json.loads(registro)["id"] for registro in registros],
+            sorted(carro.id for carro in self.carros),
+        )
+        # Uma consulta limitada por lote (sem um cursor aberto por toda a
+        # exportação), a partir do último id do lote anterior, e uma vazia no fim
+        carros = [
+            c["sql"]
+            for c in consultas
+            if c["sql"].startswith("SELECT") and 'FROM "veiculos_carro"' in c["sql"]
+        ]
+        self.assertEqual(len(carros), 4)
+        ids = sorted(carro.id for carro in self.carros)
+        for sql, ultimo in zip(carros, [0, ids[1], ids[3], ids[4]]):
+            self.assertIn(f'"veiculos_carro"."id" > {ultimo}', sql)
+            # O id é a primeira coluna do SELECT (ORDER BY 1)
+            self.assertTrue(sql.startswith('SELECT "veiculos_carro"."id"'))
+            self.assertTrue(sql.endswith("ORDER BY 1 ASC LIMIT 2"))
+
+    def test_gzip_e_formato_invalido(self):
+        resposta = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip, br")
+
+        self.assertEqual(resposta["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", resposta["Vary"])
+        texto = gzip.decompress(self.conteudo(resposta)).decode()
+        self.assertEqual(len(texto.splitlines()), 6)
+
+        resposta = self.client.get(self.url, {"formato": "xml"})
+        self.assertEqual(resposta.status_code, 400)
+
+    async def test_streaming_sob_asgi(self):
+        resposta = await self.async_client.get(self.url, {"formato": "jsonl"})
+
+        self.assertTrue(resposta.is_async)
+        partes = [parte async for parte in resposta.streaming_content]
+        self.assertEqual(len(b"".join(partes).splitlines()), 5)
+
+
+class FacetasTests(TestCase):
+    """
+    Testa a contagem de carros por faceta, com filtros, cache e invalidação.
+    """
+
+    def setUp(self):
+        cache_respostas().clear()
+        self.client = APIClient()
+        uno = Modelo.objects.create(
+            nome_marca="Fiat", nome_modelo="Uno", ano_modelo=2020
+        )
+        uno_novo = Modelo.objects.create(
+            nome_marca="Fiat", nome_modelo="Uno", ano_modelo=2021
+        )
+        self.ka = Modelo.objects.create(
+            nome_marca="Ford", nome_modelo="Ka", ano_modelo=2020
+        )
+        for modelo, cor, ano in [
+            (uno, "Prata", 2020),
+            (uno_novo, "Prata", 2021),
+            (uno_novo, "Azul", 2021),
+            (self.ka, "Prata", 2019),
+        ]:
+            Carro.objects.create(modelo=modelo, cor=cor, ano_fabricacao=ano)
+        self.url = reverse("carro-facetas")
+
+    def test_contagens_por_faceta(self):
+        with self.assertNumQueries(5):
+            resposta = self.client.get(self.url)
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.data["total"], 4)
+        facetas = resposta.data["facetas"]
+        self.assertEqual(
+            facetas["modelo__nome_marca"],
+            [{"valor": "Fiat", "quantidade": 3}, {"valor": "Ford", "quantidade": 1}],
+        )
+        self.assertEqual(
+            facetas["modelo__nome_modelo"][0], {"valor": "Uno", "quantidade": 3}
+        )
+        self.assertEqual(facetas["cor"][0], {"valor": "Prata", "quantidade": 3})
+        self.assertEqual(facetas["ano_fabricacao"][0], {"valor": 2021, "quantidade": 2})
+
+    def test_respeita_filtros_e_limite(self):
+        resposta = self.client.get(self.url, {"cor": "Prata", "limite": 1})
+
+        self.assertEqual(resposta.data["total"], 3)
+        self.assertEqual(
+            resposta.data["facetas"]["modelo__nome_marca"],
+            [{"valor": "Fiat", "quantidade": 2}],
+        )
+        self.assertEqual(self.client.get(self.url, {"limite": 0}).status_code, 400)
+
+    def test_cache_invalidado_por_escritas_em_carros_e_modelos(self):
+        primeira = self.client.get(self.url)
+        with self.assertNumQueries(1):
+            segunda = self.client.get(self.url, HTTP_IF_NONE_MATCH=primeira["ETag"])
+        self.assertEqual(segunda.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Carro.objects.create(modelo=self.ka, cor="Preto", ano_fabricacao=2022)
+        resposta = self.client.get(self.url)
+        self.assertEqual(resposta["X-Cache"], "MISS")
+        self.assertEqual(resposta.data["total"], 5)
+
+        self.ka.nome_marca = "Ford Brasil"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ka.save()
+        resposta = self.client.get(self.url)
+        self.assertEqual(resposta["X-Cache"], "MISS")
+        self.assertIn(
+            {"valor": "Ford Brasil", "quantidade": 2},
+            resposta.data["facetas"]["modelo__nome_marca"],
+        )
+
+
+class BuscaTextualTests(TestCase):
+    """
+    Testa a busca textual indexada (?q=): tokenização, prefixos, relevância e a
+    manutenção do índice nas escritas.
+    """
+
+    def setUp(self):
+        cache_respostas().clear()
+        self.client = APIClient()
+        self.url = reverse("carro-list")
+        self.uno = Modelo.objects.create(
+            nome_marca="Fiat",
+            nome_modelo="Uno",
+            ano_modelo=2020,
+            descricao_modelo="Hatch econômico",
+        )
+        self.ka = Modelo.objects.create(
+            nome_marca="Ford", nome_modelo="Ka", ano_modelo=2020
+        )
+        self.prata = Carro.objects.create(
+            modelo=self.uno,
+            ano_fabricacao=2020,
+            cor="Prata",
+            descricao_carro="Câmbio automático, único dono",
+        )
+        self.azul = Carro.objects.create(
+            modelo=self.ka,
+            ano_fabricacao=2019,
+            cor="Azul",
+            descricao_carro="Troca por um Fiat",
+        )
+
+    def buscar(self, termo, **params):
+        resposta = self.client.get(self.url, {"q": termo, **params})
+        self.assertEqual(resposta.status_code, 200)
+        return [int(carro["id"]) for carro in resposta.data["results"]]
+
+    def test_tokenizacao(self):
+        self.assertEqual(
+            tokenizar("Câmbio AUTOMÁTICO, de 2 portas e com ar"),
+            ("cambio", "automatico", "2", "portas", "ar"),
+        )
+
+    def test_sem_acentos_por_prefixo_e_com_todos_os_termos(self):
+        self.assertEqual(self.buscar("cambio automatico"), [self.prata.id])
+        self.assertEqual(self.buscar("ÚNIC"), [self.prata.id])
+        self.assertEqual(self.buscar("econ prata"), [self.prata.id])
+        self.assertEqual(self.buscar("fiat azul"), [self.azul.id])
+        self.assertEqual(self.buscar("uno azul"), [])
+        # Apenas palavras vazias: nenhum resultado
+        self.assertEqual(self.buscar("de com"), [])
+
+    def test_ordena_pela_relevancia_sem_ordering(self):
+        # A marca pesa mais que a descrição
+        self.assertEqual(self.buscar("fiat"), [self.prata.id, self.azul.id])
+        self.assertEqual(
+            self.buscar("fiat", ordering="ano_fabricacao"),
+            [self.azul.id, self.prata.id],
+        )
+
+    def test_indice_atualizado_nas_escritas(self):
+        self.ka.nome_marca = "Volkswagen"
+        self.ka.save()
+        self.assertEqual(self.buscar("volks"), [self.azul.id])
+
+        self.prata.descricao_carro = "Teto solar"
+        self.prata.save()
+        self.assertEqual(self.buscar("automatico"), [])
+        self.assertEqual(self.buscar("teto"), [self.prata.id])
+
+        self.azul.delete()
+        self.assertFalse(TermoBusca.objects.filter(carro_id=self.azul.id).exists())
+
+    def test_cargas_em_lote_e_reconstrucao(self):
+        diretorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, diretorio)
+        caminho = os.path.join(diretorio, "inventario.csv")
+        with open(caminho, "w", encoding="utf-8") as arquivo:
+            arquivo.write(
+                "nome_marca,nome_modelo,ano_modelo,ano_fabricacao,cor,descricao_carro\n"
+                "Fiat,Uno,2020,2021,Verde,Blindado\n"
+            )
+        call_command("importar_inventario", caminho, stdout=io.StringIO())
+        self.assertEqual(len(self.buscar("blindado uno")), 1)
+
+        TermoBusca.objects.all().delete()
+        call_command("indexar_busca", stdout=io.StringIO())
+        self.assertEqual(len(self.buscar("blindado")), 1)
+        self.assertEqual(self.buscar("cambio"), [self.prata.id])
+
+
+class AutocompletarModelosTests(TestCase):
+    """
+    Testa as sugestões de modelos por prefixo da marca ou do nome.
+    """
+
+    def setUp(self):
+        cache_respostas().clear()
+        self.client = APIClient()
+        self.url = reverse("modelo-autocompletar")
+        for marca, nome, ano in [
+            ("Fiat", "Uno", 2020),
+            ("Fiat", "Uno", 2022),
+            ("Fiat", "Toro", 2021),
+            ("Land Rover", "Defender", 2023),
+            ("Ford", "Fiesta", 2015),
+        ]:
+            Modelo.objects.create(nome_marca=marca, nome_modelo=nome, ano_modelo=ano)
+
+    def sugerir(self, texto, **params):
+        resposta = self.client.get(self.url, {"q": texto, **params})
+        self.assertEqual(resposta.status_code, 200)
+        return [
+            f"{modelo['nome_marca']} {modelo['nome_modelo']} {modelo['ano_modelo']}"
+            for modelo in resposta.data
+        ]
+
+    def test_prefixo_da_marca_ou_do_nome(self):
+        self.assertEqual(
+            self.sugerir("fi"),
+            ["Fiat Toro 2021", "Fiat Uno 2022", "Fiat Uno 2020", "Ford Fiesta 2015"],
+        )
+        self.assertEqual(self.sugerir("  fiat   u "), ["Fiat Uno 2022", "Fiat Uno 2020"])
+        self.assertEqual(self.sugerir("land rover d"), ["Land Rover Defender 2023"])
+        self.assertEqual(self.sugerir("fi", limite=1), ["Fiat Toro 2021"])
+        self.assertEqual(self.sugerir("uno fiat"), [])
+
+    def test_resposta_minima(self):
+        resposta = self.client.get(self.url, {"q": "toro"})
+
+        modelo = Modelo.objects.get(nome_modelo="Toro")
+        self.assertEqual(
+            resposta.data,
+            [
+                {
+                    "id": f"M{modelo.id:04d}",
+                    "nome_marca": "Fiat",
+                    "nome_modelo": "Toro",
+                    "ano_modelo": 2021,
+                }
+            ],
+        )
+
+    def test_parametros_invalidos(self):
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"q": " "}).status_code, 400)
+        resposta = self.client.get(self.url, {"q": "fi", "limite": 51})
+        self.assertEqual(resposta.status_code, 400)
+
+    def test_texto_limitado_em_tamanho_e_palavras(self):
+        # Cada palavra acrescenta uma condição ao filtro: sem o limite, um texto
+        # longo estoura o tamanho máximo da consulta no banco
+        self.assertEqual(self.sugerir("land rover defender 90 2 portas"), [])
+        for texto in ("a " * 2000, "x" * 101, "a b c d e f g"):
+            with self.subTest(texto=texto[:20]):
+                resposta = self.client.get(self.url, {"q": texto})
+                self.assertEqual(resposta.status_code, 400)
+
+    def test_cache_invalidado_por_escritas_em_modelos(self):
+        self.client.get(self.url, {"q": "fi"})
+        with self.assertNumQueries(1):
+            self.client.get(self.url, {"q": "fi"})
+
+        # A versão da tabela é incrementada após o commit
+        with self.captureOnCommitCallbacks(execute=True):
+            Modelo.objects.create(
+                nome_marca="Fiat", nome_modelo="Argo", ano_modelo=2024
+            )
+        self.assertIn("Fiat Argo 2024", self.sugerir("fi"))
+
+
+class GravacaoLoteTests(TestCase):
+    """
+    Testa a gravação em lote de carros: validação dos modelos em uma consulta,
+    criação e atualização em massa e resultado por item com falhas parciais.
+    """
+
+    def setUp(self):
+        cache_respostas().clear()
+        self.client = APIClient()
+        self.url = reverse("carro-lote")
+        self.uno = Modelo.objects.create(
+            nome_marca="Fiat", nome_modelo="Uno", ano_modelo=2020
+        )
+        self.ka = Modelo.objects.create(
+            nome_marca="Ford", nome_modelo="Ka", ano_modelo=2020
+        )
+        self.carro = Carro.objects.create(
+            modelo=self.uno, ano_fabricacao=2019, cor="Prata", descricao_carro="Único"
+        )
+
+    def enviar(self, itens):
+        return self.client.post(self.url, itens, format="json")
+
+    def novos(self, quantidade):
+        return [
+            {"modelo_id": modelo.id, "ano_fabricacao": 2000 + i, "cor": "Azul"}
+            for i in range(quantidade)
+            for modelo in (self.uno, self.ka)
+        ]
+
+    def test_consultas_nao_dependem_da_quantidade_de_itens(self):
+        with CaptureQueriesContext(connection) as poucos:
+            self.assertEqual(self.enviar(self.novos(2)).status_code, 200)
+        with CaptureQueriesContext(connection) as muitos:
+            resposta = self.enviar(self.novos(50))
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.data["criados"], 100)
+        self.assertEqual(len(muitos), len(poucos))
+        self.assertEqual(Carro.objects.count(), 105)
+
+    def test_cria_e_atualiza_apenas_os_campos_enviados(self):
+        antes = self.carro.atualizado_em
+        resposta = self.enviar(
+            [
+                {"id": f"{self.carro.id:04d}", "cor": "Vermelho"},
+                {"modelo_id": self.ka.id, "ano_fabricacao": 2021, "cor": "Preto"},
+            ]
+        )
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.data["atualizados"], 1)
+        novo = Carro.objects.get(modelo=self.ka)
+        self.assertEqual(
+            resposta.data["resultados"],
+            [
+                {"indice": 0, "status": "atualizado", "id": f"{self.carro.id:04d}"},
+                {"indice": 1, "status": "criado", "id": f"{novo.id:04d}"},
+            ],
+        )
+        self.carro.refresh_from_db()
+        self.assertEqual(self.carro.cor, "Vermelho")
+        self.assertEqual(self.carro.descricao_carro, "Único")
+        self.assertGreater(self.carro.atualizado_em, antes)
+        # Índice da busca e cache atualizados, sem os sinais do save
+        busca = self.client.get(reverse("carro-list"), {"q": "vermelho"})
+        self.assertEqual(busca.data["count"], 1)
+
+    def test_falhas_parciais(self):
+        resposta = self.enviar(
+            [
+                {"modelo_id": self.uno.id, "ano_fabricacao": 2020, "cor": "Azul"},
+                {"modelo_id": 9999, "ano_fabricacao": 2020, "cor": "Azul"},
+                {"id": 9999, "cor": "Azul"},
+                {"modelo_id": self.uno.id, "cor": "Azul"},
+                {"id": self.carro.id, "ano_fabricacao": -1},
+                {"id": self.carro.id, "cor": "Verde"},
+                {"id": self.carro.id, "cor": "Branco"},
+                "carro",
+            ]
+        )
+
+        self.assertEqual(resposta.status_code, 207)
+        self.assertEqual(
+            (resposta.data["criados"], resposta.data["atualizados"]), (1, 1)
+        )
+        self.assertEqual(resposta.data["erros"], 6)
+        status_itens = [item["status"] for item in resposta.data["resultados"]]
+        self.assertEqual(
+            status_itens,
+            ["criado", "erro", "erro", "erro", "erro", "atualizado", "erro", "erro"],
+        )
+        erros = [item.get("erros") for item in resposta.data["resultados"]]
+        self.assertIn("modelo_id", erros[1])
+        self.assertIn("id", erros[2])
+        self.assertIn("ano_fabricacao", erros[3])
+        self.assertIn("ano_fabricacao", erros[4])
+        self.assertIn("id", erros[6])
+        self.carro.refresh_from_db()
+        self.assertEqual(self.carro.cor, "Verde")
+
+    @mock.patch.object(
+        type(connection.features), "can_return_rows_from_bulk_insert", False
+    )
+    def test_banco_sem_chaves_no_bulk_create(self):
+        # Como no MySQL: os ids são relidos após o INSERT, sem um save por carro
+        with CaptureQueriesContext(connection) as poucos:
+            self.assertEqual(self.enviar(self.novos(2)).status_code, 200)
+        Carro.objects.create(modelo=self.uno, ano_fabricacao=2000, cor="Azul")
+        itens = self.novos(50)
+        itens[7]["cor"] = "Amarelo"
+        with CaptureQueriesContext(connection) as muitos:
+            resposta = self.enviar(itens)
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(len(muitos), len(poucos))
+        ids = [int(item["id"]) for item in resposta.data["resultados"]]
+        self.assertEqual(
+            list(
+                Carro.objects.filter(id__in=ids)
+                .order_by("id")
+                .values("modelo_id", "ano_fabricacao", "cor")
+            ),
+            [
+                {campo: item[campo] for campo in ("modelo_id", "ano_fabricacao", "cor")}
+                for item in itens
+            ],
+        )
+        # Os carros criados entram no índice da busca e invalidam o cache
+        busca = self.client.get(reverse("carro-list"), {"q": "amarelo"})
+        self.assertEqual(
+            [int(carro["id"]) for carro in busca.data["results"]], [ids[7]]
+        )
+
+    def test_corpo_invalido(self):
+        self.assertEqual(self.enviar([]).status_code, 400)
+        self.assertEqual(self.enviar({"cor": "Azul"}).status_code, 400)
+        with mock.patch("veiculos.api_views.LIMITE_LOTE", 3):
+            self.assertEqual(self.enviar(self.novos(2)).status_code, 400)
+
+
+@tag("lento")
+@unittest.skipUnless(
+    connection.vendor in ("sqlite", "mysql"),
+    "Leitura do plano de execução implementada apenas para SQLite e MySQL",
+)
+class FiltrosIndexadosTests(TestCase):
+    """
+    Verifica, pelo plano de execução, que os filtros da listagem de carros
+    usam índices em vez de varrer a tabela inteira.
+    """
+
+    QUANTIDADE_CARROS = 100_000
+    CORES = ["Preto", "Branco", "Prata", "Vermelho", "Azul", "Cinza"]
+
+    @classmethod
+    def setUpTestData(cls):
+        modelos = Modelo.objects.bulk_create(
+            Modelo(
+                nome_marca=f"Marca {i % 50}",
+                nome_modelo=f"Modelo {i}",
+                ano_modelo=2000 + i % 25,
+            )
+            for i in range(500)
+        )
+        Carro.objects.bulk_create(
+            (
+                Carro(
+                    modelo=modelos[i % len(modelos)],
+                    ano_fabricacao=2000 + i % 25,
+                    cor=cls.CORES[i % len(cls.CORES)],
+                )
+                for i in range(cls.QUANTIDADE_CARROS)
+            ),
+            batch_size=5000,
+        )
+
+    def plano_da_listagem(self, params):
+        """Aplica os filter_backends do CarroViewSet e retorna o EXPLAIN da consulta."""
+        request = Request(APIRequestFactory().get("/", params))
+        view = CarroViewSet(request=request, format_kwarg=None, action="list")
+        return view.filter_queryset(view.get_queryset()).explain()
+
+    def assertSemVarreduraCompleta(self, plano, tabela="veiculos_carro"):
+        if connection.vendor == "sqlite":
+            # "SCAN tabela" sem "USING ... INDEX" indica leitura de todas as linhas
+            varredura = re.search(rf"SCAN {tabela}(?! USING (COVERING )?INDEX)", plano)
+        else:
+            # No EXPLAIN tabular do MySQL, type=ALL indica full table scan
+            varredura = re.search(rf"\b{tabela}\b.*\bALL\b", plano)
+        self.assertIsNone(varredura, f"Varredura completa em {tabela}:\n{plano}")
+
+    def test_filtros_da_listagem_usam_indices(self):
+        for params in [
+            {"cor": "Prata"},
+            {"ano_fabricacao": 2010},
+            {"modelo__nome_marca": "Marca 3"},
+            {"modelo__nome_modelo": "Modelo 7"},
+            {"modelo__nome_marca": "Marca 3", "modelo__nome_modelo": "Modelo 3"},
+            {"ordering": "data_cadastro"},
+        ]:
+            with self.subTest(params=params):
+                plano = self.plano_da_listagem(params)
+                self.assertSemVarreduraCompleta(plano)
+                self.assertSemVarreduraCompleta(plano, "veiculos_modelo")
+
+    def test_filtro_retorna_apenas_carros_correspondentes(self):
+        response = APIClient().get(
+            reverse("carro-list"), {"cor": "Prata", "ano_fabricacao": 2002}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data["results"])
+        for item in response.data["results"]:
+            self.assertEqual((item["cor"], item["ano_fabricacao"]), ("Prata", 2002))
@@ -0,0 +1,143 @@
+import io
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+"""
+Módulo: uploads
+---------------
+Recebimento das imagens de veículos sem manter os arquivos na memória:
+1. UploadImagensHandler: upload handler que grava cada arquivo do multipart
+   direto em um arquivo temporário, à medida que os blocos chegam. Recusa a
+   requisição pelo Content-Length antes de ler o corpo, interrompe a leitura
+   assim que um arquivo (ou a soma deles) passa do limite e valida o formato e
+   as dimensões pelo cabeçalho da imagem, nos primeiros blocos recebidos.
+2. UploadStreamingMixin: instala o handler nas escritas de um viewset.
+
+Os limites são configurados em core.settings (UPLOAD_IMAGENS_*).
+"""
+
+# Bytes iniciais de um arquivo em que o cabeçalho da imagem deve ser encontrado
+LIMITE_CABECALHO = 512 * 1024
+
+
+class UploadMuitoGrande(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = "O envio excede o tamanho máximo permitido."
+    default_code = "upload_muito_grande"
+
+
+def _megabytes(quantidade):
+    return f"{quantidade / 1024 / 1024:.0f} MB"
+
+
+class UploadImagensHandler(TemporaryFileUploadHandler):
+    """
+    Cada arquivo recebido é marcado com `imagem_validada`, `formato_imagem` e
+    `dimensoes`, e o serializer (ImagemEnviadaField) não precisa reabri-lo.
+    """
+
+    def handle_raw_input(
+        self, input_data, META, content_length, boundary, encoding=None
+    ):
+        self.max_arquivo = settings.UPLOAD_IMAGENS_MAX_BYTES_ARQUIVO
+        self.max_requisicao = settings.UPLOAD_IMAGENS_MAX_BYTES_REQUISICAO
+        self.max_pixels = settings.UPLOAD_IMAGENS_MAX_PIXELS
+        self.recebidos_requisicao = 0
+        if content_length > self.max_requisicao:
+            raise UploadMuitoGrande(
+                f"A requisição tem {_megabytes(content_length)}; o máximo é "
+                f"{_megabytes(self.max_requisicao)}."
+            )
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        self.recebidos_arquivo = 0
+        self.cabecalho = bytearray()
+        self.imagem = None
+
+    def receive_data_chunk(self, raw_data, start):
+        self.recebidos_arquivo += len(raw_data)
+        self.recebidos_requisicao += len(raw_data)
+        if self.recebidos_arquivo > self.max_arquivo:
+            self.recusar(
+                UploadMuitoGrande(
+                    f"O arquivo {self.file_name} excede o máximo de "
+                    f"{_megabytes(self.max_arquivo)}."
+                )
+            )
+        if self.recebidos_requisicao > self.max_requisicao:
+            self.recusar(
+                UploadMuitoGrande(
+                    f"Os arquivos excedem o máximo de "
+                    f"{_megabytes(self.max_requisicao)} por requisição."
+                )
+            )
+
+        if self.imagem is None:
+            self.cabecalho += raw_data
+            self.ler_cabecalho(final=len(self.cabecalho) >= LIMITE_CABECALHO)
+
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        if self.imagem is None:
+            self.ler_cabecalho(final=True)
+        arquivo = super().file_complete(file_size)
+        arquivo.imagem_validada = True
+        arquivo.formato_imagem, arquivo.dimensoes = self.imagem
+        return arquivo
+
+    def ler_cabecalho(self, final):
+        """
+        Identifica o formato e as dimensões pelos bytes recebidos até agora, sem
+        decodificar os pixels. Enquanto o cabeçalho estiver incompleto, aguarda
+        mais blocos, até `final`.
+        """
+        try:
+            with Image.open(io.BytesIO(self.cabecalho)) as imagem:
+                formato, dimensoes = imagem.format, imagem.size
+        except Image.DecompressionBombError:
+            formato, dimensoes = None, (self.max_pixels, self.max_pixels)
+        except Exception:
+            if final:
+                self.recusar_imagem(
+                    "Envie uma imagem válida. O arquivo enviado não é uma imagem "
+                    "ou está corrompido."
+                )
+            return
+
+        largura, altura = dimensoes
+        if largura * altura > self.max_pixels:
+            self.recusar_imagem(
+                f"A imagem excede o máximo de {self.max_pixels / 1_000_000:.0f} "
+                f"megapixels."
+            )
+        self.imagem = (formato, dimensoes)
+        self.cabecalho = None
+
+    def recusar_imagem(self, mensagem):
+        self.recusar(
+            ValidationError({self.field_name: [f"{self.file_name}: {mensagem}"]})
+        )
+
+    def recusar(self, erro):
+        # Descarta o arquivo temporário antes de interromper a leitura do corpo
+        self.file.close()
+        raise erro
+
+
+class UploadStreamingMixin:
+    """
+    Mixin para viewsets: nas escritas, os arquivos do multipart são recebidos
+    pelo UploadImagensHandler em vez dos handlers padrão do Django (que mantêm
+    em memória arquivos de até FILE_UPLOAD_MAX_MEMORY_SIZE).
+    """
+
+    def initialize_request(self, request, *args, **kwargs):
+        if request.method in ("POST", "PUT", "PATCH"):
+            request.upload_handlers = [UploadImagensHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
@@ -13,9 +13,17 @@ const apiClient = axios.create({
 });
 
 export default {
-  // Método para buscar todos os carros do endpoint /veiculos/carros/
-  getCarros() {
-    return apiClient.get("carros/");
+  // Método para buscar os carros do endpoint /veiculos/carros/
+  // params aceita os filtros do backend (cor, ano_fabricacao, modelo__nome_marca,
+  // modelo__nome_modelo), além de search e ordering
+  getCarros(params = {}) {
+    return apiClient.get("carros/", { params });
+  },
+
+  // Método para buscar a contagem de carros por marca, modelo, cor e ano de
+  // fabricação, com os mesmos filtros de getCarros (e limite por faceta)
+  getFacetas(params = {}) {
+    return apiClient.get("carros/facetas/", { params });
   },
 
   // Método para buscar um carro específico pelo ID do endpoint /veiculos/carros/{id}/
@@ -53,11 +61,25 @@ export default {
     return formClient.post("carros/", formData);
   },
 
+  // Método para criar (itens sem id) e atualizar (itens com id) vários carros
+  // em uma única requisição; a resposta traz o resultado de cada item
+  gravarCarrosEmLote(itens) {
+    return apiClient.post("carros/lote/", itens);
+  },
+
   // Método para buscar todos os modelos
   getModelos() {
     return apiClient.get("modelos/");
   },
 
+  // Método para sugerir modelos cuja marca ou nome começam com o texto digitado
+  // (ex.: "fi", "fiat un"), para os campos de seleção de modelo
+  autocompletarModelos(texto, limite = 10) {
+    return apiClient.get("modelos/autocompletar/", {
+      params: { q: texto, limite },
+    });
+  },
+
   /**
    * Busca os detalhes de um modelo específico pelo seu ID.
    * @param {number} id - O ID numérico do modelo.